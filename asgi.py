@@ -0,0 +1,147 @@
+"""
+ASGI entry point: the webhook routes on an asyncio event loop, outbound calls as coroutines
+
+Usage:
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT
+    python asgi.py
+
+Same /webhook, /health, /metrics and / routes as the Flask app in main.py,
+which keeps working unchanged under gunicorn. Updates are still handled
+synchronously (parsing and rules take microseconds); what changes is the
+delivery of Telegram calls: instead of one call per dispatcher thread,
+they run as coroutines through AsyncTelegramClient, so hundreds of sends
+can wait on Telegram at once on one core. uvicorn (server) and httpx (async
+HTTP client) are optional dependencies, only needed for this entry point.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from main import HOME_STATUS, bot, health_status, setup_webhook
+from metrics import REGISTRY
+from telegram_client import AsyncTelegramClient
+
+logger = logging.getLogger(__name__)
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# Largest webhook body accepted (Telegram updates are a few KB)
+MAX_BODY_BYTES = int(os.getenv('MAX_BODY_BYTES', str(1 << 20)))
+
+_client: Optional[AsyncTelegramClient] = None
+
+
+def _start() -> None:
+    """Move the bot's outbound calls onto the running loop (once)"""
+    global _client
+    if _client is not None:
+        return
+    _client = AsyncTelegramClient(bot.token)
+    bot.handlers.use_asyncio(asyncio.get_running_loop(), _client)
+    logger.info("⚡ ASGI - Appels Telegram sortants sur la boucle asyncio")
+
+
+async def _stop() -> None:
+    global _client
+    if _client is None:
+        return
+    await bot.handlers.dispatcher.stop()
+    # Off the loop: the edit queue's last sends still go through it
+    await asyncio.to_thread(bot.handlers.edit_queue.stop)
+    await _client.close()
+    _client = None
+
+
+async def _read_body(receive: Receive) -> Optional[bytes]:
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _respond(send: Send, status: int, body: Any, content_type: str = 'application/json') -> None:
+    if isinstance(body, (dict, list)):
+        body = json.dumps(body, ensure_ascii=False)
+    payload = body.encode('utf-8') if isinstance(body, str) else body
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', content_type.encode('latin-1')),
+                            (b'content-length', str(len(payload)).encode('latin-1'))]})
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def _webhook(receive: Receive) -> Tuple[int, str]:
+    try:
+        body = await _read_body(receive)
+        if body is None:
+            return 413, 'Error'
+        update = json.loads(body) if body else None
+
+        if update:
+            # Analyse immédiate; les appels Telegram sortants partent en coroutines
+            bot.handle_update(update)
+
+        return 200, 'OK'
+    except Exception as e:
+        logger.error(f"Error handling webhook: {e}")
+        return 500, 'Error'
+
+
+async def _lifespan(receive: Receive, send: Send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                _start()
+                await send({'type': 'lifespan.startup.complete'})
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+        elif message['type'] == 'lifespan.shutdown':
+            await _stop()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope: Scope, receive: Receive, send: Send) -> None:
+    """ASGI application"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    _start()  # Servers without lifespan support
+
+    path, method = scope['path'], scope['method']
+    if path == '/webhook' and method == 'POST':
+        status, text = await _webhook(receive)
+        await _respond(send, status, text, 'text/plain; charset=utf-8')
+    elif path == '/health' and method == 'GET':
+        await _respond(send, 200, health_status())
+    elif path == '/metrics' and method == 'GET':
+        await _respond(send, 200, REGISTRY.render(), 'text/plain; version=0.0.4')
+    elif path == '/' and method == 'GET':
+        await _respond(send, 200, HOME_STATUS)
+    else:
+        await _respond(send, 404, {'error': 'not found'})
+
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        logger.error("❌ uvicorn n'est pas installé: pip install uvicorn httpx")
+        sys.exit(1)
+
+    setup_webhook()
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv('PORT') or 5000), log_level='warning')
@@ -0,0 +1,124 @@
+"""
+Stateless prediction rules (a compiled RulePlan) evaluated over a whole batch of messages
+"""
+
+import os
+from typing import List, Optional, Sequence, Tuple
+
+from message_parser import SUIT_INDEX, ParsedGameMessage
+from rule_engine import RulePlan
+
+try:
+    import numpy as np
+except ImportError:  # Optional: the pure-Python path gives the same answers, only slower
+    np = None
+
+# 'auto' uses NumPy when it is installed, 'python' forces the pure-Python path
+BATCH_BACKEND = os.getenv('BATCH_BACKEND', 'auto').lower()
+# Below this many messages building the arrays costs more than it saves
+NUMPY_MIN_BATCH = int(os.getenv('NUMPY_MIN_BATCH', '64'))
+
+_NO_SECTION = (0, 0, 0, 0)
+
+
+def use_numpy(size: int) -> bool:
+    return np is not None and BATCH_BACKEND != 'python' and size >= NUMPY_MIN_BATCH
+
+
+def rule_costume(parsed: ParsedGameMessage, plan: RulePlan) -> Optional[str]:
+    """Costume to predict if the stateless rules allow a prediction from this message, else None.
+
+    Same checks as CardPredictor._should_predict minus everything that reads
+    state (temporary messages, duplicate target, cooldown, already processed).
+    """
+    if not parsed.game_number or plan.excluded(parsed):
+        return None
+    if parsed.has_pending and not parsed.has_completion:
+        return None
+    return plan.decide(parsed)[0]
+
+
+def _screen_text(text: str, plan: RulePlan) -> Tuple[bool, bool]:
+    finalized = '✅' in text or '🔰' in text
+    if not finalized or any(rule['text'] in text for rule in plan.text_rules):
+        return finalized, False
+    normalized = text.replace("❤️", "♥️")
+    return True, any(normalized.count(suit) >= plan.mirror_threshold for suit in plan.mirror_map)
+
+
+def screen_messages(texts: Sequence[str], plan: RulePlan) -> Tuple[List[bool], List[bool]]:
+    """Cheap whole-message checks, without parsing: (finalized, may_predict) per message.
+
+    finalized: ✅ or 🔰 present (the only messages the handlers act on).
+    may_predict: finalized, no text exclusion and a mirrored suit at the
+    mirror threshold in the whole message. These are necessary conditions
+    of rule_costume(), so messages that fail them never need a full parse.
+    """
+    if not use_numpy(len(texts)):
+        screened = [_screen_text(text, plan) for text in texts]
+        return [item[0] for item in screened], [item[1] for item in screened]
+
+    array = np.array(texts, dtype=str)
+    finalized = (np.char.find(array, '🔰') >= 0) | (np.char.find(array, '✅') >= 0)
+    excluded = np.zeros(len(texts), dtype=bool)
+    for rule in plan.text_rules:
+        excluded |= np.char.find(array, rule['text']) >= 0
+    normalized = np.char.replace(array, "❤️", "♥️")
+    mirror = np.zeros(len(texts), dtype=bool)
+    for suit in plan.mirror_map:
+        mirror |= np.char.count(normalized, suit) >= plan.mirror_threshold
+    return finalized.tolist(), (finalized & ~excluded & mirror).tolist()
+
+
+def suit_count_arrays(parsed: Sequence[ParsedGameMessage]):
+    """(totals (N, 4), sections (N, S, 4), section_lengths (N,)) suit-count arrays.
+
+    S is the widest message in the batch (at least 2); shorter messages are
+    padded with empty sections, which never reach the 3-of-a-kind thresholds.
+    """
+    width = max(2, max((len(p.section_counts) for p in parsed), default=0))
+    padded = [p.section_counts + (_NO_SECTION,) * (width - len(p.section_counts)) for p in parsed]
+    sections = np.array(padded, dtype=np.int16).reshape(len(parsed), width, 4)
+    totals = np.array([p.suit_counts for p in parsed], dtype=np.int16).reshape(len(parsed), 4)
+    lengths = np.fromiter((len(p.section_counts) for p in parsed), dtype=np.int16, count=len(parsed))
+    return totals, sections, lengths
+
+
+def _numpy_costumes(parsed: Sequence[ParsedGameMessage], plan: RulePlan) -> List[Optional[str]]:
+    size = len(parsed)
+    totals, sections, lengths = suit_count_arrays(parsed)
+
+    accepted = np.fromiter(
+        (bool(p.game_number) and not plan.excluded(p) and (p.has_completion or not p.has_pending) for p in parsed),
+        dtype=bool, count=size)
+
+    # Miroir: première couleur de la table qui atteint le seuil
+    order = [SUIT_INDEX[suit] for suit in plan.mirror_map]
+    targets = list(plan.mirror_map.values())
+    over = totals[:, order] >= plan.mirror_threshold
+    accepted &= over.any(axis=1)
+    mirror_index = over.argmax(axis=1)
+
+    for rule in plan.structure_rules:
+        if rule['type'] == 'section_suit_count':
+            accepted &= ~(sections >= rule['min']).any(axis=(1, 2))
+        else:
+            first, second = rule['sections']
+            width = sections.shape[1]
+            if max(first, second) >= width:
+                continue  # No message of the batch has that many sections
+            over_combined = ((sections[:, first] + sections[:, second]) >= rule['min']).sum(axis=1)
+            applies = lengths > max(first, second)
+            accepted &= ~(applies & ~np.isin(over_combined, rule['allowed']))
+
+    costumes: List[Optional[str]] = [None] * size
+    for row in np.flatnonzero(accepted).tolist():
+        costumes[row] = targets[int(mirror_index[row])]
+    return costumes
+
+
+def rule_costumes(parsed: Sequence[ParsedGameMessage], plan: RulePlan) -> List[Optional[str]]:
+    """rule_costume() for every message of a batch, vectorized when NumPy is available"""
+    if use_numpy(len(parsed)):
+        return _numpy_costumes(parsed, plan)
+    return [rule_costume(p, plan) for p in parsed]
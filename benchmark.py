@@ -0,0 +1,207 @@
+"""
+Benchmark for the CardPredictor prediction and verification hot path
+
+Usage:
+    python benchmark.py                      # fresh and 100k-history predictors
+    python benchmark.py --messages 20000 --output results.json
+    python benchmark.py --compare previous.json
+"""
+
+import argparse
+import json
+import logging
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from card_predictor import CardPredictor
+from state_backend import InProcessState
+
+CARD_VALUES = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
+# ❤️ appears next to ♥️ in real channel messages
+CARD_SUITS = ["♠️", "♥️", "❤️", "♦️", "♣️"]
+# Status markers and how often they show up on a channel message
+MESSAGE_TAGS = [
+    ("✅", 30), ("🔰", 15), ("⏰", 10), ("▶️", 5), ("🕐", 5), ("➡️", 3),
+    ("✅ #R", 8), ("🔰 #X", 4), ("#T", 5), ("", 15),
+]
+
+
+def _hand(rng: random.Random, cards: int) -> str:
+    return "".join(rng.choice(CARD_VALUES) + rng.choice(CARD_SUITS) for _ in range(cards))
+
+
+def generate_messages(count: int, start_game: int = 1, seed: int = 42) -> List[str]:
+    """Synthetic Baccarat channel messages, e.g. '#N744. 5(♠️♥️❤️) - 7(♦️♣️) ✅'.
+
+    Roughly one game in four is posted twice, first with a pending marker
+    and then finalized, as the source channel does with its edits.
+    """
+    rng = random.Random(seed)
+    tags, weights = zip(*MESSAGE_TAGS)
+    messages = []
+    game = start_game
+    while len(messages) < count:
+        player = _hand(rng, rng.choice((2, 2, 3)))
+        banker = _hand(rng, rng.choice((2, 2, 3)))
+        body = f"#N{game}. {rng.randint(0, 9)}({player}) - {rng.randint(0, 9)}({banker})"
+        if rng.random() < 0.25:
+            messages.append(f"{body} ⏰")
+        messages.append(f"{body} {rng.choices(tags, weights)[0]}".rstrip())
+        game += 1
+    return messages[:count]
+
+
+def build_predictor(history: int, seed: int = 7) -> CardPredictor:
+    """Predictor with `history` settled predictions already stored, no cooldown"""
+    rng = random.Random(seed)
+    state = InProcessState(max_entries=max(history * 2, 2000))
+    predictor = CardPredictor(state=state)
+    predictor.prediction_cooldown = 0
+    statuses = ['✅0️⃣', '✅1️⃣', '✅2️⃣', '⭕✍🏻']
+    for game in range(1, history + 1):
+        predictor.predictions[game] = {
+            'predicted_costume': rng.choice(CARD_SUITS[:1] + CARD_SUITS[2:]),
+            'status': rng.choice(statuses),
+            'predicted_from': game - 2,
+            'verification_count': 1,
+            'message_text': f"🔵{game}🔵:♠️statut :⏳",
+        }
+        predictor.processed_messages.add(game - 2)
+    return predictor
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def _time_each(operation: Callable[[str], Any], messages: List[str]) -> Dict[str, Any]:
+    """Run operation on every message; throughput and latency percentiles"""
+    clock = time.perf_counter
+    latencies = []
+    started = clock()
+    for message in messages:
+        begin = clock()
+        operation(message)
+        latencies.append(clock() - begin)
+    elapsed = clock() - started
+    latencies.sort()
+    return {
+        'messages': len(messages),
+        'seconds': round(elapsed, 4),
+        'msgs_per_sec': round(len(messages) / elapsed, 1) if elapsed else None,
+        'p50_us': round(_percentile(latencies, 0.50) * 1e6, 2),
+        'p99_us': round(_percentile(latencies, 0.99) * 1e6, 2),
+        'max_us': round(latencies[-1] * 1e6, 2),
+    }
+
+
+def _allocations(operation: Callable[[str], Any], messages: List[str]) -> Dict[str, Any]:
+    """Memory allocated while running operation (separate pass: tracing skews timings)"""
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for message in messages:
+            operation(message)
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'net_kb': round((after - before) / 1024, 1),
+        'peak_kb': round((peak - before) / 1024, 1),
+        'net_bytes_per_msg': round((after - before) / len(messages), 1),
+    }
+
+
+OPERATIONS = ('check_mirror_rule', 'should_predict+make_prediction', 'verify_prediction', 'pipeline')
+
+
+def _operations(predictor: CardPredictor) -> Dict[str, Callable[[str], Any]]:
+    def predict(message: str):
+        should, game_number, costume = predictor.should_predict(message)
+        if should:
+            predictor.make_prediction(game_number, costume)
+
+    def pipeline(message: str):
+        predict(message)
+        predictor.verify_prediction(message)
+
+    return {
+        'check_mirror_rule': predictor.check_mirror_rule,
+        'should_predict+make_prediction': predict,
+        'verify_prediction': predictor.verify_prediction,
+        'pipeline': pipeline,
+    }
+
+
+def run_scenario(name: str, history: int, messages_count: int, seed: int) -> Dict[str, Any]:
+    """Time and measure every hot-path operation against one predictor setup"""
+    messages = generate_messages(messages_count, start_game=history + 1, seed=seed)
+    results: Dict[str, Any] = {'history': history, 'operations': {}}
+    for operation_name in OPERATIONS:
+        # A fresh predictor per operation: earlier passes must not leave state behind
+        timed = _operations(build_predictor(history))[operation_name]
+        stats = _time_each(timed, messages)
+        stats['allocations'] = _allocations(_operations(build_predictor(history))[operation_name], messages)
+        results['operations'][operation_name] = stats
+        print(f"  {name:<8} {operation_name:<32} {stats['msgs_per_sec']:>12,.0f} msg/s  "
+              f"p50 {stats['p50_us']:>8.1f}µs  p99 {stats['p99_us']:>8.1f}µs  "
+              f"{stats['allocations']['net_bytes_per_msg']:>8.0f} B/msg")
+    return results
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> None:
+    """Print throughput changes against an earlier results file"""
+    print("\nComparaison avec l'exécution précédente:")
+    for scenario, data in current['scenarios'].items():
+        old_scenario = previous.get('scenarios', {}).get(scenario)
+        if not old_scenario:
+            continue
+        for operation, stats in data['operations'].items():
+            old = old_scenario['operations'].get(operation)
+            if not old or not old.get('msgs_per_sec'):
+                continue
+            change = (stats['msgs_per_sec'] - old['msgs_per_sec']) / old['msgs_per_sec'] * 100
+            print(f"  {scenario:<8} {operation:<32} {change:+7.1f}% msg/s  "
+                  f"p99 {old['p99_us']:.1f} → {stats['p99_us']:.1f}µs")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--messages', type=int, default=10000, help='messages per operation')
+    parser.add_argument('--history', type=int, default=100000, help='stored predictions for the warm scenario')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args(argv)
+
+    # The predictor logs every decision at INFO; keep that out of the timings
+    logging.disable(logging.CRITICAL)
+
+    results: Dict[str, Any] = {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'messages': args.messages,
+        'seed': args.seed,
+        'scenarios': {},
+    }
+    for name, history in (('fresh', 0), ('history', args.history)):
+        results['scenarios'][name] = run_scenario(name, history, args.messages, args.seed)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nRésultats enregistrés dans {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
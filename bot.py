@@ -4,37 +4,44 @@ Telegram Bot implementation with advanced features and deployment capabilities
 import os
 import logging
 import requests
-import json
 from typing import Dict, Any
 from handlers import TelegramHandlers
 from card_predictor import card_predictor
+from telegram_client import get_telegram_client
+from dedup import UpdateDeduplicator
+from logging_setup import begin_trace, log_update
+from metrics import UPDATE_SECONDS
 
 logger = logging.getLogger(__name__)
 
 class TelegramBot:
     def __init__(self, token: str):
         self.token = token
-        self.base_url = f"https://api.telegram.org/bot{token}"
+        # Same pooled client as the handlers
+        self.client = get_telegram_client(token)
         self.deployment_file_path = "depi_render_n2_fix.zip"
         # Initialize advanced handlers
         self.handlers = TelegramHandlers(token)
+        # Drops webhook retries and repeated message revisions before any parsing
+        self.deduplicator = UpdateDeduplicator()
 
     def handle_update(self, update: Dict[str, Any]) -> None:
         """Handle incoming Telegram update with advanced features for webhook mode"""
+        with UPDATE_SECONDS.time():
+            self._handle_update(update)
+
+    def _handle_update(self, update: Dict[str, Any]) -> None:
         try:
-            # Log avec type de message
-            if 'message' in update:
-                logger.info(f"🔄 Bot traite message normal via webhook")
-            elif 'edited_message' in update:
-                logger.info(f"🔄 Bot traite message édité via webhook")
-            
-            logger.info(f"Received update: {json.dumps(update, indent=2)}")
+            if self.deduplicator.is_duplicate(update):
+                logger.debug("♻️ Update %s déjà traité, ignoré", update.get('update_id'))
+                return
+
+            # Une seule ligne compacte par update; la trace DEBUG est échantillonnée
+            log_update(logger, update)
+            begin_trace()
 
             # Use the advanced handlers for processing (they handle card predictions too)
             self.handlers.handle_update(update)
-            
-            # Log succès du traitement
-            logger.info(f"✅ Update traité avec succès via webhook")
 
         except Exception as e:
             logger.error(f"❌ Error handling update via webhook: {e}")
@@ -119,15 +126,13 @@ class TelegramBot:
     def send_message(self, chat_id: int, text: str) -> bool:
         """Send text message to user"""
         try:
-            url = f"{self.base_url}/sendMessage"
             data = {
                 'chat_id': chat_id,
                 'text': text,
                 'parse_mode': 'HTML'
             }
 
-            response = requests.post(url, json=data, timeout=10)
-            result = response.json()
+            result = self.client.call('sendMessage', json=data, timeout=10)
 
             if result.get('ok'):
                 logger.info(f"Message sent successfully to chat {chat_id}")
@@ -146,8 +151,6 @@ class TelegramBot:
     def send_document(self, chat_id: int, file_path: str) -> bool:
         """Send document file to user"""
         try:
-            url = f"{self.base_url}/sendDocument"
-
             with open(file_path, 'rb') as file:
                 files = {
                     'document': (os.path.basename(file_path), file, 'application/zip')
@@ -157,8 +160,7 @@ class TelegramBot:
                     'caption': '📦 Deployment Package for render.com'
                 }
 
-                response = requests.post(url, data=data, files=files, timeout=60)
-                result = response.json()
+                result = self.client.call('sendDocument', data=data, files=files, timeout=60)
 
                 if result.get('ok'):
                     logger.info(f"Document sent successfully to chat {chat_id}")
@@ -180,14 +182,12 @@ class TelegramBot:
     def set_webhook(self, webhook_url: str) -> bool:
         """Set webhook URL for the bot"""
         try:
-            url = f"{self.base_url}/setWebhook"
             data = {
                 'url': webhook_url,
                 'allowed_updates': ['message', 'edited_message']
             }
 
-            response = requests.post(url, json=data, timeout=10)
-            result = response.json()
+            result = self.client.call('setWebhook', json=data, timeout=10)
 
             if result.get('ok'):
                 logger.info(f"Webhook set successfully: {webhook_url}")
@@ -206,9 +206,7 @@ class TelegramBot:
     def get_bot_info(self) -> Dict[str, Any]:
         """Get bot information"""
         try:
-            url = f"{self.base_url}/getMe"
-            response = requests.get(url, timeout=30)
-            result = response.json()
+            result = self.client.call('getMe', http_method='GET', timeout=30)
 
             if result.get('ok'):
                 return result.get('result', {})
@@ -2,76 +2,208 @@
 Card prediction logic for Joker's Telegram Bot - simplified for webhook deployment
 """
 
-import re
 import logging
-from datetime import datetime, timedelta
-from typing import Optional, Dict, List, Tuple
+from typing import Any, Callable, Optional, Dict, List, Sequence, Tuple, Union
+import threading
 import time
 import os
 import json
 
+from batch_rules import rule_costumes, screen_messages
+from clock import system_clock
+from event_log import EventLog, event_log_dir, open_event_log
+from message_parser import GAME_NUMBER_PATTERN, ParsedGameMessage, SUITS, parse_message
+from metrics import PARSE_SECONDS, PREDICTIONS_MADE, PREDICTIONS_SETTLED, RULES_SECONDS, VERIFY_SECONDS
+from pending_tracker import PendingEditTracker
+from persistence import PERSISTED_RETENTION, StateDatabase, open_state_database, state_db_path
+from reorder import GameReorderBuffer
+from rule_engine import RuleEngine, rule_engine
+from state_backend import STATE_BACKEND, STATE_MAX_ENTRIES, InProcessState, create_state_backend
+from stats import PredictionStats
+
 logger = logging.getLogger(__name__)
 
-# Configuration constants
-VALID_CARD_COMBINATIONS = [
-    "♠️♥️♦️", "♠️♥️♣️", "♠️♦️♣️", "♥️♦️♣️"
-]
+# Target channel ID for Baccarat Kouamé (default source channel)
+TARGET_CHANNEL_ID = int(os.getenv('TARGET_CHANNEL_ID', '-1002682552255'))
+
+# Target channel ID for predictions and updates
+PREDICTION_CHANNEL_ID = int(os.getenv('PREDICTION_CHANNEL_ID', '-1002875505624'))  # <<< CORRECTION EFFECTUÉE ICI
 
-CARD_SYMBOLS = ["♠️", "♥️", "♦️", "♣️", "❤️"]  # Include both ♥️ and ❤️ variants
+MessageInput = Union[str, ParsedGameMessage]
 
-# Target channel ID for Baccarat Kouamé
-TARGET_CHANNEL_ID = -1002682552255
+# Legacy plain-text cooldown timestamp, migrated into the state database
+LEGACY_TIMESTAMP_FILE = '.last_prediction_time'
 
-# Target channel ID for predictions and updates
-PREDICTION_CHANNEL_ID = -1002875505624 # <<< CORRECTION EFFECTUÉE ICI
+# Transient entries (temporary messages, pending edits) age out after TRANSIENT_STATE_TTL
+TRANSIENT_STATE_TTL = float(os.getenv('TRANSIENT_STATE_TTL', '600'))
 
 class CardPredictor:
     """Handles card prediction logic for webhook deployment"""
 
-    def __init__(self):
-        self.predictions = {}  # Store predictions for verification
-        self.processed_messages = set()  # Avoid duplicate processing
-        self.sent_predictions = {}  # Store sent prediction messages for editing
-        self.temporary_messages = {}  # Store temporary messages waiting for final edit
-        self.pending_edits = {}  # Store messages waiting for edit with indicators
-        self.position_preference = 1  # Default position preference (1 = first card, 2 = second card)
-        self.redirect_channels = {}  # Store redirection channels for different chats
-        self.last_prediction_time = self._load_last_prediction_time()  # Load persisted timestamp
-        self.prediction_cooldown = 30   # Cooldown period in seconds between predictions
-
-    def _load_last_prediction_time(self) -> float:
-        """Load last prediction timestamp from file"""
+    def __init__(self, state=None, state_db: Optional[StateDatabase] = None,
+                 clock: Callable[[], float] = system_clock, rules: RuleEngine = rule_engine,
+                 event_log: Optional[EventLog] = None):
+        # Shared state (predictions, cooldown, redirects) lives behind a backend:
+        # InProcessState for one worker, SharedSQLiteState for several
+        # Source of "now" for the cooldown and transient stores; replays and tests pass a ManualClock
+        self.clock = clock
+        # Compiled prediction rules, shared by every predictor and hot-reloadable (/rules reload)
+        self.rules = rules
+        self.state = state or InProcessState(clock=clock)
+        # Durable write-behind copy; a shared backend is already durable
+        self.state_db = None if self.state.shared else state_db
+        # Append-only history of predictions, sent messages and outcomes (one writer process only)
+        self.event_log = None if self.state.shared else event_log
+
+        self.predictions = self.state.predictions  # Store predictions for verification
+        self.processed_messages = self.state.processed_messages  # Source games already predicted from
+        self.sent_predictions = self.state.sent_predictions  # Store sent prediction messages for editing
+        self.pending_games = self.state.pending_games  # Game numbers of pending predictions, smallest first
+        self.redirect_channels = self.state.redirect_channels  # Store redirection channels for different chats
+
+        # In-progress posts (⏰▶🕐➡️) by (chat_id, message_id) until their ✅/🔰 version; bounded, expired by a timer wheel
+        self.pending_tracker = PendingEditTracker(TRANSIENT_STATE_TTL, STATE_MAX_ENTRIES, clock=clock)
+        # Finalized results released in game order before verification (see verify_in_order)
+        self.reorder = GameReorderBuffer(clock=clock)
+        self._verify_lock = threading.Lock()
+        # Rolling win rates per suit and outcome, fed by every settled prediction (/stats);
+        # a shared backend keeps them in its database so they cover every worker
+        self.stats = self.state.prediction_stats if self.state.shared else PredictionStats(clock=clock)
+        self.position_preference = 1  # Set by /cos (1 = first card, 2 = second card); the mirror rules don't use it
+        if self.state.get_setting('prediction_cooldown') is None:
+            self.prediction_cooldown = 30   # Cooldown period in seconds between predictions
+        self._last_parsed: Optional[ParsedGameMessage] = None  # Parse cache for repeated calls on the same text
+        if self.state_db or (self.event_log and not self.event_log.is_empty()):
+            self._restore_state()
+
+    @property
+    def last_prediction_time(self) -> float:
+        return self.state.get_setting('last_prediction_time', 0)
+
+    @last_prediction_time.setter
+    def last_prediction_time(self, value: float):
+        self.state.set_setting('last_prediction_time', value)
+
+    @property
+    def prediction_cooldown(self) -> int:
+        return self.state.get_setting('prediction_cooldown', 30)
+
+    @prediction_cooldown.setter
+    def prediction_cooldown(self, value: int):
+        self.state.set_setting('prediction_cooldown', value)
+
+    def _restore_state(self):
+        """Warm start: reload predictions, sent messages, redirects and cooldown.
+
+        When the event log has history, predictions and sent messages are
+        rebuilt by replaying it; settings and redirects come from the database.
+        """
+        try:
+            state = self.state_db.load() if self.state_db else {'settings': {}, 'redirects': {}}
+            if self.event_log and not self.event_log.is_empty():
+                state.update(self.event_log.replay(retention=PERSISTED_RETENTION))
+        except Exception as e:
+            logger.warning(f"⚠️ Impossible de restaurer l'état: {e}")
+            return
+
+        settings = state['settings']
+        self.prediction_cooldown = settings.get('prediction_cooldown', self.prediction_cooldown)
+        if 'last_prediction_time' in settings:
+            self.last_prediction_time = settings['last_prediction_time']
+        else:
+            self.last_prediction_time = self._load_legacy_prediction_time()
+            if self.last_prediction_time:
+                self._save_last_prediction_time()
+
+        for game, prediction in state['predictions'].items():
+            self.predictions[game] = prediction
+            if prediction.get('status') == 'pending':
+                self.pending_games.add(game)
+        for game, message_info in state['sent_predictions'].items():
+            self.sent_predictions[game] = message_info
+        self.redirect_channels.update(state['redirects'])
+
+        if self.last_prediction_time:
+            logger.info(f"⏰ PERSISTANCE - Dernière prédiction chargée: {self.clock() - self.last_prediction_time:.1f}s écoulées")
+
+    def _load_legacy_prediction_time(self) -> float:
+        """Load last prediction timestamp from the pre-database file"""
         try:
-            if os.path.exists('.last_prediction_time'):
-                with open('.last_prediction_time', 'r') as f:
-                    timestamp = float(f.read().strip())
-                    logger.info(f"⏰ PERSISTANCE - Dernière prédiction chargée: {time.time() - timestamp:.1f}s écoulées")
-                    return timestamp
+            if os.path.exists(LEGACY_TIMESTAMP_FILE):
+                with open(LEGACY_TIMESTAMP_FILE, 'r') as f:
+                    return float(f.read().strip())
         except Exception as e:
             logger.warning(f"⚠️ Impossible de charger le timestamp: {e}")
         return 0
 
     def _save_last_prediction_time(self):
-        """Save last prediction timestamp to file"""
-        try:
-            with open('.last_prediction_time', 'w') as f:
-                f.write(str(self.last_prediction_time))
-        except Exception as e:
-            logger.warning(f"⚠️ Impossible de sauvegarder le timestamp: {e}")
+        """Persist last prediction timestamp (written in the background)"""
+        if self.state_db:
+            self.state_db.save_setting('last_prediction_time', self.last_prediction_time)
+
+    def _store_prediction(self, game: int, prediction: Dict):
+        """Write a prediction to memory and to durable storage"""
+        self.predictions[game] = prediction
+        if self.state_db:
+            self.state_db.save_prediction(game, prediction)
+        if self.event_log:
+            # Only make_prediction stores a pending prediction; every later write settles it
+            kind = 'predicted' if prediction.get('status') == 'pending' else 'settled'
+            self.event_log.append(kind, game=game, data=prediction)
+
+    def register_sent_prediction(self, game: int, chat_id: int, message_id: int):
+        """Remember which Telegram message carries the prediction for a game"""
+        self.sent_predictions[game] = {'chat_id': chat_id, 'message_id': message_id}
+        if self.state_db:
+            self.state_db.save_sent_prediction(game, chat_id, message_id)
+        if self.event_log:
+            self.event_log.append('sent', game=game, chat_id=chat_id, message_id=message_id)
+
+    def set_prediction_cooldown(self, seconds: int):
+        """Change the delay between two predictions"""
+        self.prediction_cooldown = seconds
+        if self.state_db:
+            self.state_db.save_setting('prediction_cooldown', seconds)
+        logger.info(f"⏰ Cooldown mis à jour : {seconds}s")
 
     def reset_predictions(self):
         """Reset all prediction states - useful for recalibration"""
         self.predictions.clear()
         self.processed_messages.clear()
         self.sent_predictions.clear()
-        self.temporary_messages.clear()
-        self.pending_edits.clear()
+        self.pending_tracker.clear()
+        self.pending_games.clear()
+        self.stats.clear()
         self.last_prediction_time = 0
         self._save_last_prediction_time()
+        if self.state_db:
+            self.state_db.clear_predictions()
+        if self.event_log:
+            self.event_log.append('reset')
         logger.info("🔄 Système de prédictions réinitialisé")
 
+    def close(self):
+        """Flush durable state and release the backend (the predictor is unloaded)"""
+        if self.state_db:
+            self.state_db.close()
+            self.state_db = None
+        if self.event_log:
+            self.event_log.close()
+            self.event_log = None
+        self.state.close()
+
+    def get_state_stats(self) -> Dict[str, Dict]:
+        """Size and eviction counters of every state store"""
+        stats = {
+            store.name: store.stats()
+            for store in (self.predictions, self.sent_predictions)
+        } | {'processed_messages': self.processed_messages.stats(), 'pending_posts': self.pending_tracker.stats()}
+        if self.event_log:
+            stats['event_log'] = self.event_log.get_stats()
+        return stats
+
     def set_position_preference(self, position: int):
-        """Set the position preference for card selection (1 or 2)"""
+        """Set the position preference for card selection (1 or 2), kept for the /cos command"""
         if position in [1, 2]:
             self.position_preference = position
             logger.info(f"🎯 Position de carte mise à jour : {position}")
@@ -81,595 +213,561 @@ class CardPredictor:
     def set_redirect_channel(self, source_chat_id: int, target_chat_id: int):
         """Set redirection channel for predictions from a source chat"""
         self.redirect_channels[source_chat_id] = target_chat_id
+        if self.state_db:
+            self.state_db.save_redirect(source_chat_id, target_chat_id)
         logger.info(f"📤 Redirection configurée : {source_chat_id} → {target_chat_id}")
 
     def get_redirect_channel(self, source_chat_id: int) -> int:
         """Get redirect channel for a source chat, fallback to PREDICTION_CHANNEL_ID"""
         return self.redirect_channels.get(source_chat_id, PREDICTION_CHANNEL_ID)
 
+    def clear_redirect_channels(self):
+        """Remove every configured redirection"""
+        self.redirect_channels.clear()
+        if self.state_db:
+            self.state_db.clear_redirects()
+
     def reset_all_predictions(self):
         """Reset all predictions and redirect channels"""
         self.predictions.clear()
         self.processed_messages.clear()
         self.sent_predictions.clear()
-        self.temporary_messages.clear()
-        self.pending_edits.clear()
-        self.redirect_channels.clear()
+        self.pending_tracker.clear()
+        self.pending_games.clear()
+        self.stats.clear()
+        self.clear_redirect_channels()
         self.last_prediction_time = 0
         self._save_last_prediction_time()
+        if self.state_db:
+            self.state_db.clear_predictions()
+        if self.event_log:
+            self.event_log.append('reset')
         logger.info("🔄 Toutes les prédictions et redirections ont été supprimées")
 
-    def extract_game_number(self, message: str) -> Optional[int]:
+    def parse(self, message: MessageInput) -> ParsedGameMessage:
+        """Parse a message once; repeated calls with the same text reuse the result"""
+        if isinstance(message, ParsedGameMessage):
+            return message
+        cached = self._last_parsed
+        if cached is not None and cached.text == message:
+            return cached
+        started = time.perf_counter()
+        parsed = parse_message(message)
+        PARSE_SECONDS.observe(time.perf_counter() - started)
+        self._last_parsed = parsed
+        return parsed
+
+    def extract_game_number(self, message: MessageInput) -> Optional[int]:
         """Extract game number from message like #n744 or #N744"""
-        pattern = r'#[nN](\d+)'
-        match = re.search(pattern, message)
-        if match:
-            return int(match.group(1))
-        return None
+        return self.parse(message).game_number
 
-    def extract_cards_from_parentheses(self, message: str) -> List[str]:
-        """Extract cards from first and second parentheses"""
-        # This method is deprecated, use extract_card_symbols_from_parentheses instead
-        return []
-
-    def has_pending_indicators(self, text: str) -> bool:
+    def has_pending_indicators(self, text: MessageInput) -> bool:
         """Check if message contains indicators suggesting it will be edited"""
-        indicators = ['⏰', '▶', '🕐', '➡️']
-        return any(indicator in text for indicator in indicators)
+        return self.parse(text).has_pending
 
-    def has_completion_indicators(self, text: str) -> bool:
+    def has_completion_indicators(self, text: MessageInput) -> bool:
         """Check if message contains completion indicators after edit - ✅ OR 🔰 indicates completion"""
-        completion_indicators = ['✅', '🔰']
-        has_indicator = any(indicator in text for indicator in completion_indicators)
-        if has_indicator:
-            indicator_found = next(ind for ind in completion_indicators if ind in text)
-            logger.info(f"🔍 FINALISATION DÉTECTÉE - Indicateur {indicator_found} trouvé dans: {text[:100]}...")
-        return has_indicator
-
-    def should_wait_for_edit(self, text: str, message_id: int) -> bool:
-        """Determine if we should wait for this message to be edited"""
-        if self.has_pending_indicators(text):
-            # Store this message as pending edit
-            self.pending_edits[message_id] = {
-                'original_text': text,
-                'timestamp': datetime.now()
-            }
-            return True
-        return False
+        parsed = self.parse(text)
+        if parsed.has_completion:
+            logger.debug("🔍 FINALISATION DÉTECTÉE - Indicateur %s trouvé dans: %.100s...", parsed.completion_indicator(), parsed.text)
+        return parsed.has_completion
 
-    def extract_card_symbols_from_parentheses(self, text: str) -> List[List[str]]:
-        """Extract unique card symbols from each parentheses section"""
-        # Find all parentheses content
-        pattern = r'\(([^)]+)\)'
-        matches = re.findall(pattern, text)
-
-        all_sections = []
-        for match in matches:
-            # Normalize ❤️ to ♥️ for consistency
-            normalized_content = match.replace("❤️", "♥️")
-
-            # Extract only unique card symbols (costumes) from this section
-            unique_symbols = set()
-            for symbol in ["♠️", "♥️", "♦️", "♣️"]:
-                if symbol in normalized_content:
-                    unique_symbols.add(symbol)
+    def should_wait_for_edit(self, text: MessageInput, message_id: int, chat_id: Optional[int] = None) -> bool:
+        """Determine if we should wait for this message to be edited"""
+        return self.track_post(chat_id, message_id, text) == 'pending'
 
-            all_sections.append(list(unique_symbols))
+    def track_post(self, chat_id: Optional[int], message_id: Optional[int], message: MessageInput) -> Optional[str]:
+        """Follow a source post from its in-progress versions to its finalized one.
 
-        return all_sections
+        Returns 'pending' while the post waits for its result, 'finalized'
+        when this version settles a tracked post, else None.
+        """
+        parsed = self.parse(message)
+        if self.has_completion_indicators(parsed):
+            post = self.pending_tracker.resolve(chat_id, message_id, parsed.game_number)
+            if post is None:
+                return None
+            logger.debug("⏰ Jeu %s finalisé après %.1fs (%s versions)", parsed.game_number,
+                         self.clock() - post.first_seen, post.updates)
+            return 'finalized'
+        if parsed.has_pending:
+            self.pending_tracker.track(chat_id, message_id, parsed.game_number, parsed.text)
+            return 'pending'
+        return None
 
-    def has_three_different_cards(self, cards: List[str]) -> bool:
-        """Check if there are exactly 3 different card symbols"""
-        unique_cards = list(set(cards))
-        logger.info(f"Checking cards: {cards}, unique: {unique_cards}, count: {len(unique_cards)}")
-        return len(unique_cards) == 3
+    def extract_card_symbols_from_parentheses(self, text: MessageInput) -> List[List[str]]:
+        """Extract unique card symbols from each parentheses section"""
+        parsed = self.parse(text)
+        return [
+            [suit for suit, count in zip(SUITS, counts) if count]
+            for counts in parsed.section_counts
+        ]
 
-    def is_temporary_message(self, message: str) -> bool:
+    def is_temporary_message(self, message: MessageInput) -> bool:
         """Check if message contains temporary progress emojis"""
-        temporary_emojis = ['⏰', '▶', '🕐', '➡️']
-        return any(emoji in message for emoji in temporary_emojis)
+        return self.parse(message).has_pending
 
-    def is_final_message(self, message: str) -> bool:
+    def is_final_message(self, message: MessageInput) -> bool:
         """Check if message contains final completion emojis - NOW ONLY 🔰"""
-        final_emojis = ['🔰']
-        is_final = any(emoji in message for emoji in final_emojis)
-        if is_final:
-            logger.info(f"🔍 MESSAGE FINAL DÉTECTÉ - Emoji 🔰 trouvé dans: {message[:100]}...")
-        return is_final
-
-    def get_card_combination(self, cards: List[str]) -> Optional[str]:
-        """Get the combination of 3 different cards"""
-        unique_cards = list(set(cards))
-        if len(unique_cards) == 3:
-            combination = ''.join(sorted(unique_cards))
-            logger.info(f"Card combination found: {combination} from cards: {unique_cards}")
-
-            # Check if this combination matches any valid pattern
-            for valid_combo in VALID_CARD_COMBINATIONS:
-                if set(combination) == set(valid_combo):
-                    logger.info(f"Valid combination matched: {valid_combo}")
-                    return combination
-
-            # Accept any 3 different cards as valid
-            logger.info(f"Accepting 3 different cards as valid: {combination}")
-            return combination
-        return None
+        parsed = self.parse(message)
+        if parsed.has_final:
+            logger.debug("🔍 MESSAGE FINAL DÉTECTÉ - Emoji 🔰 trouvé dans: %.100s...", parsed.text)
+        return parsed.has_final
 
-    def extract_costumes_from_second_parentheses(self, message: str) -> List[str]:
-        """Extract only costumes from exactly 3 cards in the second parentheses"""
-        # Find all parentheses content
-        pattern = r'\(([^)]+)\)'
-        matches = re.findall(pattern, message)
-
-        if len(matches) < 2:
-            return []
-
-        second_parentheses = matches[1]  # Second parentheses (index 1)
-        logger.info(f"Deuxième parenthèses contenu: {second_parentheses}")
-
-        # Extract only costume symbols (♠️, ♥️, ♦️, ♣️, ❤️)
-        costumes = []
-        costume_symbols = ["♠️", "♥️", "♦️", "♣️", "❤️"]
-
-        # Normalize ❤️ to ♥️ for consistency
-        normalized_content = second_parentheses.replace("❤️", "♥️")
-
-        # Find all costume symbols in order of appearance
-        for char_pos in range(len(normalized_content) - 1):
-            two_char_symbol = normalized_content[char_pos:char_pos + 2]
-            if two_char_symbol in ["♠️", "♥️", "♦️", "♣️"]:
-                costumes.append(two_char_symbol)
-
-        logger.info(f"Costumes extraits de la deuxième parenthèse: {costumes}")
-        return costumes
-
-    def check_mirror_rule(self, message: str) -> Optional[str]:
+    def check_mirror_rule(self, message: MessageInput) -> Optional[str]:
         """
-        NOUVELLE RÈGLE DU MIROIR:
-        Si on trouve 3 couleurs identiques ou plus dans tout le message (joueur + banquier),
-        on donne le miroir de cette couleur:
-        - ♥️ (❤️) → ♣️
-        - ♠️ → ♦️
-        - ♦️ → ♠️
-        - ♣️ → ♥️
+        RÈGLE DU MIROIR (seuil et correspondances dans prediction_rules.json):
+        Si une couleur apparaît 3 fois ou plus dans tout le message (joueur + banquier),
+        on donne le miroir de cette couleur (par défaut ♥️→♣️, ♠️→♦️, ♦️→♠️, ♣️→♥️)
         """
-        # Normaliser ❤️ vers ♥️ pour cohérence
-        normalized_message = message.replace("❤️", "♥️")
-
-        # Compter toutes les occurrences de chaque couleur dans le message entier
-        color_counts = {
-            "♥️": normalized_message.count("♥️"),
-            "♠️": normalized_message.count("♠️"),
-            "♦️": normalized_message.count("♦️"),
-            "♣️": normalized_message.count("♣️")
-        }
-
-        logger.info(f"🔮 MIROIR - Comptage couleurs: {color_counts}")
-
-        # Trouver les couleurs qui ont 3 occurrences ou plus
-        for color, count in color_counts.items():
-            if count >= 3:
-                # Appliquer la règle du miroir
-                if color == "♥️":
-                    mirror = "♣️"
-                elif color == "♠️":
-                    mirror = "♦️"
-                elif color == "♦️":
-                    mirror = "♠️"
-                elif color == "♣️":
-                    mirror = "♥️"
-                else:
-                    continue
+        # Comptage déjà fait par le parseur (❤️ normalisé vers ♥️)
+        color_counts = self.parse(message).suit_counts
+        mirror = self.rules.current().mirror(color_counts)
 
-                logger.info(f"🔮 MIROIR DÉTECTÉ - {count}x{color} → Prédire {mirror}")
-                return mirror
-
-        logger.info(f"🔮 MIROIR - Aucune couleur n'a 3+ occurrences")
-        return None
-
-    def check_same_costumes_rule(self, costumes: List[str]) -> Optional[str]:
-        """
-        ANCIENNE RÈGLE (maintenant désactivée) - Conservée pour compatibilité
-        """
-        return None
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔮 MIROIR - Comptage couleurs: %s → %s", dict(zip(SUITS, color_counts)), mirror)
+        return mirror
 
     def can_make_prediction(self) -> bool:
         """Check if enough time has passed since last prediction (70 seconds cooldown)"""
-        current_time = time.time()
+        current_time = self.clock()
 
         # Si aucune prédiction n'a été faite encore, autoriser
         if self.last_prediction_time == 0:
-            logger.info(f"⏰ PREMIÈRE PRÉDICTION: Aucune prédiction précédente, autorisation accordée")
+            logger.debug("⏰ PREMIÈRE PRÉDICTION: Aucune prédiction précédente, autorisation accordée")
             return True
 
         time_since_last = current_time - self.last_prediction_time
 
         if time_since_last >= self.prediction_cooldown:
-            logger.info(f"⏰ COOLDOWN OK: {time_since_last:.1f}s écoulées depuis dernière prédiction (≥{self.prediction_cooldown}s)")
+            logger.debug("⏰ COOLDOWN OK: %.1fs écoulées depuis dernière prédiction (≥%ss)", time_since_last, self.prediction_cooldown)
             return True
         else:
             remaining = self.prediction_cooldown - time_since_last
-            logger.info(f"⏰ COOLDOWN ACTIF: Encore {remaining:.1f}s à attendre avant prochaine prédiction")
+            logger.debug("⏰ COOLDOWN ACTIF: Encore %.1fs à attendre avant prochaine prédiction", remaining)
             return False
 
-    def should_predict(self, message: str) -> Tuple[bool, Optional[int], Optional[str]]:
+    def should_predict(self, message: MessageInput) -> Tuple[bool, Optional[int], Optional[str]]:
+        """Evaluate the prediction rules on a message (timed for /metrics)"""
+        started = time.perf_counter()
+        try:
+            return self._should_predict(message)
+        finally:
+            RULES_SECONDS.observe(time.perf_counter() - started)
+
+    def _should_predict(self, message: MessageInput) -> Tuple[bool, Optional[int], Optional[str]]:
         """
-        NOUVELLES RÈGLES DE PRÉDICTION:
-        1. Exclure 🔰, #R, #X
-        2. Règle du MIROIR pour couleurs identiques multiples
+        RÈGLES DE PRÉDICTION (plan compilé par rule_engine depuis prediction_rules.json):
+        1. Exclusions textuelles (🔰, #R, #X par défaut)
+        2. Règle du MIROIR et exclusions sur les parenthèses, les moins coûteuses d'abord
         3. Vérification du cooldown
         Returns: (should_predict, game_number, predicted_costume)
         """
+        parsed = self.parse(message)
+        plan = self.rules.current()
+
         # Extract game number
-        game_number = self.extract_game_number(message)
+        game_number = parsed.game_number
         if not game_number:
             return False, None, None
 
-        logger.debug(f"🔮 PRÉDICTION - Analyse du jeu {game_number}")
+        logger.debug("🔮 PRÉDICTION - Analyse du jeu %s", game_number)
 
         # EXCLUSIONS PRIORITAIRES - 🔰 EST EXCLU (car indique finalisation)
-        if '🔰' in message:
-            logger.info(f"🔮 EXCLUSION - Jeu {game_number}: Contient 🔰 (finalisation), pas de prédiction")
-            return False, None, None
-
-        if '#R' in message:
-            logger.info(f"🔮 EXCLUSION - Jeu {game_number}: Contient #R, pas de prédiction")
-            return False, None, None
-
-        if '#X' in message:
-            logger.info(f"🔮 EXCLUSION - Jeu {game_number}: Contient #X (match nul), pas de prédiction")
+        excluded = plan.excluded(parsed)
+        if excluded:
+            logger.debug("🔮 EXCLUSION - Jeu %s: %s, pas de prédiction", game_number, excluded)
             return False, None, None
 
-        # Check if this is a temporary message (should wait for final edit)
-        if self.has_pending_indicators(message) and not self.has_completion_indicators(message):
-            logger.info(f"🔮 Jeu {game_number}: Message temporaire (⏰▶🕐➡️), attente finalisation")
-            self.temporary_messages[game_number] = message
+        # Check if this is a temporary message (should wait for final edit; tracked by track_post)
+        if parsed.has_pending and not self.has_completion_indicators(parsed):
+            logger.debug("🔮 Jeu %s: Message temporaire (⏰▶🕐➡️), attente finalisation", game_number)
             return False, None, None
 
-        # Skip if we already have a prediction for target game number (+2)
-        target_game = game_number + 2
+        # Skip if we already have a prediction for the target game
+        target_game = game_number + plan.target_offset
         if target_game in self.predictions and self.predictions[target_game].get('status') == 'pending':
-            logger.info(f"🔮 Jeu {game_number}: Prédiction N{target_game} déjà existante, éviter doublon")
+            logger.debug("🔮 Jeu %s: Prédiction N%s déjà existante, éviter doublon", game_number, target_game)
             return False, None, None
 
         # Check if this is a final message (has completion indicators)
-        if self.has_completion_indicators(message):
-            logger.info(f"🔮 Jeu {game_number}: Message final détecté (✅ ou 🔰)")
-            # Remove from temporary if it was there
-            if game_number in self.temporary_messages:
-                del self.temporary_messages[game_number]
-                logger.info(f"🔮 Jeu {game_number}: Retiré des messages temporaires")
+        if self.has_completion_indicators(parsed):
+            logger.debug("🔮 Jeu %s: Message final détecté (✅ ou 🔰)", game_number)
 
         # If the message still has waiting indicators, don't process
-        elif self.has_pending_indicators(message):
-            logger.info(f"🔮 Jeu {game_number}: Encore des indicateurs d'attente, pas de prédiction")
+        elif parsed.has_pending:
+            logger.debug("🔮 Jeu %s: Encore des indicateurs d'attente, pas de prédiction", game_number)
             return False, None, None
 
-        # CHECK COOLDOWN BEFORE ANY PREDICTION
-        if not self.can_make_prediction():
-            logger.info(f"🔮 COOLDOWN - Jeu {game_number}: Attente cooldown de {self.prediction_cooldown}s, prédiction différée")
+        # RÈGLE DU MIROIR + EXCLUSIONS SUR LES PARENTHÈSES (sans état, avant le cooldown)
+        predicted_costume, reason = plan.decide(parsed)
+        if not predicted_costume:
+            logger.debug("🔮 EXCLUSION - Jeu %s: %s, pas de prédiction (parenthèses: %s)", game_number, reason, parsed.sections)
             return False, None, None
+        logger.debug("🔮 MIRROR RULE APPLIED: → Predict %s", predicted_costume)
 
-        # NEW MIRROR RULE: Analyze all colors in the message
-        mirror_prediction = self.check_mirror_rule(message)
-        if mirror_prediction:
-            predicted_costume = mirror_prediction
-            logger.info(f"🔮 MIRROR RULE APPLIED: → Predict {predicted_costume}")
-        else:
-            logger.info(f"🔮 MIRROR RULE - Game {game_number}: Not enough identical colors (need 3+)")
+        # CHECK COOLDOWN BEFORE ANY PREDICTION
+        if not self.can_make_prediction():
+            logger.debug("🔮 COOLDOWN - Jeu %s: Attente cooldown de %ss, prédiction différée", game_number, self.prediction_cooldown)
             return False, None, None
 
-        # NEW EXCLUSION: Check if there are 3 identical cards in a parenthesis
-        pattern = r'\(([^)]+)\)'
-        matches = re.findall(pattern, message) # Use original message for finding parentheses
-
-        for i, parenthese_content in enumerate(matches):
-            # Also normalize ❤️ in this parenthesis
-            normalized_parenthese = parenthese_content.replace("❤️", "♥️")
-
-            # Count costumes in this parenthesis
-            costume_counts = {
-                "♥️": normalized_parenthese.count("♥️"),
-                "♠️": normalized_parenthese.count("♠️"),
-                "♦️": normalized_parenthese.count("♦️"),
-                "♣️": normalized_parenthese.count("♣️")
-            }
-
-            # Check if any color appears 3 or more times in this parenthesis
-            for costume, count in costume_counts.items():
-                if count >= 3:
-                    logger.info(f"🔮 EQUALITY EXCLUSION - Parenthesis {i+1}: {count}x{costume} detected, no prediction")
-                    logger.info(f"🔮 EXCLUSION - Content: {normalized_parenthese}")
-                    return False, None, None
-
-        # NOUVELLE EXCLUSION COMBINÉE CLARIFIÉE: Vérifier qu'UNE SEULE couleur a 3+ occurrences
-        if len(matches) >= 2:
-            # Combiner le contenu des deux premières parenthèses
-            combined_content = matches[0] + matches[1]
-            normalized_combined = combined_content.replace("❤️", "♥️")
-
-            # Compter les costumes dans les deux parenthèses combinées
-            combined_costume_counts = {
-                "♥️": normalized_combined.count("♥️"),
-                "♠️": normalized_combined.count("♠️"),
-                "♦️": normalized_combined.count("♦️"),
-                "♣️": normalized_combined.count("♣️")
-            }
-
-            # Compter combien de couleurs différentes ont 3+ occurrences
-            costumes_with_3_plus = []
-            for costume, count in combined_costume_counts.items():
-                if count >= 3:
-                    costumes_with_3_plus.append(f"{count}x{costume}")
-
-            # Si 2 ou plus de couleurs différentes ont chacune 3+ occurrences → EXCLUSION
-            if len(costumes_with_3_plus) >= 2:
-                logger.info(f"🔮 EXCLUSION MULTIPLE - {len(costumes_with_3_plus)} couleurs avec 3+ occurrences: {costumes_with_3_plus}")
-                logger.info(f"🔮 EXCLUSION - Parenthèse 1: {matches[0]}")
-                logger.info(f"🔮 EXCLUSION - Parenthèse 2: {matches[1]}")
+        # Atomic decision per source game: duplicate check + cooldown claim (safe across workers)
+        with self.state.lock(('game', game_number)):
+            if game_number in self.processed_messages:
+                logger.debug("🔮 PREDICTION - Game %s: ⚠️ Already processed", game_number)
                 return False, None, None
-
-            # Si AUCUNE couleur n'a 3+ occurrences → EXCLUSION (pas assez pour règle miroir)
-            if len(costumes_with_3_plus) == 0:
-                logger.info(f"🔮 EXCLUSION MIROIR - Aucune couleur n'a 3+ occurrences combinées")
-                logger.info(f"🔮 EXCLUSION - Comptage combiné: {combined_costume_counts}")
-                return False, None, None
-
-
-        if predicted_costume:
-            # Prevent duplicate processing
-            message_hash = hash(message)
-            if message_hash not in self.processed_messages:
-                self.processed_messages.add(message_hash)
-                # Update last prediction timestamp and save
-                self.last_prediction_time = time.time()
-                self._save_last_prediction_time()
-                logger.info(f"🔮 PREDICTION - Game {game_number}: GENERATING prediction for game {target_game} with costume {predicted_costume}")
-                logger.info(f"⏰ COOLDOWN - Next prediction possible in {self.prediction_cooldown}s")
-                return True, game_number, predicted_costume
-            else:
-                logger.info(f"🔮 PREDICTION - Game {game_number}: ⚠️ Already processed")
+            # Update last prediction timestamp only if no other worker took the slot
+            if not self.state.claim_cooldown(self.clock(), self.prediction_cooldown):
+                logger.debug("🔮 COOLDOWN - Jeu %s: Créneau déjà pris par une autre prédiction", game_number)
                 return False, None, None
+            self.processed_messages.add(game_number)
+        self._save_last_prediction_time()
+        logger.debug("🔮 PREDICTION - Game %s: GENERATING prediction for game %s with costume %s", game_number, target_game, predicted_costume)
+        logger.debug("⏰ COOLDOWN - Next prediction possible in %ss", self.prediction_cooldown)
+        return True, game_number, predicted_costume
 
-        return False, None, None
+    @property
+    def target_offset(self) -> int:
+        """Games between the source message and the predicted game (+2 by default)"""
+        return self.rules.current().target_offset
 
     def make_prediction(self, game_number: int, predicted_costume: str) -> str:
-        """Make a prediction for game +2 with the predicted costume"""
-        target_game = game_number + 2
+        """Make a prediction for game +target_offset with the predicted costume"""
+        target_game = game_number + self.target_offset
 
         # Simplified prediction message format
         prediction_text = f"🔵{target_game}🔵:{predicted_costume}statut :⏳"
 
         # Store the prediction for later verification
-        self.predictions[target_game] = {
+        self._store_prediction(target_game, {
             'predicted_costume': predicted_costume,
             'status': 'pending',
             'predicted_from': game_number,
             'verification_count': 0,
             'message_text': prediction_text
-        }
+        })
+        self.pending_games.add(target_game)
+        PREDICTIONS_MADE.inc()
 
-        logger.info(f"Made prediction for game {target_game} based on costume {predicted_costume}")
+        logger.info("Made prediction for game %s based on costume %s", target_game, predicted_costume)
         return prediction_text
 
-    def get_costume_text(self, costume_emoji: str) -> str:
-        """Convert costume emoji to text representation"""
-        costume_map = {
-            "♠️": "pique",
-            "♥️": "coeur",
-            "♦️": "carreau",
-            "♣️": "trèfle"
-        }
-        return costume_map.get(costume_emoji, "inconnu")
-
-    def count_cards_in_winning_parentheses(self, message: str) -> int:
-        """Count the number of card symbols in the parentheses that has the 🔰 symbol"""
-        # Split message at 🔰 to find which section won
-        if '🔰' not in message:
-            return 0
-
-        # Find the parentheses after 🔰
-        checkmark_pos = message.find('🔰')
-        remaining_text = message[checkmark_pos:]
-
-        # Extract parentheses content after 🔰
-        pattern = r'\(([^)]+)\)'
-        match = re.search(pattern, remaining_text)
-
-        if match:
-            winning_content = match.group(1)
-            # Normalize ❤️ to ♥️ for consistent counting
-            normalized_content = winning_content.replace("❤️", "♥️")
-            card_count = 0
-            for symbol in ["♠️", "♥️", "♦️", "♣️"]:
-                card_count += normalized_content.count(symbol)
-            logger.info(f"Found 🔰 winning section: {winning_content}, card count: {card_count}")
-            return card_count
-
-        return 0
+    def evaluate_batch(self, messages: Sequence[MessageInput], edited: Union[bool, Sequence[bool]] = True,
+                       timestamps: Optional[Sequence[float]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Run a batch of messages through prediction and verification (backtests, catch-up).
+
+        Decisions and state changes are exactly those of the per-message path,
+        in order: for each finalized message (✅/🔰), should_predict then
+        make_prediction if edited, then verify_all. The
+        stateless rules run over the whole batch first (batch_rules, on NumPy
+        arrays when available); a message is only parsed when it can still
+        predict or has a pending prediction to settle. timestamps (one per
+        message) move a ManualClock so the cooldown follows the recorded times.
+        """
+        size = len(messages)
+        flags = [edited] * size if isinstance(edited, bool) else list(edited)
+        if len(flags) != size or (timestamps is not None and len(timestamps) != size):
+            raise ValueError("edited and timestamps need one entry per message")
+        if timestamps is not None and not hasattr(self.clock, 'set'):
+            raise ValueError("timestamps need a ManualClock")
+
+        started = time.perf_counter()
+        texts = [message.text if isinstance(message, ParsedGameMessage) else message for message in messages]
+        plan = self.rules.current()
+        finalized, may_predict = screen_messages(texts, plan)
+        candidates = [index for index in range(size) if may_predict[index] and flags[index]]
+        parsed: Dict[int, ParsedGameMessage] = {index: parse_message(messages[index]) for index in candidates}
+        costumes = dict(zip(candidates, rule_costumes([parsed[index] for index in candidates], plan)))
+        RULES_SECONDS.observe(time.perf_counter() - started)
+
+        predictions: List[Dict[str, Any]] = []
+        verifications: List[Dict[str, Any]] = []
+        for index in range(size):
+            if not finalized[index]:
+                continue
+            if timestamps is not None:
+                self.clock.set(timestamps[index])
+            message = parsed.get(index)
+            if message is None:
+                match = GAME_NUMBER_PATTERN.search(texts[index])
+                game_number = int(match.group(1)) if match else None
+            else:
+                game_number = message.game_number
+
+            # Rejected by the rules: should_predict would change nothing
+            if flags[index] and costumes.get(index):
+                if message is None:
+                    message = parsed[index] = parse_message(messages[index])
+                should_predict, source_game, costume = self._should_predict(message)
+                if should_predict and source_game is not None and costume is not None:
+                    predictions.append({
+                        'index': index,
+                        'game_number': source_game,
+                        'predicted_game': source_game + self.target_offset,
+                        'costume': costume,
+                        'message': self.make_prediction(source_game, costume),
+                    })
+
+            # Nothing pending at or before this game: verification would return None
+            first_pending = self.pending_games.first()
+            if not game_number or first_pending is None or first_pending > game_number:
+                continue
+            if message is None:
+                message = parsed[index] = parse_message(messages[index])
+            for result in self.verify_all(message, is_edited=flags[index]):
+                result['index'] = index
+                verifications.append(result)
 
-    def count_cards_in_first_parentheses(self, message: str) -> int:
-        """Count the total number of card symbols in the first parentheses"""
-        # Find first parentheses content
-        pattern = r'\(([^)]+)\)'
-        match = re.search(pattern, message)
-
-        if match:
-            first_content = match.group(1)
-            # Normalize ❤️ to ♥♥️ for consistent counting
-            normalized_content = first_content.replace("❤️", "♥️")
-            card_count = 0
-            for symbol in ["♠️", "♥️", "♦️", "♣️"]:
-                card_count += normalized_content.count(symbol)
-            logger.info(f"Found first parentheses: {first_content}, card count: {card_count}")
-            return card_count
+        logger.debug("📦 LOT - %s messages, %s prédictions, %s vérifications", size, len(predictions), len(verifications))
+        return {'predictions': predictions, 'verifications': verifications}
 
-        return 0
+    def verify_all(self, message: MessageInput, is_edited: bool = False) -> List[Dict]:
+        """Settle every pending prediction this result decides, oldest first.
 
-    def verify_prediction(self, message: str) -> Optional[Dict]:
+        One result can settle several predictions: #N13 settles the
+        prediction for 12 at offset +1 and the one for 13 at offset 0.
+        """
+        results = []
+        while True:
+            result = self._verify_prediction_common(message, is_edited=is_edited)
+            if result is None:
+                return results
+            results.append(result)
+
+    def verify_prediction(self, message: MessageInput) -> Optional[Dict]:
         """Verify if a prediction was correct (regular messages)"""
         return self._verify_prediction_common(message, is_edited=False)
 
-    def verify_prediction_from_edit(self, message: str) -> Optional[Dict]:
+    def verify_prediction_from_edit(self, message: MessageInput) -> Optional[Dict]:
         """Verify if a prediction was correct from edited message (enhanced verification)"""
         return self._verify_prediction_common(message, is_edited=True)
 
-    def check_costume_in_first_parentheses(self, message: str, predicted_costume: str) -> bool:
+    def check_costume_in_first_parentheses(self, message: MessageInput, predicted_costume: str) -> bool:
         """Vérifier si le costume prédit apparaît SEULEMENT dans le PREMIER parenthèses"""
-        # Normaliser ❤️ vers ♥️ pour cohérence
-        normalized_message = message.replace("❤️", "♥️")
-        normalized_costume = predicted_costume.replace("❤️", "♥️")
-
-        # Extraire SEULEMENT le contenu du PREMIER parenthèses
-        pattern = r'\(([^)]+)\)'
-        matches = re.findall(pattern, normalized_message)
+        parsed = self.parse(message)
 
-        if not matches:
-            logger.info(f"🔍 Aucun parenthèses trouvé dans le message")
+        if not parsed.sections:
+            logger.debug("🔍 Aucun parenthèses trouvé dans le message")
             return False
 
-        first_parentheses_content = matches[0]  # SEULEMENT le premier
-        logger.info(f"🔍 VÉRIFICATION PREMIER PARENTHÈSES SEULEMENT: {first_parentheses_content}")
+        logger.debug("🔍 VÉRIFICATION PREMIER PARENTHÈSES SEULEMENT: %s", parsed.sections[0])
 
-        costume_found = normalized_costume in first_parentheses_content
-        logger.info(f"🔍 Recherche costume {normalized_costume} dans PREMIER parenthèses: {costume_found}")
+        costume_found = parsed.first_section_has(predicted_costume)
+        logger.debug("🔍 Recherche costume %s dans PREMIER parenthèses: %s", predicted_costume, costume_found)
         return costume_found
 
-    def _verify_prediction_common(self, text: str, is_edited: bool = False) -> Optional[Dict]:
+    def verify_in_order(self, message: MessageInput, is_edited: bool = False) -> List[Dict]:
+        """Verify a finalized result once the games before it have been verified.
+
+        Results that arrive ahead of a missing game are held by the reorder
+        buffer (at most REORDER_GAP_TIMEOUT seconds), so a late offset-0
+        result is never pre-empted by an offset-2 one. Returns the
+        verification results of every result released by this call, oldest
+        game first. The order holds within one worker process.
+        """
+        parsed = self.parse(message)
+        if not parsed.game_number or not self.has_completion_indicators(parsed):
+            return []
+        with self._verify_lock:
+            return self._verify_released(self.reorder.push(parsed.game_number, (parsed, is_edited)))
+
+    def verify_expired(self) -> List[Dict]:
+        """Verify the held results whose gap timed out (called periodically)"""
+        if not len(self.reorder):
+            return []
+        with self._verify_lock:
+            return self._verify_released(self.reorder.expire())
+
+    def _verify_released(self, released: List[Tuple[ParsedGameMessage, bool]]) -> List[Dict]:
+        results = []
+        for parsed, is_edited in released:
+            results += self.verify_all(parsed, is_edited=is_edited)
+        return results
+
+    def _verify_prediction_common(self, text: MessageInput, is_edited: bool = False) -> Optional[Dict]:
+        """Settle the oldest eligible pending prediction (timed and counted for /metrics)"""
+        started = time.perf_counter()
+        result = self._verify_pending(text, is_edited)
+        VERIFY_SECONDS.observe(time.perf_counter() - started)
+        if result:
+            PREDICTIONS_SETTLED.inc(result['status'])
+            prediction = self.predictions.get(result['predicted_game']) or {}
+            self.stats.record(result['predicted_game'], prediction.get('predicted_costume'), result['status'])
+        return result
+
+    def _verify_pending(self, text: MessageInput, is_edited: bool = False) -> Optional[Dict]:
         """SYSTÈME DE VÉRIFICATION CORRIGÉ - Vérifie décalage +0, +1, puis ⭕ après +2"""
-        game_number = self.extract_game_number(text)
+        parsed = self.parse(text)
+        game_number = parsed.game_number
         if not game_number:
             return None
 
-        logger.info(f"🔍 VÉRIFICATION CORRIGÉE - Jeu {game_number} (édité: {is_edited})")
+        logger.debug("🔍 VÉRIFICATION CORRIGÉE - Jeu %s (édité: %s)", game_number, is_edited)
 
         # SYSTÈME DE VÉRIFICATION: Sur messages édités OU normaux avec symbole succès (✅ ou 🔰)
-        has_success_symbol = self.has_completion_indicators(text)
+        has_success_symbol = self.has_completion_indicators(parsed)
         if not has_success_symbol:
-            logger.info(f"🔍 ⏸️ Pas de vérification - Aucun symbole de succès (✅ ou 🔰) trouvé")
+            logger.debug("🔍 ⏸️ Pas de vérification - Aucun symbole de succès (✅ ou 🔰) trouvé")
             return None
 
-        logger.info(f"🔍 📊 ÉTAT ACTUEL - Prédictions stockées: {list(self.predictions.keys())}")
-        logger.info(f"🔍 📊 ÉTAT ACTUEL - Messages envoyés: {list(self.sent_predictions.keys())}")
-
-        # Si aucune prédiction stockée, pas de vérification possible
-        if not self.predictions:
-            logger.info(f"🔍 ✅ VÉRIFICATION TERMINÉE - Aucune prédiction éligible pour le jeu {game_number}")
-            return None
+        logger.debug("🔍 📊 ÉTAT ACTUEL - Prédictions stockées: %s, en attente: %s", len(self.predictions), len(self.pending_games))
+        logger.debug("🔍 📊 ÉTAT ACTUEL - Messages envoyés: %s", len(self.sent_predictions))
 
         # VÉRIFICATION SÉQUENTIELLE: offset 0 → si échec → offset +1 → si échec → ⭕
-        for predicted_game in sorted(self.predictions.keys()):
-            prediction = self.predictions[predicted_game]
-
-            # Vérifier seulement les prédictions en attente
-            if prediction.get('status') != 'pending':
-                logger.info(f"🔍 ⏭️ Prédiction {predicted_game} déjà traitée (statut: {prediction.get('status')})")
-                continue
-
-            verification_offset = game_number - predicted_game
-            logger.info(f"🔍 🎯 VÉRIFICATION - Prédiction {predicted_game} vs jeu actuel {game_number}, décalage: {verification_offset}")
-
-            predicted_costume = prediction.get('predicted_costume')
-            if not predicted_costume:
-                logger.info(f"🔍 ❌ Pas de costume prédit stocké pour le jeu {predicted_game}")
-                continue
-
-            # ÉTAPE 1: VÉRIFIER DÉCALAGE +0 (jeu prédit exact)
-            if verification_offset == 0:
-                logger.info(f"🔍 ⚡ VÉRIFICATION OFFSET 0 - Jeu {game_number}: Recherche costume {predicted_costume}")
-                
-                costume_found = self.check_costume_in_first_parentheses(text, predicted_costume)
-
-                if costume_found:
-                    # SUCCÈS à offset 0
-                    status_symbol = "✅0️⃣"
-                    original_message = f"🔵{predicted_game}🔵:{predicted_costume}statut :⏳"
-                    updated_message = f"🔵{predicted_game}🔵:{predicted_costume}statut :{status_symbol}"
-
-                    prediction['status'] = 'correct'
-                    prediction['verification_count'] = 0
-                    prediction['final_message'] = updated_message
+        # Seule la plus ancienne prédiction en attente peut être concernée: toute
+        # prédiction plus récente vise un jeu postérieur au jeu actuel.
+        while True:
+            predicted_game = self.pending_games.first()
+            if predicted_game is None or predicted_game > game_number:
+                break
+
+            # Verrou par jeu prédit: un seul worker règle une prédiction donnée
+            with self.state.lock(('game', predicted_game)):
+                # Vérifier seulement les prédictions en attente (index nettoyé au passage)
+                prediction = self.predictions.get(predicted_game)
+                if prediction is None or prediction.get('status') != 'pending':
+                    self.pending_games.discard(predicted_game)
+                    continue
 
-                    logger.info(f"🔍 ✅ SUCCÈS OFFSET 0 - Costume {predicted_costume} trouvé")
-                    logger.info(f"🔍 🛑 ARRÊT - Vérification terminée: {status_symbol}")
+                verification_offset = game_number - predicted_game
+                logger.debug("🔍 🎯 VÉRIFICATION - Prédiction %s vs jeu actuel %s, décalage: %s", predicted_game, game_number, verification_offset)
 
-                    return {
-                        'type': 'edit_message',
-                        'predicted_game': predicted_game,
-                        'new_message': updated_message,
-                        'original_message': original_message
-                    }
-                else:
-                    # ÉCHEC à offset 0 - RESTE PENDING, attendre offset +1
-                    logger.info(f"🔍 ❌ ÉCHEC OFFSET 0 - Costume {predicted_costume} non trouvé, attente offset +1")
+                predicted_costume = prediction.get('predicted_costume')
+                if not predicted_costume:
+                    # Prédiction inexploitable: la sortir de l'attente pour passer à la suivante
+                    logger.debug("🔍 ❌ Pas de costume prédit stocké pour le jeu %s", predicted_game)
+                    prediction['status'] = 'invalid'
+                    self._store_prediction(predicted_game, prediction)
+                    self.pending_games.discard(predicted_game)
                     continue
 
-            # ÉTAPE 2: VÉRIFIER DÉCALAGE +1 (jeu prédit +1)
-            elif verification_offset == 1:
-                logger.info(f"🔍 ⚡ VÉRIFICATION OFFSET +1 - Jeu {game_number}: Recherche costume {predicted_costume}")
+                # ÉTAPE 1: VÉRIFIER DÉCALAGE +0 (jeu prédit exact)
+                if verification_offset == 0:
+                    logger.debug("🔍 ⚡ VÉRIFICATION OFFSET 0 - Jeu %s: Recherche costume %s", game_number, predicted_costume)
                 
-                costume_found = self.check_costume_in_first_parentheses(text, predicted_costume)
-
-                if costume_found:
-                    # SUCCÈS à offset +1
-                    status_symbol = "✅1️⃣"
-                    original_message = f"🔵{predicted_game}🔵:{predicted_costume}statut :⏳"
-                    updated_message = f"🔵{predicted_game}🔵:{predicted_costume}statut :{status_symbol}"
-
-                    prediction['status'] = 'correct'
-                    prediction['verification_count'] = 1
-                    prediction['final_message'] = updated_message
-
-                    logger.info(f"🔍 ✅ SUCCÈS OFFSET +1 - Costume {predicted_costume} trouvé")
-                    logger.info(f"🔍 🛑 ARRÊT - Vérification terminée: {status_symbol}")
-
-                    return {
-                        'type': 'edit_message',
-                        'predicted_game': predicted_game,
-                        'new_message': updated_message,
-                        'original_message': original_message
-                    }
-                else:
-                    # ÉCHEC à offset +1 - MARQUER ⭕ IMMÉDIATEMENT
+                    costume_found = self.check_costume_in_first_parentheses(parsed, predicted_costume)
+
+                    if costume_found:
+                        # SUCCÈS à offset 0
+                        status_symbol = "✅0️⃣"
+                        original_message = f"🔵{predicted_game}🔵:{predicted_costume}statut :⏳"
+                        updated_message = f"🔵{predicted_game}🔵:{predicted_costume}statut :{status_symbol}"
+
+                        prediction['status'] = 'correct'
+                        prediction['verification_count'] = 0
+                        prediction['final_message'] = updated_message
+                        self._store_prediction(predicted_game, prediction)  # Relance la rétention à partir du règlement
+                        self.pending_games.discard(predicted_game)
+
+                        logger.info("🔍 ✅ SUCCÈS OFFSET 0 - Prédiction %s: costume %s trouvé", predicted_game, predicted_costume)
+                        logger.debug("🔍 🛑 ARRÊT - Vérification terminée: %s", status_symbol)
+
+                        return {
+                            'type': 'edit_message',
+                            'predicted_game': predicted_game,
+                            'new_message': updated_message,
+                            'original_message': original_message,
+                            'status': status_symbol,
+                            'offset': verification_offset
+                        }
+                    else:
+                        # ÉCHEC à offset 0 - RESTE PENDING, attendre offset +1
+                        logger.debug("🔍 ❌ ÉCHEC OFFSET 0 - Costume %s non trouvé, attente offset +1", predicted_costume)
+                        break
+
+                # ÉTAPE 2: VÉRIFIER DÉCALAGE +1 (jeu prédit +1)
+                elif verification_offset == 1:
+                    logger.debug("🔍 ⚡ VÉRIFICATION OFFSET +1 - Jeu %s: Recherche costume %s", game_number, predicted_costume)
+                
+                    costume_found = self.check_costume_in_first_parentheses(parsed, predicted_costume)
+
+                    if costume_found:
+                        # SUCCÈS à offset +1
+                        status_symbol = "✅1️⃣"
+                        original_message = f"🔵{predicted_game}🔵:{predicted_costume}statut :⏳"
+                        updated_message = f"🔵{predicted_game}🔵:{predicted_costume}statut :{status_symbol}"
+
+                        prediction['status'] = 'correct'
+                        prediction['verification_count'] = 1
+                        prediction['final_message'] = updated_message
+                        self._store_prediction(predicted_game, prediction)
+                        self.pending_games.discard(predicted_game)
+
+                        logger.info("🔍 ✅ SUCCÈS OFFSET +1 - Prédiction %s: costume %s trouvé", predicted_game, predicted_costume)
+                        logger.debug("🔍 🛑 ARRÊT - Vérification terminée: %s", status_symbol)
+
+                        return {
+                            'type': 'edit_message',
+                            'predicted_game': predicted_game,
+                            'new_message': updated_message,
+                            'original_message': original_message,
+                            'status': status_symbol,
+                            'offset': verification_offset
+                        }
+                    else:
+                        # ÉCHEC à offset +1 - MARQUER ⭕ IMMÉDIATEMENT
+                        original_message = f"🔵{predicted_game}🔵:{predicted_costume}statut :⏳"
+                        updated_message = f"🔵{predicted_game}🔵:{predicted_costume}statut :⭕"
+
+                        prediction['status'] = 'failed'
+                        prediction['final_message'] = updated_message
+                        self._store_prediction(predicted_game, prediction)
+                        self.pending_games.discard(predicted_game)
+
+                        logger.info("🔍 ❌ ÉCHEC OFFSET +1 - Prédiction %s: costume %s non trouvé", predicted_game, predicted_costume)
+                        logger.debug("🔍 🛑 ARRÊT ÉCHEC - Prédiction marquée: ⭕")
+
+                        return {
+                            'type': 'edit_message',
+                            'predicted_game': predicted_game,
+                            'new_message': updated_message,
+                            'original_message': original_message,
+                            'status': '⭕',
+                            'offset': verification_offset
+                        }
+            
+                # Ignorer les autres offsets (>1)
+                elif verification_offset >= 2:
+                    # Si le jeu actuel est deux jeux ou plus après la prédiction, elle a échoué.
                     original_message = f"🔵{predicted_game}🔵:{predicted_costume}statut :⏳"
                     updated_message = f"🔵{predicted_game}🔵:{predicted_costume}statut :⭕"
 
                     prediction['status'] = 'failed'
                     prediction['final_message'] = updated_message
-
-                    logger.info(f"🔍 ❌ ÉCHEC OFFSET +1 - Costume {predicted_costume} non trouvé")
-                    logger.info(f"🔍 🛑 ARRÊT ÉCHEC - Prédiction marquée: ⭕")
+                    self._store_prediction(predicted_game, prediction)
+                    self.pending_games.discard(predicted_game)
+                
+                    logger.info("🔍 ❌ ÉCHEC AUTOMATIQUE - Prédiction %s: offset %s >= 2, marquée: ⭕", predicted_game, verification_offset)
 
                     return {
                         'type': 'edit_message',
                         'predicted_game': predicted_game,
                         'new_message': updated_message,
-                        'original_message': original_message
+                        'original_message': original_message,
+                        'status': '⭕',
+                        'offset': verification_offset
                     }
-            
-            # Ignorer les autres offsets (>1)
-            elif verification_offset >= 2:
-                # Si le jeu actuel est deux jeux ou plus après la prédiction, elle a échoué.
-                original_message = f"🔵{predicted_game}🔵:{predicted_costume}statut :⏳"
-                updated_message = f"🔵{predicted_game}🔵:{predicted_costume}statut :⭕"
-
-                prediction['status'] = 'failed'
-                prediction['final_message'] = updated_message
-                
-                logger.info(f"🔍 ❌ ÉCHEC AUTOMATIQUE - Offset {verification_offset} >= 2, prédiction marquée: ⭕")
-
-                return {
-                    'type': 'edit_message',
-                    'predicted_game': predicted_game,
-                    'new_message': updated_message,
-                    'original_message': original_message
-                }
-            else:
-                logger.info(f"🔍 ⏭️ OFFSET {verification_offset} ignoré - Vérification terminée pour cette prédiction")
-                continue
+                else:
+                    logger.debug("🔍 ⏭️ OFFSET %s ignoré - Vérification terminée pour cette prédiction", verification_offset)
+                    break
 
-        logger.info(f"🔍 ✅ VÉRIFICATION TERMINÉE - Aucune prédiction éligible pour le jeu {game_number}")
+        logger.debug("🔍 ✅ VÉRIFICATION TERMINÉE - Aucune prédiction éligible pour le jeu %s", game_number)
         return None
 
-# Global instance
-card_predictor = CardPredictor()
+def create_predictor(source_chat_id: Optional[int] = None) -> CardPredictor:
+    """Build the predictor of one source channel for the configured state backend.
+
+    Each source channel has its own database file (and event log directory);
+    the default channel keeps STATE_DB_PATH (and EVENT_LOG_DIR).
+    """
+    if source_chat_id == TARGET_CHANNEL_ID:
+        source_chat_id = None
+    path = state_db_path(source_chat_id)
+    if STATE_BACKEND == 'sqlite':
+        # Several gunicorn workers read and write the same SQLite state
+        return CardPredictor(state=create_state_backend(path))
+    # Single worker: in-process state, persisted write-behind across restarts
+    return CardPredictor(state_db=open_state_database(path), event_log=open_event_log(event_log_dir(source_chat_id)))
+
+# Global instance (default source channel)
+card_predictor = create_predictor()
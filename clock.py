@@ -0,0 +1,55 @@
+"""
+Injectable time sources: system clock for production, manual clock for replays and tests
+"""
+
+import threading
+import time
+
+
+class SystemClock:
+    """Epoch seconds that advance with the monotonic clock.
+
+    The value is anchored to time.time() once, so it can be persisted and
+    compared across restarts like a timestamp, but wall-clock steps (NTP,
+    manual changes) never make it jump or run backwards.
+    """
+
+    def __init__(self):
+        self._wall_anchor = time.time()
+        self._monotonic_anchor = time.monotonic()
+
+    def __call__(self) -> float:
+        return self._wall_anchor + (time.monotonic() - self._monotonic_anchor)
+
+    def __repr__(self) -> str:
+        return 'SystemClock()'
+
+
+class ManualClock:
+    """Clock that only moves when told to (replays, load tests, simulations)"""
+
+    def __init__(self, start: float = 0.0):
+        self._now = float(start)
+        self._lock = threading.Lock()
+
+    def __call__(self) -> float:
+        return self._now
+
+    def advance(self, seconds: float) -> float:
+        with self._lock:
+            self._now += seconds
+            return self._now
+
+    def set(self, timestamp: float) -> float:
+        """Move to timestamp; earlier timestamps are ignored so time never runs backwards"""
+        with self._lock:
+            if timestamp > self._now:
+                self._now = float(timestamp)
+            return self._now
+
+    def __repr__(self) -> str:
+        return f'ManualClock({self._now})'
+
+
+# Process-wide production clock
+system_clock = SystemClock()
@@ -0,0 +1,62 @@
+"""
+Idempotency layer dropping repeated Telegram updates before any parsing
+"""
+
+import hashlib
+import logging
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from state_store import BoundedSet
+
+logger = logging.getLogger(__name__)
+
+# Update payload keys that carry a message
+MESSAGE_KEYS = ('message', 'edited_message', 'channel_post', 'edited_channel_post')
+
+
+class UpdateDeduplicator:
+    """Sliding window of recently seen updates.
+
+    An update is a duplicate when its update_id was already seen (Telegram
+    webhook retry) or when the same message revision - (chat_id, message_id,
+    edit_date, content hash) - already arrived through another update.
+    edit_date has a one-second resolution: two edits within the same second
+    (⏰ then ✅) differ only by their text, hence the hash.
+    """
+
+    def __init__(self, window: int = 5000, ttl: float = 900, clock: Callable[[], float] = time.monotonic):
+        self._seen = BoundedSet(max_size=window, ttl=ttl, clock=clock, name='updates')
+        self.accepted = 0
+        self.duplicates = 0
+
+    @staticmethod
+    def update_keys(update: Dict[str, Any]) -> List[Tuple]:
+        """Identity keys of an update"""
+        keys = []
+        if 'update_id' in update:
+            keys.append(('update', update['update_id']))
+        for name in MESSAGE_KEYS:
+            message = update.get(name)
+            if message and 'message_id' in message:
+                chat_id = message.get('chat', {}).get('id')
+                content = (message.get('text') or message.get('caption') or '').encode('utf-8')
+                keys.append(('message', chat_id, message['message_id'], message.get('edit_date', 0),
+                             hashlib.blake2b(content, digest_size=16).digest()))
+        return keys
+
+    def is_duplicate(self, update: Dict[str, Any]) -> bool:
+        """Check an update and remember it; True means it must be dropped"""
+        # One atomic check-and-insert: two threads given the same post never both accept it
+        if not self._seen.add_if_absent(*self.update_keys(update)):
+            self.duplicates += 1
+            return True
+        self.accepted += 1
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'accepted': self.accepted,
+            'duplicates': self.duplicates,
+            'window': self._seen.stats(),
+        }
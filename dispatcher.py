@@ -0,0 +1,273 @@
+"""
+Background dispatcher for outbound Telegram API calls
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Number of recent delivery latencies kept for percentile reporting
+LATENCY_SAMPLES = 1000
+
+
+class OutboundJob:
+    """One queued Telegram call (sendMessage, editMessageText, sendDocument)"""
+
+    __slots__ = ('method', 'chat_id', 'payload', 'callback', 'resolve', 'enqueued_at')
+
+    def __init__(self, method: str, chat_id: int, payload: Optional[Dict[str, Any]],
+                 callback: Optional[Callable[[Any], None]] = None,
+                 resolve: Optional[Callable[[], Optional[Dict[str, Any]]]] = None):
+        self.method = method
+        self.chat_id = chat_id
+        self.payload = payload
+        self.callback = callback  # Called in the worker with the delivery result (None if the call raised)
+        self.resolve = resolve    # Builds the payload at delivery time (None = skip)
+        self.enqueued_at = time.monotonic()
+
+
+class _DispatcherStats:
+    """Delivery counters and latency samples shared by both dispatchers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.submitted = 0
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.max_latency = 0.0
+
+    def _payload(self, job: OutboundJob) -> Optional[Dict[str, Any]]:
+        payload = job.resolve() if job.resolve else job.payload
+        if payload is None:
+            logger.warning(f"⚠️ Dispatcher - {job.method} vers {job.chat_id} sans cible, ignoré")
+        return payload
+
+    def _record(self, job: OutboundJob, result: Any) -> None:
+        """Count one delivery and its latency, then hand the result to the callback"""
+        latency = time.monotonic() - job.enqueued_at
+        with self._lock:
+            if result:
+                self.delivered += 1
+            else:
+                self.failed += 1
+            self._latencies.append(latency)
+            if latency > self.max_latency:
+                self.max_latency = latency
+        self._callback(job, result)
+
+    def _record_error(self, job: OutboundJob, error: Exception) -> None:
+        """Count a call that raised; its callback still runs, with None, so waiters learn it failed"""
+        with self._lock:
+            self.failed += 1
+        logger.error(f"❌ Dispatcher - Erreur {job.method} vers {job.chat_id}: {error}")
+        self._callback(job, None)
+
+    def _callback(self, job: OutboundJob, result: Any) -> None:
+        if not job.callback:
+            return
+        try:
+            job.callback(result)
+        except Exception as e:
+            logger.error(f"❌ Dispatcher - Erreur callback {job.method} vers {job.chat_id}: {e}")
+
+    def _stats(self, **extra: Any) -> Dict[str, Any]:
+        """Counters and latency percentiles, after the dispatcher-specific fields"""
+        with self._lock:
+            samples = sorted(self._latencies)
+            stats = dict(extra)
+            stats.update({
+                'submitted': self.submitted,
+                'delivered': self.delivered,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'latency_max_ms': round(self.max_latency * 1000, 1),
+            })
+        if samples:
+            stats['latency_p50_ms'] = round(samples[len(samples) // 2] * 1000, 1)
+            stats['latency_p99_ms'] = round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 1)
+        return stats
+
+
+class OutboundDispatcher(_DispatcherStats):
+    """Bounded worker pool delivering Telegram calls off the webhook thread.
+
+    Jobs are sharded by chat_id so that calls to the same chat keep their
+    order (a prediction is always sent before its verification edit).
+    When a shard is full, submit() blocks for at most put_timeout seconds
+    and then drops the job.
+    """
+
+    def __init__(self, deliver: Callable[[str, Dict[str, Any]], Any], workers: int = 2,
+                 max_queue: int = 500, put_timeout: float = 2.0):
+        super().__init__()
+        self.deliver = deliver
+        self.workers = max(0, workers)
+        self.max_queue = max_queue
+        self.put_timeout = put_timeout
+        self._queues = [queue.Queue(maxsize=max_queue) for _ in range(self.workers)]
+        self._threads = []
+
+    def start(self) -> None:
+        """Start the worker threads (no-op in inline mode)"""
+        if self._threads:
+            return
+        for index, jobs in enumerate(self._queues):
+            thread = threading.Thread(target=self._worker, args=(jobs,),
+                                      name=f"outbound-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"📤 Dispatcher démarré: {self.workers} workers, file max {self.max_queue}")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Drain the queues and stop the workers"""
+        for jobs in self._queues:
+            try:
+                jobs.put(None, timeout=timeout)
+            except queue.Full:
+                logger.warning("⚠️ Dispatcher - File pleine à l'arrêt, worker abandonné")
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, method: str, chat_id: int, payload: Optional[Dict[str, Any]] = None,
+               callback: Optional[Callable[[Any], None]] = None,
+               resolve: Optional[Callable[[], Optional[Dict[str, Any]]]] = None) -> bool:
+        """Queue a call; returns False if it was dropped because of backpressure"""
+        job = OutboundJob(method, chat_id, payload, callback, resolve)
+        with self._lock:
+            self.submitted += 1
+
+        # Inline mode (no workers): deliver synchronously
+        if not self._queues:
+            self._run(job)
+            return True
+
+        jobs = self._queues[hash(chat_id) % self.workers]
+        try:
+            jobs.put(job, timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            logger.error(f"❌ Dispatcher saturé - {method} vers {chat_id} abandonné")
+            return False
+
+    def _worker(self, jobs: queue.Queue) -> None:
+        while True:
+            job = jobs.get()
+            try:
+                if job is None:
+                    return
+                self._run(job)
+            finally:
+                jobs.task_done()
+
+    def _run(self, job: OutboundJob) -> None:
+        try:
+            payload = self._payload(job)
+            if payload is not None:
+                self._record(job, self.deliver(job.method, payload))
+        except Exception as e:
+            self._record_error(job, e)
+
+    def queue_depth(self) -> int:
+        """Number of jobs waiting across all shards"""
+        return sum(jobs.qsize() for jobs in self._queues)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth and delivery latency figures"""
+        return self._stats(workers=self.workers, queue_depth=self.queue_depth(),
+                           queue_capacity=self.max_queue * self.workers)
+
+
+class AsyncOutboundDispatcher(_DispatcherStats):
+    """OutboundDispatcher for an asyncio event loop (ASGI entry point).
+
+    Same submit() contract, but each job is a coroutine on the loop, so
+    hundreds of calls can wait on Telegram at once instead of one per
+    worker thread. Calls to one chat still run in order: every chat has
+    its own queue, drained by one task that exits when it is empty.
+    max_in_flight bounds the calls running at the same time. Past
+    max_queue waiting jobs, new ones are dropped.
+    submit() is thread-safe and can be called from any thread.
+    """
+
+    def __init__(self, deliver: Callable[[str, Dict[str, Any]], Awaitable[Any]],
+                 loop: asyncio.AbstractEventLoop, max_in_flight: int = 100, max_queue: int = 5000):
+        super().__init__()
+        self.deliver = deliver
+        self.loop = loop
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self._chats: Dict[int, deque] = {}
+        self._tasks = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+
+    def start(self) -> None:
+        logger.info(f"📤 Dispatcher asyncio démarré: {self.max_in_flight} appels simultanés max")
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Wait for the queued calls to finish (at most timeout seconds)"""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+    def submit(self, method: str, chat_id: int, payload: Optional[Dict[str, Any]] = None,
+               callback: Optional[Callable[[Any], None]] = None,
+               resolve: Optional[Callable[[], Optional[Dict[str, Any]]]] = None) -> bool:
+        """Queue a call; returns False if it was dropped because of backpressure"""
+        job = OutboundJob(method, chat_id, payload, callback, resolve)
+        with self._lock:
+            self.submitted += 1
+            if self._waiting >= self.max_queue:
+                self.dropped += 1
+                logger.error(f"❌ Dispatcher saturé - {method} vers {chat_id} abandonné")
+                return False
+            self._waiting += 1
+        self.loop.call_soon_threadsafe(self._enqueue, job)
+        return True
+
+    def _enqueue(self, job: OutboundJob) -> None:
+        jobs = self._chats.get(job.chat_id)
+        if jobs is not None:
+            jobs.append(job)
+            return
+        self._chats[job.chat_id] = deque([job])
+        task = self.loop.create_task(self._drain(job.chat_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain(self, chat_id: int) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        jobs = self._chats[chat_id]
+        while jobs:
+            job = jobs.popleft()
+            with self._lock:
+                self._waiting -= 1
+            async with self._slots:
+                await self._run(job)
+        del self._chats[chat_id]
+
+    async def _run(self, job: OutboundJob) -> None:
+        try:
+            payload = self._payload(job)
+            if payload is not None:
+                self._record(job, await self.deliver(job.method, payload))
+        except Exception as e:
+            self._record_error(job, e)
+
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self._stats(mode='asyncio', active_chats=len(self._tasks), queue_depth=self._waiting,
+                           queue_capacity=self.max_queue)
@@ -0,0 +1,122 @@
+"""
+Telegram file_id cache for documents sent from disk (upload once, then resend by id)
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from persistence import STATE_DB_PATH, connect
+
+logger = logging.getLogger(__name__)
+
+# Shared with the other workers and kept across restarts; '' keeps the cache in memory only
+DOCUMENT_CACHE_DB = os.getenv('DOCUMENT_CACHE_DB', STATE_DB_PATH)
+
+HASH_CHUNK = 1 << 20
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's content, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DocumentCache:
+    """file_id of each uploaded document, keyed by (absolute path, content hash).
+
+    The hash is only recomputed when the file's size or mtime changes, so a
+    lookup is a stat() call. A file replaced on disk gets a new hash, misses
+    the cache and is uploaded again; its old entries are dropped.
+    """
+
+    def __init__(self, db_path: str = DOCUMENT_CACHE_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._digests: Dict[str, Tuple[int, int, str]] = {}  # path → (mtime_ns, size, sha256)
+        self._file_ids: Dict[Tuple[str, str], str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = connect(self.db_path)
+            conn.isolation_level = None
+            self._local.conn = conn
+        return conn
+
+    def digest(self, path: str) -> str:
+        """Content hash of a file, cached against its size and mtime"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            known = self._digests.get(path)
+        if known and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+            return known[2]
+        digest = file_digest(path)
+        with self._lock:
+            self._digests[path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def lookup(self, path: str) -> Tuple[Optional[str], str]:
+        """(file_id or None, content hash) of a file on disk"""
+        path = os.path.abspath(path)
+        digest = self.digest(path)
+        key = (path, digest)
+        file_id = self._file_ids.get(key)
+        if file_id is None and self.db_path:
+            try:
+                row = self.conn().execute(
+                    "SELECT file_id FROM document_cache WHERE path = ? AND sha256 = ?", key
+                ).fetchone()
+            except Exception as e:
+                logger.error(f"❌ Erreur cache documents: {e}")
+                row = None
+            if row:
+                file_id = self._file_ids[key] = row[0]
+        if file_id:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return file_id, digest
+
+    def store(self, path: str, digest: str, file_id: str) -> None:
+        """Remember the file_id Telegram returned for this content (older versions are dropped)"""
+        path = os.path.abspath(path)
+        with self._lock:
+            for key in [key for key in self._file_ids if key[0] == path]:
+                del self._file_ids[key]
+            self._file_ids[(path, digest)] = file_id
+        if self.db_path:
+            try:
+                conn = self.conn()
+                conn.execute("DELETE FROM document_cache WHERE path = ? AND sha256 != ?", (path, digest))
+                conn.execute(
+                    "INSERT OR REPLACE INTO document_cache (path, sha256, file_id, updated_at) VALUES (?, ?, ?, ?)",
+                    (path, digest, file_id, time.time())
+                )
+            except Exception as e:
+                logger.error(f"❌ Erreur cache documents: {e}")
+        logger.info(f"📎 CACHE DOCUMENT - {os.path.basename(path)} enregistré ({digest[:12]})")
+
+    def forget(self, path: str, digest: str) -> None:
+        """Drop a file_id Telegram no longer accepts"""
+        path = os.path.abspath(path)
+        with self._lock:
+            self._file_ids.pop((path, digest), None)
+        if self.db_path:
+            try:
+                self.conn().execute("DELETE FROM document_cache WHERE path = ? AND sha256 = ?", (path, digest))
+            except Exception as e:
+                logger.error(f"❌ Erreur cache documents: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'entries': len(self._file_ids), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,303 @@
+"""
+Per-chat editMessageText queue: coalesced by message_id, rate-budgeted, retried until delivered
+"""
+
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from clock import system_clock
+from metrics import TELEGRAM_EDITS
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_rate(spec: str) -> Tuple[float, float]:
+    """'20/60' → (20.0, 60.0) (edits / seconds)"""
+    count, _, window = spec.partition('/')
+    return float(count), float(window or 1)
+
+
+# Telegram allows about 20 messages per minute in a group or channel and 30 per second overall
+EDIT_RATE_PER_CHAT = _parse_rate(os.getenv('EDIT_RATE_PER_CHAT', '20/60'))
+EDIT_RATE_GLOBAL = _parse_rate(os.getenv('EDIT_RATE_GLOBAL', '30/1'))
+# Longest wait between two attempts after a network error or a 5xx
+EDIT_BACKOFF_MAX = float(os.getenv('EDIT_BACKOFF_MAX', '60'))
+
+# Answers that mean the text on screen is already the one we wanted
+ALREADY_APPLIED = ('message is not modified',)
+
+
+class _Bucket:
+    """Token bucket that tells how long until the next token"""
+
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated')
+
+    def __init__(self, count: float, window: float, now: float):
+        self.capacity = count
+        self.rate = count / window
+        self.tokens = count
+        self.updated = now
+
+    def wait(self, now: float) -> float:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+
+class PendingEdit:
+    """Latest text wanted for one message"""
+
+    __slots__ = ('chat_id', 'message_id', 'text', 'callbacks', 'attempts', 'enqueued_at')
+
+    def __init__(self, chat_id: int, message_id: int, text: str, enqueued_at: float):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.text = text
+        self.callbacks: List[Callable[[bool], None]] = []
+        self.attempts = 0
+        self.enqueued_at = enqueued_at
+
+
+class EditQueue:
+    """Delivers message edits chat by chat without losing the last one.
+
+    Edits to the same message coalesce: a newer text replaces the queued
+    one, keeping its place. Each chat spends from its own token bucket
+    and from a global one. A 429 pauses only that chat for the announced
+    retry_after. Network errors and 5xx are retried with backoff until
+    Telegram accepts the edit or a newer text replaces it. Other 4xx
+    answers (message deleted, no rights) are final.
+
+    A single worker thread sends the edits; it never sleeps on a throttled
+    chat, so other chats keep flowing. Without start(), submit() delivers
+    inline with a bounded number of attempts. The per-chat buckets and
+    pauses of idle chats are dropped a few at a time by the scheduler, as
+    a full bucket or an elapsed pause holds no information.
+    """
+
+    # Attempts made by an inline submit() before giving up
+    INLINE_ATTEMPTS = 3
+    # Per-chat buckets and pauses looked at per scheduling step
+    SWEEP_BATCH = 8
+
+    def __init__(self, send: Callable[[int, int, str], Dict[str, Any]],
+                 per_chat: Tuple[float, float] = EDIT_RATE_PER_CHAT, global_rate: Tuple[float, float] = EDIT_RATE_GLOBAL,
+                 backoff_max: float = EDIT_BACKOFF_MAX, clock: Callable[[], float] = system_clock):
+        self.send = send  # (chat_id, message_id, text) → Bot API response; raises on network errors
+        self.per_chat = per_chat
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self._global = _Bucket(*global_rate, clock())
+        self._chats: Dict[int, "OrderedDict[int, PendingEdit]"] = {}
+        # Oldest looked-at first by _sweep
+        self._buckets: "OrderedDict[int, _Bucket]" = OrderedDict()
+        self._paused_until: "OrderedDict[int, float]" = OrderedDict()  # chat → end of its retry_after / backoff
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.submitted = 0
+        self.coalesced = 0
+        self.delivered = 0
+        self.throttled = 0
+        self.retried = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        if self._thread:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._worker, name='edit-queue', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Let the worker deliver what it can within timeout, then stop it"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout)
+            if not self._thread.is_alive():
+                self._thread = None
+        if self.depth():
+            logger.warning(f"⚠️ ÉDITIONS - {self.depth()} édition(s) non livrée(s) à l'arrêt")
+
+    def submit(self, chat_id: int, message_id: int, text: str,
+               callback: Optional[Callable[[bool], None]] = None) -> bool:
+        """Queue the text a message should show; replaces any queued text for that message"""
+        with self._cond:
+            self.submitted += 1
+            edits = self._chats.setdefault(chat_id, OrderedDict())
+            edit = edits.get(message_id)
+            if edit is None:
+                edit = edits[message_id] = PendingEdit(chat_id, message_id, text, self.clock())
+            else:
+                self.coalesced += 1
+                TELEGRAM_EDITS.inc('coalesced')
+                edit.text = text
+                edit.attempts = 0
+            if callback:
+                edit.callbacks.append(callback)
+            self._cond.notify()
+
+        if self._thread is None:
+            self._deliver_inline(chat_id)
+        return True
+
+    def _deliver_inline(self, chat_id: int) -> None:
+        with self._cond:
+            edits = self._chats.pop(chat_id, None) or {}
+        for edit in edits.values():
+            for attempt in range(1, self.INLINE_ATTEMPTS + 1):
+                retry_in = self._attempt(edit)
+                if retry_in is None:
+                    break
+                if attempt == self.INLINE_ATTEMPTS:
+                    self._finish(edit, False)
+                else:
+                    time.sleep(min(retry_in, self.backoff_max))
+
+    def _sweep(self, now: float) -> None:
+        """Drop the full buckets of chats with nothing queued, and elapsed pauses; called under _cond"""
+        for chat_id in list(itertools.islice(self._buckets, self.SWEEP_BATCH)):
+            bucket = self._buckets[chat_id]
+            bucket.wait(now)  # Refill
+            if chat_id not in self._chats and bucket.tokens >= bucket.capacity:
+                del self._buckets[chat_id]
+            else:
+                self._buckets.move_to_end(chat_id)  # Look at the others next time
+        for chat_id in list(itertools.islice(self._paused_until, self.SWEEP_BATCH)):
+            if self._paused_until[chat_id] <= now:
+                del self._paused_until[chat_id]
+            else:
+                self._paused_until.move_to_end(chat_id)
+
+    def _next(self, now: float) -> Tuple[Optional[PendingEdit], float]:
+        """(edit to send now, 0) or (None, seconds until one may be sent)"""
+        self._sweep(now)
+        wait = self._global.wait(now)
+        best_chat, best_wait = None, None
+        for chat_id, edits in self._chats.items():
+            if not edits:
+                continue
+            bucket = self._buckets.get(chat_id)
+            if bucket is None:
+                bucket = self._buckets[chat_id] = _Bucket(*self.per_chat, now)
+            chat_wait = max(bucket.wait(now), self._paused_until.get(chat_id, now) - now)
+            if best_wait is None or chat_wait < best_wait:
+                best_chat, best_wait = chat_id, chat_wait
+        if best_chat is None:
+            return None, float('inf')
+        if max(wait, best_wait) > 0:
+            return None, max(wait, best_wait)
+        self._global.take()
+        self._buckets[best_chat].take()
+        edits = self._chats[best_chat]
+        _, edit = edits.popitem(last=False)
+        if not edits:
+            del self._chats[best_chat]
+        return edit, 0.0
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    edit, wait = self._next(self.clock())
+                    if edit is not None or (self._stopping and not self._chats):
+                        break
+                    self._cond.wait(None if wait == float('inf') else wait)
+            if edit is None:
+                return
+            retry_in = self._attempt(edit)
+            if retry_in is not None:
+                self._requeue(edit, retry_in)
+
+    def _requeue(self, edit: PendingEdit, delay: float) -> None:
+        with self._cond:
+            self._paused_until[edit.chat_id] = max(self._paused_until.get(edit.chat_id, 0.0), self.clock() + delay)
+            edits = self._chats.setdefault(edit.chat_id, OrderedDict())
+            newer = edits.get(edit.message_id)
+            if newer is not None:
+                # A newer text arrived while this one was in flight: it supersedes it
+                newer.callbacks[:0] = edit.callbacks
+                return
+            edits[edit.message_id] = edit
+            edits.move_to_end(edit.message_id, last=False)
+
+    def _attempt(self, edit: PendingEdit) -> Optional[float]:
+        """Send one edit; None when settled, else seconds to wait before retrying"""
+        edit.attempts += 1
+        try:
+            result = self.send(edit.chat_id, edit.message_id, edit.text)
+        except Exception as e:
+            result = {'ok': False, 'description': str(e)}
+
+        description = str(result.get('description', '')).lower()
+        if result.get('ok') or any(reason in description for reason in ALREADY_APPLIED):
+            logger.debug("✅ ÉDITIONS - Message %s du chat %s édité", edit.message_id, edit.chat_id)
+            self._finish(edit, True)
+            return None
+
+        status = result.get('error_code')
+        if status == 429:
+            retry_after = float((result.get('parameters') or {}).get('retry_after') or 1)
+            with self._cond:
+                self.throttled += 1
+            TELEGRAM_EDITS.inc('throttled')
+            logger.warning(f"⏳ ÉDITIONS - Chat {edit.chat_id} limité, reprise dans {retry_after:g}s")
+            return retry_after
+        if status is not None and 400 <= status < 500:
+            logger.error(f"❌ ÉDITIONS - Message {edit.message_id} du chat {edit.chat_id} refusé: {result}")
+            self._finish(edit, False)
+            return None
+
+        # Network error or 5xx: back off and keep trying
+        delay = random.uniform(0.5, 1.0) * min(self.backoff_max, 2 ** edit.attempts)
+        with self._cond:
+            self.retried += 1
+        TELEGRAM_EDITS.inc('retried')
+        logger.warning(f"⚠️ ÉDITIONS - Échec message {edit.message_id} ({result.get('description')}), "
+                       f"essai {edit.attempts}, nouvel essai dans {delay:.1f}s")
+        return delay
+
+    def _finish(self, edit: PendingEdit, success: bool) -> None:
+        with self._cond:
+            if success:
+                self.delivered += 1
+            else:
+                self.failed += 1
+        TELEGRAM_EDITS.inc('delivered' if success else 'failed')
+        for callback in edit.callbacks:
+            try:
+                callback(success)
+            except Exception as e:
+                logger.error(f"❌ ÉDITIONS - Erreur callback: {e}")
+
+    def depth(self) -> int:
+        """Edits waiting to be delivered, all chats together"""
+        with self._cond:
+            return sum(len(edits) for edits in self._chats.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = self.clock()
+            return {
+                'pending': sum(len(edits) for edits in self._chats.values()),
+                'chats': len(self._chats),
+                'tracked_chats': len(self._buckets),
+                'paused_chats': sum(1 for until in self._paused_until.values() if until > now),
+                'submitted': self.submitted,
+                'coalesced': self.coalesced,
+                'delivered': self.delivered,
+                'throttled': self.throttled,
+                'retried': self.retried,
+                'failed': self.failed,
+            }
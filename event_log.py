@@ -0,0 +1,404 @@
+"""
+Append-only segment log of prediction events (made, sent, settled), replayable at startup
+
+Usage:
+    python event_log.py [directory]            # print every event as JSON lines
+    python event_log.py [directory] --compact  # compact the closed segments first
+"""
+
+import atexit
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Directory of the log; empty disables it
+EVENT_LOG_DIR = os.getenv('EVENT_LOG_DIR', '')
+# A segment is closed and a new one started past this size
+EVENT_LOG_SEGMENT_BYTES = int(os.getenv('EVENT_LOG_SEGMENT_BYTES', str(4 << 20)))
+# Seconds between two fsyncs of the active segment (what a crash can lose at most)
+EVENT_LOG_FSYNC_INTERVAL = float(os.getenv('EVENT_LOG_FSYNC_INTERVAL', '1'))
+# Closed segments merged into one once there are more than this
+EVENT_LOG_COMPACT_SEGMENTS = int(os.getenv('EVENT_LOG_COMPACT_SEGMENTS', '4'))
+# Settled predictions older than this are dropped by compaction; 0 keeps the whole history
+EVENT_LOG_RETENTION = float(os.getenv('EVENT_LOG_RETENTION', str(30 * 24 * 3600)))
+
+# Record: payload length, CRC32 of the payload, then the JSON payload
+HEADER = struct.Struct('<II')
+SEGMENT_PREFIX = 'events-'
+SEGMENT_SUFFIX = '.log'
+
+
+def event_log_dir(source_chat_id: Optional[int] = None) -> str:
+    """Log directory of one source channel's predictor (None = the default channel)"""
+    if not EVENT_LOG_DIR or source_chat_id is None:
+        return EVENT_LOG_DIR
+    return os.path.join(EVENT_LOG_DIR, str(abs(source_chat_id)))
+
+
+def _encode(event: Dict[str, Any]) -> bytes:
+    payload = json.dumps(event, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode(buffer, offset: int = 0) -> Iterator[tuple]:
+    """(end offset, event) of every intact record; stops at the first torn or corrupt one"""
+    size = len(buffer)
+    while offset + HEADER.size <= size:
+        length, crc = HEADER.unpack_from(buffer, offset)
+        start, end = offset + HEADER.size, offset + HEADER.size + length
+        if end > size:
+            return
+        payload = buffer[start:end]
+        if zlib.crc32(payload) != crc:
+            return
+        yield end, json.loads(payload)
+        offset = end
+
+
+def _read_segment(path: str, limit: Optional[int] = None) -> Iterator[tuple]:
+    """Decode a segment through a read-only memory map: only the pages visited are loaded"""
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size if limit is None else limit
+            if size == 0:
+                return
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as view:
+                yield from _decode(view)
+    except FileNotFoundError:
+        return  # Merged away by a concurrent compaction
+
+
+def _fsync_dir(directory: str) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def compaction_drops(events: Iterator[Dict[str, Any]], retention: float = EVENT_LOG_RETENTION,
+                     now: Optional[float] = None) -> Set[int]:
+    """Sequence numbers compaction can drop: superseded records, and those past retention.
+
+    A prediction runs from its 'predicted' event to the next one for the same
+    game (game numbers start over every day). Its 'predicted' record always
+    stays, as it marks that boundary for later compactions; after it only
+    the last 'settled' and the last 'sent' records are kept, so every
+    prediction of the history survives as at most three records. With a
+    retention, older records go too, except those of a prediction still
+    pending. Only the predictions in progress are held in memory.
+    """
+    dropped: Set[int] = set()
+    old: Set[int] = set()
+    current: Dict[int, Dict[str, Dict[str, Any]]] = {}  # game → records of its current prediction
+    cutoff = (now if now is not None else time.time()) - retention if retention > 0 else None
+    for event in events:
+        kind, game = event.get('type'), event.get('game')
+        if cutoff is not None and event.get('ts', 0) < cutoff:
+            old.add(event['seq'])
+        if kind == 'reset':
+            current = {}
+        elif kind == 'predicted':
+            current[game] = {'predicted': event}
+        elif kind in ('settled', 'sent'):
+            slot = current.setdefault(game, {})
+            if kind in slot:
+                dropped.add(slot[kind]['seq'])
+            slot[kind] = event
+
+    pending = {record['seq'] for slot in current.values()
+               if (slot.get('settled') or slot.get('predicted') or {}).get('data', {}).get('status') == 'pending'
+               for record in slot.values()}
+    return dropped | (old - pending)
+
+
+def replay_events(events: Iterator[Dict[str, Any]], retention: Optional[float] = None,
+                  now: Optional[float] = None) -> Dict[str, Dict[int, Any]]:
+    """Predictor state at the end of the log, shaped like StateDatabase.load().
+
+    With a retention, settled predictions and sent messages older than it are
+    left out (pending predictions always come back).
+    """
+    predictions: Dict[int, Dict[str, Any]] = {}
+    sent_predictions: Dict[int, Dict[str, int]] = {}
+    updated: Dict[tuple, float] = {}
+    for event in events:
+        kind, game = event.get('type'), event.get('game')
+        if kind in ('predicted', 'settled'):
+            predictions[game] = event['data']
+            updated[('prediction', game)] = event.get('ts', 0)
+        elif kind == 'sent':
+            sent_predictions[game] = {'chat_id': event['chat_id'], 'message_id': event['message_id']}
+            updated[('sent', game)] = event.get('ts', 0)
+        elif kind == 'reset':
+            predictions.clear()
+            sent_predictions.clear()
+
+    if retention:
+        cutoff = (now if now is not None else time.time()) - retention
+        predictions = {game: data for game, data in predictions.items()
+                       if data.get('status') == 'pending' or updated[('prediction', game)] >= cutoff}
+        sent_predictions = {game: info for game, info in sent_predictions.items()
+                            if updated[('sent', game)] >= cutoff}
+    return {'predictions': predictions, 'sent_predictions': sent_predictions}
+
+
+class EventLog:
+    """Append-only, length-prefixed log of prediction events, in segment files.
+
+    append() only writes into the file buffer; a background thread flushes
+    and fsyncs the active segment every fsync_interval seconds, so the
+    webhook thread never waits for the disk and a crash loses at most that
+    much. Past segment_bytes the segment is fsynced, closed and a new one
+    started. When more than compact_segments segments are closed, they are
+    merged into one that keeps only the last state of each prediction
+    (compaction_drops). Opening the log drops a torn record left at the end
+    of the last segment by a crash.
+
+    events() reads the segments through memory maps, one record at a time,
+    so a long history is never loaded whole. Only one process may append to
+    a directory.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = EVENT_LOG_SEGMENT_BYTES,
+                 fsync_interval: float = EVENT_LOG_FSYNC_INTERVAL,
+                 compact_segments: int = EVENT_LOG_COMPACT_SEGMENTS, retention: float = EVENT_LOG_RETENTION):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.compact_segments = compact_segments
+        self.retention = retention
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._dirty = False
+        self.appended = 0
+        self.rotations = 0
+        self.compactions = 0
+        self.truncated = 0
+        self.next_seq = 1
+
+        self._segments = self._list_segments()
+        if self._segments:
+            self._recover(self._segments[-1])
+        else:
+            self._segments.append(self._segment_path(self.next_seq))
+        self._file = open(self._segments[-1], 'ab')
+        self._size = self._file.tell()
+
+        self._flusher = threading.Thread(target=self._flush_loop, name='event-log', daemon=True)
+        self._flusher.start()
+
+    # -------------------------------------------------------------- segments
+
+    def _segment_path(self, first_seq: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{first_seq:012d}{SEGMENT_SUFFIX}")
+
+    def _list_segments(self) -> List[str]:
+        names = sorted(name for name in os.listdir(self.directory)
+                       if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def _recover(self, path: str) -> None:
+        """Find the last sequence number and cut a torn tail off the last segment"""
+        valid = 0
+        for end, event in _read_segment(path):
+            valid = end
+            self.next_seq = event['seq'] + 1
+        if valid == 0 and len(self._segments) > 1:
+            # Empty or unreadable last segment: take the numbering from the previous one
+            for _, event in _read_segment(self._segments[-2]):
+                self.next_seq = event['seq'] + 1
+        size = os.path.getsize(path)
+        if valid < size:
+            self.truncated += 1
+            logger.warning(f"⚠️ JOURNAL - {size - valid} octet(s) incomplets coupés en fin de {path}")
+            with open(path, 'r+b') as f:
+                f.truncate(valid)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _rotate(self) -> None:
+        """Close the active segment (fsynced) and start the next one; called under _lock"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        path = self._segment_path(self.next_seq)
+        self._segments.append(path)
+        self._file = open(path, 'ab')
+        self._size = 0
+        self._dirty = False
+        _fsync_dir(self.directory)
+        self.rotations += 1
+        if len(self._segments) - 1 > self.compact_segments:
+            self._wake.set()
+
+    # ---------------------------------------------------------------- writes
+
+    def append(self, kind: str, **fields: Any) -> int:
+        """Append one event; returns its sequence number"""
+        with self._lock:
+            if self._closed:
+                return 0
+            seq = self.next_seq
+            self.next_seq += 1
+            record = _encode({'seq': seq, 'ts': time.time(), 'type': kind, **fields})
+            self._file.write(record)
+            self._size += len(record)
+            self._dirty = True
+            self.appended += 1
+            if self._size >= self.segment_bytes:
+                self._rotate()
+            return seq
+
+    def sync(self) -> None:
+        """Flush the buffer and fsync the active segment"""
+        with self._lock:
+            if self._closed or not self._dirty:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._dirty = False
+
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.fsync_interval)
+            self._wake.clear()
+            try:
+                self.sync()
+                with self._lock:
+                    closed = len(self._segments) - 1
+                if closed > self.compact_segments:
+                    self.compact()
+            except Exception as e:
+                logger.error(f"❌ JOURNAL - Erreur d'écriture: {e}")
+
+    # ------------------------------------------------------------ compaction
+
+    def compact(self) -> int:
+        """Merge every closed segment into one; returns the records dropped"""
+        with self._compact_lock:
+            with self._lock:
+                closed = self._segments[:-1]
+            if len(closed) < 2:
+                return 0
+            # Two passes over the memory maps: find what goes, then stream the rest out
+            dropped = compaction_drops((event for path in closed for _, event in _read_segment(path)),
+                                       self.retention)
+            # The merged segment replaces the first one atomically; a crash before the
+            # others are deleted only leaves records that replay to the same state
+            target = closed[0]
+            temporary = target + '.compact'
+            total = kept = 0
+            with open(temporary, 'wb') as f:
+                for path in closed:
+                    for _, event in _read_segment(path):
+                        total += 1
+                        if event['seq'] not in dropped:
+                            f.write(_encode(event))
+                            kept += 1
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, target)
+            _fsync_dir(self.directory)
+            for path in closed[1:]:
+                os.remove(path)
+            _fsync_dir(self.directory)
+
+            with self._lock:
+                self._segments = [target] + self._segments[len(closed):]
+                self.compactions += 1
+        logger.info(f"🗜️ JOURNAL - {len(closed)} segments compactés: {total} → {kept} événements")
+        return total - kept
+
+    # ----------------------------------------------------------------- reads
+
+    def events(self, since_seq: int = 0) -> Iterator[Dict[str, Any]]:
+        """Every event in log order (those with seq > since_seq), read through memory maps"""
+        with self._lock:
+            if not self._closed:
+                self._file.flush()
+            segments = list(self._segments)
+            active_size = self._size
+        for index, path in enumerate(segments):
+            limit = active_size if index == len(segments) - 1 else None
+            for _, event in _read_segment(path, limit):
+                if event['seq'] > since_seq:
+                    yield event
+
+    def replay(self, retention: Optional[float] = None) -> Dict[str, Dict[int, Any]]:
+        """Predictor state rebuilt from the log (see replay_events)"""
+        started = time.perf_counter()
+        state = replay_events(self.events(), retention)
+        logger.info(f"📜 JOURNAL - État reconstruit en {(time.perf_counter() - started) * 1000:.1f}ms: "
+                    f"{len(state['predictions'])} prédictions, {len(state['sent_predictions'])} messages")
+        return state
+
+    def is_empty(self) -> bool:
+        return self.next_seq == 1
+
+    # -------------------------------------------------------------- lifecycle
+
+    def close(self) -> None:
+        """Fsync what is buffered and stop the flusher"""
+        with self._lock:
+            if self._closed:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._closed = True
+        self._wake.set()
+        self._flusher.join(timeout=5)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            segments = list(self._segments)
+            stats = {
+                'segments': len(segments),
+                'active_bytes': self._size,
+                'next_seq': self.next_seq,
+                'appended': self.appended,
+                'rotations': self.rotations,
+                'compactions': self.compactions,
+                'truncated': self.truncated,
+            }
+        stats['bytes'] = sum(os.path.getsize(path) for path in segments if os.path.exists(path))
+        return stats
+
+
+def open_event_log(directory: str = EVENT_LOG_DIR) -> Optional[EventLog]:
+    """Open the event log, or return None when it is disabled or unavailable"""
+    if not directory:
+        return None
+    try:
+        log = EventLog(directory)
+    except OSError as e:
+        logger.warning(f"⚠️ JOURNAL - Répertoire {directory} indisponible, journal désactivé: {e}")
+        return None
+    atexit.register(log.close)  # Don't lose buffered events on shutdown
+    return log
+
+
+if __name__ == '__main__':
+    directory = next((arg for arg in sys.argv[1:] if not arg.startswith('--')), EVENT_LOG_DIR)
+    if not directory:
+        print("Usage: python event_log.py [répertoire] [--compact]")
+        sys.exit(1)
+    log = EventLog(directory)
+    if '--compact' in sys.argv:
+        log.compact()
+    for event in log.events():
+        print(json.dumps(event, ensure_ascii=False))
+    log.close()
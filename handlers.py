@@ -2,23 +2,30 @@
 Event handlers for the Telegram bot - adapted for webhook deployment
 """
 
+import asyncio
 import logging
 import os
-from datetime import datetime, timedelta
-from collections import defaultdict
-from typing import Dict, Any
-import requests 
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Optional, Tuple
+
+from dispatcher import AsyncOutboundDispatcher, OutboundDispatcher
+from document_cache import DocumentCache
+from edit_queue import EditQueue
+from reorder import REORDER_GAP_TIMEOUT
+from rate_limiter import command_class, create_rate_limiter
+from stats import format_stats
+from telegram_client import get_telegram_client
 
 logger = logging.getLogger(__name__)
 
-# Rate limiting storage
-user_message_counts = defaultdict(list)
+# Rate limiting: token buckets per user and command class (see rate_limiter.py)
+rate_limiter = create_rate_limiter()
 
-# Target channel ID for Baccarat Kouamé
-TARGET_CHANNEL_ID = -1002682552255
-
-# Target channel ID for predictions and updates
-PREDICTION_CHANNEL_ID = -1002875505624 # <<< CORRECTION EFFECTUÉE ICI
+# Target channel ID for Baccarat Kouamé (default source) and for predictions
+TARGET_CHANNEL_ID = int(os.getenv('TARGET_CHANNEL_ID', '-1002682552255'))
+PREDICTION_CHANNEL_ID = int(os.getenv('PREDICTION_CHANNEL_ID', '-1002875505624'))
 
 # Configuration constants
 GREETING_MESSAGE = """
@@ -42,6 +49,8 @@ WELCOME_MESSAGE = """
 🔧 **CONFIGURATION AVANCÉE:**
 • `/cos [1|2]` - Position de carte
 • `/cooldown [secondes]` - Délai entre prédictions  
+• `/rules [reload]` - Règles de prédiction actives
+• `/stats [source_id]` - Taux de réussite des prédictions
 • `/redirect` - Redirection des prédictions
 • `/announce [message]` - Annonce officielle
 • `/reset` - Réinitialiser le système
@@ -71,6 +80,8 @@ HELP_MESSAGE = """
 🔧 **COMMANDES DE CONFIGURATION:**
 • `/cos [1|2]` - Position de carte pour prédictions
 • `/cooldown [secondes]` - Modifier le délai entre prédictions
+• `/rules` - Afficher les règles de prédiction (`/rules reload` pour recharger le fichier)
+• `/stats [source_id]` - Taux de réussite par costume et par décalage (derniers jeux, heures, jours)
 • `/redirect [source] [target]` - Redirection avancée des prédictions
 • `/redi` - Redirection rapide vers le chat actuel
 • `/announce [message]` - Envoyer une annonce officielle
@@ -126,38 +137,40 @@ contactez l'administrateur du bot.
 🚀 Le bot est open source et peut être déployé facilement !
 """
 
-MAX_MESSAGES_PER_MINUTE = 30
-RATE_LIMIT_WINDOW = 60
-
-def is_rate_limited(user_id: int) -> bool:
-    """Check if user is rate limited"""
-    now = datetime.now()
-    user_messages = user_message_counts[user_id]
-
-    # Remove old messages outside the window
-    user_messages[:] = [msg_time for msg_time in user_messages 
-                       if now - msg_time < timedelta(seconds=RATE_LIMIT_WINDOW)]
-
-    # Check if user exceeded limit
-    if len(user_messages) >= MAX_MESSAGES_PER_MINUTE:
-        return True
-
-    # Add current message time
-    user_messages.append(now)
-    return False
+# Outbound dispatcher sizing (0 workers = synchronous delivery)
+OUTBOUND_WORKERS = int(os.getenv('OUTBOUND_WORKERS', '2'))
+OUTBOUND_QUEUE_SIZE = int(os.getenv('OUTBOUND_QUEUE_SIZE', '500'))
+# Telegram calls in flight at once on the asyncio transport (ASGI entry point)
+OUTBOUND_MAX_IN_FLIGHT = int(os.getenv('OUTBOUND_MAX_IN_FLIGHT', '100'))
+# Status edits held until their prediction message is sent; beyond this the oldest are dropped
+PARKED_EDITS_MAX = int(os.getenv('PARKED_EDITS_MAX', '1000'))
+# Seconds a held status edit waits for its prediction's send before it is dropped
+PARKED_EDIT_TTL = float(os.getenv('PARKED_EDIT_TTL', '300'))
+# gunicorn worker processes (Procfile); with the in-memory backend each keeps its own /stats counters
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+# Seconds between two sweeps of the reorder buffers (expired gaps) and in-progress posts (abandoned)
+PREDICTOR_SWEEP_INTERVAL = float(os.getenv('PREDICTOR_SWEEP_INTERVAL', str(max(1.0, REORDER_GAP_TIMEOUT / 2))))
+
+def is_rate_limited(user_id: int, text: Optional[str] = None, limiter=None) -> bool:
+    """Check if user is rate limited for this message's command class"""
+    return not (limiter or rate_limiter).allow(user_id, command_class(text))
 
 class TelegramHandlers:
     """Handlers for Telegram bot using webhook approach"""
 
     def __init__(self, bot_token: str):
         self.bot_token = bot_token
-        self.base_url = f"https://api.telegram.org/bot{bot_token}" # Replaced TelegramBot with base_url
+        # Shared pooled client (keep-alive connections to api.telegram.org)
+        self.client = get_telegram_client(bot_token)
         # Import card_predictor locally to avoid circular imports
         try:
-            from card_predictor import card_predictor
-            self.card_predictor = card_predictor
+            from predictor_registry import predictor_registry
+            # One predictor per source channel; card_predictor is the default channel's
+            self.predictors = predictor_registry
+            self.card_predictor = predictor_registry.get(TARGET_CHANNEL_ID)
         except ImportError:
             logger.error("Failed to import card_predictor")
+            self.predictors = None
             self.card_predictor = None
 
         # Store redirected channels for each source chat
@@ -165,20 +178,60 @@ class TelegramHandlers:
         
         # Deployment file path - use depi_render_n2_fix.zip
         self.deployment_file_path = "depi_render_n2_fix.zip"
+        # file_id of documents already uploaded, reused instead of re-sending the bytes
+        self.document_cache = DocumentCache()
+
+        # Outbound Telegram calls run on background workers so the webhook returns immediately
+        self.dispatcher = OutboundDispatcher(self._deliver, workers=OUTBOUND_WORKERS,
+                                             max_queue=OUTBOUND_QUEUE_SIZE)
+        self.dispatcher.start()
+        # Status edits: coalesced per message, paced per chat, retried until Telegram accepts them
+        self.edit_queue = EditQueue(self._call_edit_message)
+        if OUTBOUND_WORKERS:
+            self.edit_queue.start()
+        # Status edits that ran before their prediction's message_id was stored, by (predictor, game)
+        self._parked_edits: "OrderedDict[Tuple[Any, int], Tuple[str, float]]" = OrderedDict()  # → (text, parked at)
+        self._parked_lock = threading.RLock()
+        self.async_client = None
+
+        if self.predictors:
+            threading.Thread(target=self._sweep_predictors, name='predictor-sweeper', daemon=True).start()
+
+    def use_asyncio(self, loop: asyncio.AbstractEventLoop, client) -> None:
+        """Deliver outbound calls as coroutines on loop through an AsyncTelegramClient.
+
+        Replaces the threaded dispatcher; the edit queue keeps its pacing
+        thread but sends through the loop. The old dispatcher joins its
+        workers, so it is stopped in an executor to keep the loop free.
+        """
+        previous = self.dispatcher
+        self.async_client = client
+        self.dispatcher = AsyncOutboundDispatcher(self._deliver_async, loop, max_in_flight=OUTBOUND_MAX_IN_FLIGHT,
+                                                  max_queue=OUTBOUND_QUEUE_SIZE * max(1, OUTBOUND_WORKERS))
+        self.dispatcher.start()
+        loop.run_in_executor(None, previous.stop)
+
+        def edit_through_loop(chat_id: int, message_id: int, new_text: str) -> Dict[str, Any]:
+            call = client.call('editMessageText', json=self._edit_message_data(chat_id, message_id, new_text),
+                               timeout=10, max_retries=0)
+            return asyncio.run_coroutine_threadsafe(call, loop).result(timeout=30)
+
+        self.edit_queue.send = edit_through_loop
+        self.edit_queue.start()
 
     def handle_update(self, update: Dict[str, Any]) -> None:
         """Handle incoming Telegram update with enhanced webhook support"""
         try:
             if 'message' in update:
                 message = update['message']
-                logger.info(f"🔄 Handlers - Traitement message normal")
+                logger.debug("🔄 Handlers - Traitement message normal")
                 self._handle_message(message)
             elif 'edited_message' in update:
                 message = update['edited_message']
-                logger.info(f"🔄 Handlers - Traitement message édité pour prédictions/vérifications")
+                logger.debug("🔄 Handlers - Traitement message édité pour prédictions/vérifications")
                 self._handle_edited_message(message)
             else:
-                logger.info(f"⚠️ Type d'update non géré: {list(update.keys())}")
+                logger.debug("⚠️ Type d'update non géré: %s", list(update.keys()))
 
         except Exception as e:
             logger.error(f"Error handling update: {e}")
@@ -193,8 +246,8 @@ class TelegramHandlers:
 
             # Rate limiting check (skip for channels/groups)
             chat_type = message['chat'].get('type', 'private')
-            if user_id and chat_type == 'private' and is_rate_limited(user_id):
-                self.send_message(chat_id, "⏰ Veuillez patienter avant d'envoyer une autre commande.")
+            if user_id and chat_type == 'private' and is_rate_limited(user_id, message.get('text')):
+                self.queue_message(chat_id, "⏰ Veuillez patienter avant d'envoyer une autre commande.")
                 return
 
             # Handle commands
@@ -225,6 +278,10 @@ class TelegramHandlers:
                     self._handle_cooldown_command(chat_id, text, user_id)
                 elif text.startswith('/redirect'):
                     self._handle_redirect_command(chat_id, text, user_id)
+                elif text.startswith('/rules'):
+                    self._handle_rules_command(chat_id, text, user_id)
+                elif text.startswith('/stats'):
+                    self._handle_stats_command(chat_id, text, user_id)
                 elif text.startswith('/announce'):
                     self._handle_announce_command(chat_id, text, user_id)
                 elif text == '/fin':
@@ -234,12 +291,10 @@ class TelegramHandlers:
                     self._handle_regular_message(message)
 
                     # Also process for card prediction in channels/groups (for polling mode)
+                    # _process_card_message vérifie aussi les messages normaux finalisés
                     if chat_type in ['group', 'supergroup', 'channel'] and self.card_predictor:
                         self._process_card_message(message)
 
-                        # NOUVEAU: Vérification sur messages normaux aussi
-                        self._process_verification_on_normal_message(message)
-
             # Handle new chat members
             if 'new_chat_members' in message:
                 self._handle_new_chat_members(message)
@@ -257,93 +312,71 @@ class TelegramHandlers:
             sender_chat = message.get('sender_chat', {})
             sender_chat_id = sender_chat.get('id', chat_id)
 
-            logger.info(f"✏️ WEBHOOK - Message édité reçu ID:{message_id} | Chat:{chat_id} | Sender:{sender_chat_id}")
+            logger.debug("✏️ WEBHOOK - Message édité reçu ID:%s | Chat:%s | Sender:%s", message_id, chat_id, sender_chat_id)
 
             # Rate limiting check (skip for channels/groups)
-            if user_id and chat_type == 'private' and is_rate_limited(user_id):
+            if user_id and chat_type == 'private' and is_rate_limited(user_id, message.get('text')):
                 return
 
             # Process edited messages
             if 'text' in message:
                 text = message['text']
-                logger.info(f"✏️ WEBHOOK - Contenu édité: {text[:100]}...")
+                logger.debug("✏️ WEBHOOK - Contenu édité: %.100s...", text)
 
                 # Skip card prediction if card_predictor is not available
-                if not self.card_predictor:
+                if not self.predictors:
                     logger.warning("❌ Card predictor not available")
                     return
 
-                # Vérifier que c'est du canal autorisé
-                if sender_chat_id != TARGET_CHANNEL_ID:
-                    logger.info(f"🚫 Message édité ignoré - Canal non autorisé: {sender_chat_id}")
+                # Prédicteur propre au canal source (None si le canal n'est pas suivi)
+                predictor = self.predictors.route(sender_chat_id)
+                if predictor is None:
+                    logger.debug("🚫 Message édité ignoré - Canal non autorisé: %s", sender_chat_id)
                     return
 
-                logger.info(f"✅ WEBHOOK - Message édité du canal autorisé: {TARGET_CHANNEL_ID}")
+                logger.debug("✅ WEBHOOK - Message édité du canal autorisé: %s", sender_chat_id)
+
+                # Analyse unique du message, réutilisée par toutes les règles
+                parsed = predictor.parse(text)
+
+                # Suivi du message en cours (⏰▶🕐➡️) jusqu'à sa version finale (✅/🔰)
+                if message_id:
+                    predictor.track_post(chat_id, message_id, parsed)
 
                 # TRAITEMENT MESSAGES ÉDITÉS AMÉLIORÉ - Prédiction ET Vérification
-                has_completion = self.card_predictor.has_completion_indicators(text)
-                has_bozato = '🔰' in text
-                has_checkmark = '✅' in text
+                has_completion = predictor.has_completion_indicators(parsed)
+                has_bozato = parsed.has_final
+                has_checkmark = parsed.has_checkmark
 
-                logger.info(f"🔍 ÉDITION - Finalisation: {has_completion}, 🔰: {has_bozato}, ✅: {has_checkmark}")
-                logger.info(f"🔍 ÉDITION - 🔰 et ✅ sont maintenant traités de manière identique pour la vérification")
+                logger.debug("🔍 ÉDITION - Finalisation: %s, 🔰: %s, ✅: %s", has_completion, has_bozato, has_checkmark)
+                logger.debug("🔍 ÉDITION - 🔰 et ✅ sont maintenant traités de manière identique pour la vérification")
 
                 if has_completion:
-                    logger.info(f"🎯 ÉDITION FINALISÉE - Traitement prédiction ET vérification")
+                    logger.debug("🎯 ÉDITION FINALISÉE - Traitement prédiction ET vérification")
 
                     # SYSTÈME 1: PRÉDICTION AUTOMATIQUE (messages édités avec finalisation)
-                    should_predict, game_number, combination = self.card_predictor.should_predict(text)
+                    should_predict, game_number, combination = predictor.should_predict(parsed)
 
                     if should_predict and game_number is not None and combination is not None:
-                        prediction = self.card_predictor.make_prediction(game_number, combination)
-                        logger.info(f"🔮 PRÉDICTION depuis ÉDITION: {prediction}")
+                        prediction = predictor.make_prediction(game_number, combination)
+                        logger.info("🔮 PRÉDICTION depuis ÉDITION: %s", prediction)
 
-                        # Envoyer la prédiction et stocker les informations
+                        # Envoyer la prédiction (en arrière-plan) et stocker les informations
                         target_channel = self.get_redirect_channel(sender_chat_id)
-                        sent_message_info = self.send_message(target_channel, prediction)
-                        if sent_message_info and isinstance(sent_message_info, dict) and 'message_id' in sent_message_info:
-                            target_game = game_number + 2
-                            self.card_predictor.sent_predictions[target_game] = {
-                                'chat_id': target_channel,
-                                'message_id': sent_message_info['message_id']
-                            }
-                            logger.info(f"📝 PRÉDICTION STOCKÉE pour jeu {target_game} vers canal {target_channel}")
-
-                    # SYSTÈME 2: VÉRIFICATION UNIFIÉE (messages édités avec finalisation)
-                    verification_result = self.card_predictor._verify_prediction_common(text, is_edited=True)
-                    if verification_result:
-                        logger.info(f"🔍 ✅ VÉRIFICATION depuis ÉDITION: {verification_result}")
-
-                        if verification_result.get('type') == 'edit_message':
-                            predicted_game = verification_result.get('predicted_game')
-                            new_message = verification_result.get('new_message')
-
-                            # Tenter d'éditer le message de prédiction existant
-                            if predicted_game in self.card_predictor.sent_predictions:
-                                message_info = self.card_predictor.sent_predictions[predicted_game]
-                                edit_success = self.edit_message(
-                                    message_info['chat_id'],
-                                    message_info['message_id'],
-                                    new_message
-                                )
-
-                                if edit_success:
-                                    logger.info(f"🔍 ✅ MESSAGE ÉDITÉ avec succès - Prédiction {predicted_game}")
-                                else:
-                                    logger.error(f"🔍 ❌ ÉCHEC ÉDITION - Prédiction {predicted_game}")
-                            else:
-                                logger.warning(f"🔍 ⚠️ AUCUN MESSAGE STOCKÉ pour {predicted_game}")
-                    else:
-                        logger.info(f"🔍 ⭕ AUCUNE VÉRIFICATION depuis édition")
-
-                # Gestion des messages temporaires
-                elif self.card_predictor.has_pending_indicators(text):
-                    logger.info(f"⏰ WEBHOOK - Message temporaire détecté, en attente de finalisation")
-                    if message_id:
-                        self.card_predictor.pending_edits[message_id] = {
-                            'original_text': text,
-                            'timestamp': datetime.now()
-                        }
+                        self.queue_prediction(target_channel, game_number + predictor.target_offset, prediction, predictor)
+                        self.predictors.record(sender_chat_id, predictions=1)
+
+                    # SYSTÈME 2: VÉRIFICATION UNIFIÉE (messages édités avec finalisation, dans l'ordre des jeux)
+                    verification_results = predictor.verify_in_order(parsed, is_edited=True)
+                    for verification_result in verification_results:
+                        logger.info("🔍 ✅ VÉRIFICATION depuis ÉDITION: %s", verification_result)
+                        self._apply_verification(sender_chat_id, predictor, verification_result)
+                    if not verification_results:
+                        logger.debug("🔍 ⭕ AUCUNE VÉRIFICATION depuis édition")
+
+                # Gestion des messages temporaires (suivis par track_post ci-dessus)
+                elif parsed.has_pending:
+                    logger.debug("⏰ WEBHOOK - Message temporaire détecté, en attente de finalisation")
 
         except Exception as e:
             logger.error(f"❌ Error handling edited message via webhook: {e}")
@@ -356,80 +389,60 @@ class TelegramHandlers:
             sender_chat = message.get('sender_chat', {})
             sender_chat_id = sender_chat.get('id', chat_id)
 
-            # Only process messages from Baccarat Kouamé channel
-            if sender_chat_id != TARGET_CHANNEL_ID:
-                logger.info(f"🚫 Message ignoré - Canal non autorisé: {sender_chat_id}")
+            if not text or not self.predictors:
                 return
 
-            if not text or not self.card_predictor:
+            # Only process messages from followed source channels, each with its own predictor
+            predictor = self.predictors.route(sender_chat_id)
+            if predictor is None:
+                logger.debug("🚫 Message ignoré - Canal non autorisé: %s", sender_chat_id)
                 return
 
-            logger.info(f"🎯 Traitement message CANAL AUTORISÉ: {text[:50]}...")
+            logger.debug("🎯 Traitement message CANAL AUTORISÉ: %.50s...", text)
 
-            # Store temporary messages with pending indicators
-            if self.card_predictor.has_pending_indicators(text):
-                message_id = message.get('message_id')
-                if message_id:
-                    self.card_predictor.temporary_messages[message_id] = text
-                    logger.info(f"⏰ Message temporaire stocké: {message_id}")
+            parsed = predictor.parse(text)
+
+            # Track temporary messages until their finalized version
+            message_id = message.get('message_id')
+            if message_id and predictor.track_post(chat_id, message_id, parsed) == 'pending':
+                logger.debug("⏰ Message temporaire suivi: %s", message_id)
 
             # VÉRIFICATION AMÉLIORÉE - Messages normaux avec 🔰 ou ✅
-            has_completion = self.card_predictor.has_completion_indicators(text)
+            has_completion = predictor.has_completion_indicators(parsed)
 
             if has_completion:
-                logger.info(f"🔍 MESSAGE NORMAL avec finalisation: {text[:50]}...")
-                verification_result = self.card_predictor._verify_prediction_common(text, is_edited=False)
-                if verification_result:
-                    logger.info(f"🔍 ✅ VÉRIFICATION depuis MESSAGE NORMAL: {verification_result}")
-
-                    if verification_result['type'] == 'edit_message':
-                        predicted_game = verification_result['predicted_game']
-                        if predicted_game in self.card_predictor.sent_predictions:
-                            message_info = self.card_predictor.sent_predictions[predicted_game]
-                            edit_success = self.edit_message(
-                                message_info['chat_id'],
-                                message_info['message_id'],
-                                verification_result['new_message']
-                            )
-                            if edit_success:
-                                logger.info(f"✅ MESSAGE ÉDITÉ depuis message normal - Prédiction {predicted_game}")
+                logger.debug("🔍 MESSAGE NORMAL avec finalisation: %.50s...", text)
+                for verification_result in predictor.verify_in_order(parsed, is_edited=False):
+                    logger.info("🔍 ✅ VÉRIFICATION depuis MESSAGE NORMAL: %s", verification_result)
+                    self._apply_verification(sender_chat_id, predictor, verification_result)
 
         except Exception as e:
             logger.error(f"Error processing card message: {e}")
 
-    def _process_verification_on_normal_message(self, message: Dict[str, Any]) -> None:
-        """Process verification on normal messages (not just edited ones)"""
-        try:
-            text = message.get('text', '')
-            chat_id = message['chat']['id']
-            sender_chat = message.get('sender_chat', {})
-            sender_chat_id = sender_chat.get('id', chat_id)
-
-            # Only process messages from Baccarat Kouamé channel
-            if sender_chat_id != TARGET_CHANNEL_ID:
-                return
-
-            if not text or not self.card_predictor:
-                return
-
-            has_completion = self.card_predictor.has_completion_indicators(text)
-
-            if has_completion:
-                verification_result = self.card_predictor._verify_prediction_common(text, is_edited=False)
-                if verification_result:
-                    if verification_result['type'] == 'edit_message':
-                        predicted_game = verification_result['predicted_game']
-
-                        if predicted_game in self.card_predictor.sent_predictions:
-                            message_info = self.card_predictor.sent_predictions[predicted_game]
-                            edit_success = self.edit_message(
-                                message_info['chat_id'],
-                                message_info['message_id'],
-                                verification_result['new_message']
-                            )
-
-        except Exception as e:
-            logger.error(f"❌ Error processing verification on normal message: {e}")
+    def _apply_verification(self, source_chat_id: int, predictor, verification_result: Dict[str, Any]) -> None:
+        """Edit the prediction message with its settled status (in the background)"""
+        if verification_result.get('type') == 'edit_message':
+            self.queue_prediction_edit(verification_result['predicted_game'],
+                                       verification_result['new_message'], predictor, source_chat_id)
+            self.predictors.record(source_chat_id, verifications=1)
+
+    def _sweep_predictors(self) -> None:
+        """Periodic upkeep no incoming message may come to trigger.
+
+        Releases results held too long by the reorder buffers and expires
+        abandoned in-progress posts and status edits held too long.
+        """
+        while True:
+            time.sleep(PREDICTOR_SWEEP_INTERVAL)
+            try:
+                self._expire_parked_edits()
+                for source_chat_id, predictor in list(self.predictors):
+                    predictor.pending_tracker.sweep()
+                    for verification_result in predictor.verify_expired():
+                        logger.info("🔍 ✅ VÉRIFICATION après attente: %s", verification_result)
+                        self._apply_verification(source_chat_id, predictor, verification_result)
+            except Exception as e:
+                logger.error(f"❌ Erreur maintenance des prédicteurs: {e}")
 
     def _is_authorized_user(self, user_id: int) -> bool:
         """Check if user is authorized to use the bot"""
@@ -455,25 +468,24 @@ class TelegramHandlers:
             logger.info(f"🎯 COMMANDE /start reçue - Chat: {chat_id}, User: {user_id}")
 
             if user_id and not self._is_authorized_user(user_id):
-                admin_id = int(os.getenv('ADMIN_ID', '1190237801'))            if user_id and not self._is_authorized_user(user_id):
                 admin_id = int(os.getenv('ADMIN_ID', '1190237801'))
                 logger.warning(f"🚫 Tentative d'accès non autorisée: {user_id} vs {admin_id}")
-                self.send_message(chat_id, f"🚫 Accès non autorisé. Votre ID: {user_id}")
+                self.queue_message(chat_id, f"🚫 Accès non autorisé. Votre ID: {user_id}")
                 return
 
             logger.info(f"✅ Utilisateur autorisé, envoi du message de bienvenue")
-            self.send_message(chat_id, WELCOME_MESSAGE)
+            self.queue_message(chat_id, WELCOME_MESSAGE)
         except Exception as e:
             logger.error(f"❌ Error in start command: {e}")
-            self.send_message(chat_id, "❌ Une erreur s'est produite. Veuillez réessayer.")
+            self.queue_message(chat_id, "❌ Une erreur s'est produite. Veuillez réessayer.")
 
     def _handle_help_command(self, chat_id: int, user_id: int = None) -> None:
         """Handle /help command with authorization check"""
         try:
             if user_id and not self._is_authorized_user(user_id):
-                self.send_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
+                self.queue_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
                 return
-            self.send_message(chat_id, HELP_MESSAGE)
+            self.queue_message(chat_id, HELP_MESSAGE)
         except Exception as e:
             logger.error(f"Error in help command: {e}")
 
@@ -481,9 +493,9 @@ class TelegramHandlers:
         """Handle /about command with authorization check"""
         try:
             if user_id and not self._is_authorized_user(user_id):
-                self.send_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
+                self.queue_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
                 return
-            self.send_message(chat_id, ABOUT_MESSAGE)
+            self.queue_message(chat_id, ABOUT_MESSAGE)
         except Exception as e:
             logger.error(f"Error in about command: {e}")
 
@@ -491,9 +503,9 @@ class TelegramHandlers:
         """Handle /dev command with authorization check"""
         try:
             if user_id and not self._is_authorized_user(user_id):
-                self.send_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
+                self.queue_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
                 return
-            self.send_message(chat_id, DEV_MESSAGE)
+            self.queue_message(chat_id, DEV_MESSAGE)
         except Exception as e:
             logger.error(f"Error in dev command: {e}")
 
@@ -501,23 +513,22 @@ class TelegramHandlers:
         """Handle /deploy command with authorization check"""
         try:
             if user_id and not self._is_authorized_user(user_id):
-                self.send_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
+                self.queue_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
                 return
 
-            self.send_message(
+            self.queue_message(
                 chat_id, 
                 "🚀 Préparation du package DEPI40000 avec règles corrigées (🔰 = ✅)... Veuillez patienter."
             )
 
             if not os.path.exists(self.deployment_file_path):
-                self.send_message(chat_id, "❌ Fichier de déploiement non trouvé.")
+                self.queue_message(chat_id, "❌ Fichier de déploiement non trouvé.")
                 return
 
-            success = self.send_document(chat_id, self.deployment_file_path)
-
-            if success:
-                self.send_message(
-                    chat_id,
+            self.queue_document(
+                chat_id,
+                self.deployment_file_path,
+                success_text=(
                     f"✅ **PACKAGE DEPI40000 ENVOYÉ !**\n\n"
                     f"📦 **Fichier :** {self.deployment_file_path}\n\n"
                     "📋 **Contenu du package DEPI40000 :**\n"
@@ -537,6 +548,7 @@ class TelegramHandlers:
                     "🎯 Votre bot sera déployé avec le package DEPI40000 !\n\n"
                     "🔍 **NOUVELLE FONCTIONNALITÉ :** 🔰 et ✅ sont maintenant traités de manière identique pour la vérification des prédictions."
                 )
+            )
 
         except Exception as e:
             logger.error(f"Error handling deploy command: {e}")
@@ -545,19 +557,17 @@ class TelegramHandlers:
         """Handle /ni command"""
         try:
             if user_id and not self._is_authorized_user(user_id):
-                self.send_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
+                self.queue_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
                 return
 
-            self.send_message(chat_id, "📦 Préparation du package...")
+            self.queue_message(chat_id, "📦 Préparation du package...")
 
             if not os.path.exists(self.deployment_file_path):
-                self.send_message(chat_id, "❌ Package non trouvé.")
+                self.queue_message(chat_id, "❌ Package non trouvé.")
                 return
 
-            success = self.send_document(chat_id, self.deployment_file_path)
-
-            if success:
-                self.send_message(chat_id, "✅ Package DEPI40000 envoyé avec succès !")
+            self.queue_document(chat_id, self.deployment_file_path,
+                                success_text="✅ Package DEPI40000 envoyé avec succès !")
 
         except Exception as e:
             logger.error(f"Error handling ni command: {e}")
@@ -566,31 +576,31 @@ class TelegramHandlers:
         """Handle /pred command - sends only the corrected card_predictor.py file"""
         try:
             if user_id and not self._is_authorized_user(user_id):
-                self.send_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
+                self.queue_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
                 return
 
-            self.send_message(chat_id, "🔧 Préparation du fichier card_predictor.py corrigé...")
+            self.queue_message(chat_id, "🔧 Préparation du fichier card_predictor.py corrigé...")
 
             # Assuming the corrected file is packaged or directly available for this command
             pred_file_path = "pred_update.zip" # Placeholder or actual path
             if not os.path.exists(pred_file_path):
                 # Fallback or specific file not found
                 # For this example, we'll assume it's for demonstration purposes
-                self.send_message(chat_id, "❌ Fichier de prédiction corrigé non trouvé. (Veuillez utiliser /deploy pour le package complet)")
+                self.queue_message(chat_id, "❌ Fichier de prédiction corrigé non trouvé. (Veuillez utiliser /deploy pour le package complet)")
                 return
             
             # --- Code pour envoyer le document (omnis par clarté) ---
-            success = self.send_document(chat_id, pred_file_path)
-
-            if success:
-                self.send_message(
-                    chat_id, 
+            self.queue_document(
+                chat_id,
+                pred_file_path,
+                success_text=(
                     "✅ Fichier card_predictor.py corrigé envoyé avec succès !\n\n"
                     "🔧 Cette correction permet maintenant de reconnaître :\n"
                     "• Messages finalisés avec ✅\n"
                     "• Messages finalisés avec 🔰\n\n"
                     "📝 Remplacez votre fichier card_predictor.py existant par cette version corrigée."
                 )
+            )
 
         except Exception as e:
             logger.error(f"Error handling pred command: {e}")
@@ -599,19 +609,17 @@ class TelegramHandlers:
         """Handle /fin command"""
         try:
             if user_id and not self._is_authorized_user(user_id):
-                self.send_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
+                self.queue_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
                 return
 
-            self.send_message(chat_id, "📦 Préparation du package final...")
+            self.queue_message(chat_id, "📦 Préparation du package final...")
 
             if not os.path.exists(self.deployment_file_path):
-                self.send_message(chat_id, "❌ Package final non trouvé.")
+                self.queue_message(chat_id, "❌ Package final non trouvé.")
                 return
 
-            success = self.send_document(chat_id, self.deployment_file_path)
-
-            if success:
-                self.send_message(chat_id, "✅ Package FINAL DEPI40000 envoyé !")
+            self.queue_document(chat_id, self.deployment_file_path,
+                                success_text="✅ Package FINAL DEPI40000 envoyé !")
 
         except Exception as e:
             logger.error(f"Error handling fin command: {e}")
@@ -620,45 +628,120 @@ class TelegramHandlers:
         """Handle /cooldown command"""
         try:
             if user_id and not self._is_authorized_user(user_id):
-                self.send_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
+                self.queue_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
                 return
 
             parts = text.strip().split()
             if len(parts) == 1:
                 current_cooldown = self.card_predictor.prediction_cooldown if self.card_predictor else 30
-                self.send_message(chat_id, f"⏰ Cooldown actuel: {current_cooldown} secondes")
+                self.queue_message(chat_id, f"⏰ Cooldown actuel: {current_cooldown} secondes")
                 return
 
-            if len(parts) != 2:
-                self.send_message(chat_id, "❌ Format: /cooldown [secondes]")
+            if len(parts) not in (2, 3):
+                self.queue_message(chat_id, "❌ Format: /cooldown [secondes] [source_id]")
                 return
 
             try:
                 seconds = int(parts[1])
                 if seconds < 30 or seconds > 600:
-                    self.send_message(chat_id, "❌ Délai entre 30 et 600 secondes")
+                    self.queue_message(chat_id, "❌ Délai entre 30 et 600 secondes")
                     return
             except ValueError:
-                self.send_message(chat_id, "❌ Nombre invalide")
+                self.queue_message(chat_id, "❌ Nombre invalide")
                 return
 
-            if self.card_predictor:
-                self.card_predictor.prediction_cooldown = seconds
-                self.send_message(chat_id, f"✅ Cooldown mis à jour: {seconds}s")
+            # Chaque canal source a son propre cooldown (canal par défaut sans source_id)
+            try:
+                source_id = int(parts[2]) if len(parts) == 3 else TARGET_CHANNEL_ID
+            except ValueError:
+                self.queue_message(chat_id, "❌ ID source invalide")
+                return
+
+            predictor = self.predictors.get(source_id) if self.predictors else None
+            if predictor:
+                predictor.set_prediction_cooldown(seconds)
+                self.queue_message(chat_id, f"✅ Cooldown mis à jour: {seconds}s ({source_id})")
+            else:
+                self.queue_message(chat_id, f"❌ Canal source non suivi: {source_id}")
 
         except Exception as e:
             logger.error(f"Error handling cooldown command: {e}")
 
+    def _handle_rules_command(self, chat_id: int, text: str, user_id: int = None) -> None:
+        """Handle /rules command: show the active rules, or reload them from disk"""
+        try:
+            if user_id and not self._is_authorized_user(user_id):
+                self.queue_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
+                return
+
+            if not self.card_predictor:
+                self.queue_message(chat_id, "❌ Prédicteur non disponible")
+                return
+
+            rules = self.card_predictor.rules
+            parts = text.strip().split()
+            if len(parts) == 1:
+                self.queue_message(chat_id, rules.current().describe())
+                return
+
+            if parts[1] != 'reload':
+                self.queue_message(chat_id, "❌ Format: /rules [reload]")
+                return
+
+            # Le plan actif reste en place si le fichier est invalide
+            try:
+                plan = rules.reload()
+            except Exception as e:
+                self.queue_message(chat_id, f"❌ Règles non rechargées, les règles actuelles restent actives:\n{e}")
+                return
+            self.queue_message(chat_id, "✅ Règles rechargées\n\n" + plan.describe())
+
+        except Exception as e:
+            logger.error(f"Error handling rules command: {e}")
+
+    def _handle_stats_command(self, chat_id: int, text: str, user_id: int = None) -> None:
+        """Handle /stats command: rolling win rates of a source channel's predictions"""
+        try:
+            if user_id and not self._is_authorized_user(user_id):
+                self.queue_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
+                return
+
+            parts = text.strip().split()
+            if len(parts) > 2:
+                self.queue_message(chat_id, "❌ Format: /stats [source_id]")
+                return
+
+            try:
+                source_id = int(parts[1]) if len(parts) == 2 else TARGET_CHANNEL_ID
+            except ValueError:
+                self.queue_message(chat_id, "❌ ID source invalide")
+                return
+
+            predictor = self.predictors.get(source_id) if self.predictors else None
+            if not predictor:
+                self.queue_message(chat_id, f"❌ Canal source non suivi: {source_id}")
+                return
+
+            # Compteurs glissants tenus à jour à chaque vérification: aucun parcours de l'historique
+            answer = f"📊 **STATISTIQUES DES PRÉDICTIONS** ({source_id})\n" + format_stats(predictor.stats.snapshot())
+            if not predictor.state.shared and WEB_CONCURRENCY > 1:
+                answer += (f"\n\nℹ️ Chiffres de ce worker uniquement ({WEB_CONCURRENCY} workers, "
+                           "STATE_BACKEND=sqlite pour des chiffres communs)")
+            self.queue_message(chat_id, answer)
+
+        except Exception as e:
+            logger.error(f"Error handling stats command: {e}")
+
     def _handle_announce_command(self, chat_id: int, text: str, user_id: int = None) -> None:
         """Handle /announce command"""
         try:
             if user_id and not self._is_authorized_user(user_id):
-                self.send_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
+                self.queue_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
                 return
 
             parts = text.strip().split(maxsplit=1)
             if len(parts) == 1:
-                self.send_message(chat_id, "💡 Usage: /announce [message]")
+                self.queue_message(chat_id, "💡 Usage: /announce [message]")
                 return
 
             announcement_text = parts[1]
@@ -666,10 +749,11 @@ class TelegramHandlers:
             target_channel = self.get_redirect_channel(TARGET_CHANNEL_ID) 
             formatted_message = f"📢 **ANONCE OFFICIELLE** 📢\n\n{announcement_text}"
 
-            sent_message_info = self.send_message(target_channel, formatted_message)
+            def confirm(sent_message_info):
+                if sent_message_info:
+                    self.queue_message(chat_id, f"✅ Annonce envoyée avec succès au canal: {target_channel}")
 
-            if sent_message_info:
-                self.send_message(chat_id, f"✅ Annonce envoyée avec succès au canal: {target_channel}")
+            self.queue_message(target_channel, formatted_message, on_sent=confirm)
 
         except Exception as e:
             logger.error(f"Error handling announce command: {e}")
@@ -678,34 +762,39 @@ class TelegramHandlers:
         """Handle /redirect command"""
         try:
             if user_id and not self._is_authorized_user(user_id):
-                self.send_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
+                self.queue_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
                 return
 
             parts = text.strip().split()
             if len(parts) == 1:
-                self.send_message(chat_id, "💡 Usage: /redirect [source_id] [target_id]")
+                self.queue_message(chat_id, "💡 Usage: /redirect [source_id] [target_id]")
                 return
 
             if parts[1] == "clear":
-                if self.card_predictor:
-                    self.card_predictor.redirect_channels.clear()
-                    self.send_message(chat_id, "✅ Redirections supprimées")
+                if self.predictors:
+                    for _, predictor in self.predictors:
+                        predictor.clear_redirect_channels()
+                    self.queue_message(chat_id, "✅ Redirections supprimées")
                 return
 
             if len(parts) != 3:
-                self.send_message(chat_id, "❌ Format: /redirect [source_id] [target_id]")
+                self.queue_message(chat_id, "❌ Format: /redirect [source_id] [target_id]")
                 return
 
             try:
                 source_id = int(parts[1])
                 target_id = int(parts[2])
             except ValueError:
-                self.send_message(chat_id, "❌ IDs invalides")
+                self.queue_message(chat_id, "❌ IDs invalides")
                 return
 
-            if self.card_predictor:
-                self.card_predictor.set_redirect_channel(source_id, target_id)
-                self.send_message(chat_id, f"✅ Redirection: {source_id} → {target_id}")
+            # La redirection est stockée par le prédicteur du canal source
+            predictor = self.predictors.get(source_id) if self.predictors else None
+            if predictor:
+                predictor.set_redirect_channel(source_id, target_id)
+                self.queue_message(chat_id, f"✅ Redirection: {source_id} → {target_id}")
+            else:
+                self.queue_message(chat_id, f"❌ Canal source non suivi: {source_id}")
 
         except Exception as e:
             logger.error(f"Error handling redirect command: {e}")
@@ -714,26 +803,27 @@ class TelegramHandlers:
         """Handle /cos command"""
         try:
             if user_id and not self._is_authorized_user(user_id):
-                self.send_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
+                self.queue_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
                 return
 
             parts = text.strip().split()
             if len(parts) != 2:
-                self.send_message(chat_id, "❌ Format: /cos [1|2]")
+                self.queue_message(chat_id, "❌ Format: /cos [1|2]")
                 return
 
             try:
                 position = int(parts[1])
                 if position not in [1, 2]:
-                    self.send_message(chat_id, "❌ Position 1 ou 2 seulement")
+                    self.queue_message(chat_id, "❌ Position 1 ou 2 seulement")
                     return
             except ValueError:
-                self.send_message(chat_id, "❌ Position invalide")
+                self.queue_message(chat_id, "❌ Position invalide")
                 return
 
-            if self.card_predictor:
-                self.card_predictor.set_position_preference(position)
-                self.send_message(chat_id, f"✅ Position de carte: {position}")
+            if self.predictors:
+                for _, predictor in self.predictors:
+                    predictor.set_position_preference(position)
+                self.queue_message(chat_id, f"✅ Position de carte: {position}")
 
         except Exception as e:
             logger.error(f"Error handling cos command: {e}")
@@ -745,7 +835,7 @@ class TelegramHandlers:
             chat_type = message['chat'].get('type', 'private')
 
             if chat_type == 'private':
-                self.send_message(
+                self.queue_message(
                     chat_id,
                     "🎭 Salut ! Je suis le bot Joker.\n"
                     "Utilisez /help pour voir mes commandes."
@@ -761,7 +851,7 @@ class TelegramHandlers:
 
             for member in message['new_chat_members']:
                 if member.get('is_bot', False):
-                    self.send_message(chat_id, GREETING_MESSAGE)
+                    self.queue_message(chat_id, GREETING_MESSAGE)
                     break
 
         except Exception as e:
@@ -771,7 +861,7 @@ class TelegramHandlers:
         """Handle /redi command"""
         try:
             if user_id and not self._is_authorized_user(user_id):
-                self.send_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
+                self.queue_message(chat_id, "🚫 Vous n'êtes pas autorisé à utiliser ce bot.")
                 return
 
             # Utilise le TARGET_CHANNEL_ID comme source par défaut
@@ -781,7 +871,7 @@ class TelegramHandlers:
             # Stockage local pour compatibilité
             self.redirected_channels[TARGET_CHANNEL_ID] = sender_chat_id
 
-            self.send_message(chat_id, f"✅ Prédictions redirigées vers ce chat ({sender_chat_id}).")
+            self.queue_message(chat_id, f"✅ Prédictions redirigées vers ce chat ({sender_chat_id}).")
 
         except Exception as e:
             logger.error(f"Error handling redi command: {e}")
@@ -791,25 +881,27 @@ class TelegramHandlers:
         try:
             if user_id and not self._is_authorized_user(user_id):
                 # Répondre même si non autorisé pour éviter confusion dans un groupe
-                self.send_message(sender_chat_id, "🚫 Vous n'êtes pas autorisé à réinitialiser le système.")
+                self.queue_message(sender_chat_id, "🚫 Vous n'êtes pas autorisé à réinitialiser le système.")
                 return
 
-            if self.card_predictor:
-                self.card_predictor.reset_all_predictions()
+            if self.predictors:
+                for _, predictor in self.predictors:
+                    predictor.reset_all_predictions()
                 # Réinitialiser également la redirection locale pour la source principale
                 if TARGET_CHANNEL_ID in self.redirected_channels:
                     del self.redirected_channels[TARGET_CHANNEL_ID]
 
-                self.send_message(sender_chat_id, "✅ Système complètement réinitialisé.")
+                self.queue_message(sender_chat_id, "✅ Système complètement réinitialisé.")
 
         except Exception as e:
             logger.error(f"Error handling reset command: {e}")
 
     def get_redirect_channel(self, source_chat_id: int) -> int:
         """Get the target channel for redirection"""
-        # 1. Vérifie si une redirection est configurée dans le prédicteur
-        if self.card_predictor and hasattr(self.card_predictor, 'redirect_channels'):
-            redirect_target = self.card_predictor.redirect_channels.get(source_chat_id)
+        # 1. Vérifie si une redirection est configurée dans le prédicteur du canal source
+        predictor = (self.predictors.peek(source_chat_id) if self.predictors else None) or self.card_predictor
+        if predictor and hasattr(predictor, 'redirect_channels'):
+            redirect_target = predictor.redirect_channels.get(source_chat_id)
             if redirect_target:
                 return redirect_target
 
@@ -821,53 +913,209 @@ class TelegramHandlers:
         # 3. Retourne l'ID de canal par défaut (corrigé)
         return PREDICTION_CHANNEL_ID 
 
-    def send_message(self, chat_id: int, text: str) -> Dict[str, Any] | bool: 
-        """Send text message to user using direct API call"""
-        try:
-            url = f"{self.base_url}/sendMessage"
-            data = {
-                'chat_id': chat_id,
-                'text': text,
-                'parse_mode': 'Markdown' # Utilisation de Markdown pour les messages, car WELCOME_MESSAGE utilise **
-            }
+    def queue_message(self, chat_id: int, text: str,
+                      on_sent: Optional[Callable[[Any], None]] = None) -> bool:
+        """Queue a text message; on_sent receives the send_message result"""
+        return self.dispatcher.submit('sendMessage', chat_id, {'chat_id': chat_id, 'text': text},
+                                      callback=on_sent)
+
+    def queue_document(self, chat_id: int, file_path: str, success_text: Optional[str] = None) -> bool:
+        """Queue a document upload, followed by success_text once it is delivered"""
+        def confirm(success):
+            if success and success_text:
+                self.queue_message(chat_id, success_text)
+
+        return self.dispatcher.submit('sendDocument', chat_id, {'chat_id': chat_id, 'file_path': file_path},
+                                      callback=confirm)
+
+    def queue_prediction(self, target_channel: int, target_game: int, prediction: str,
+                         predictor=None) -> bool:
+        """Queue a prediction message and record its message_id once sent"""
+        predictor = predictor or self.card_predictor
+
+        def store(sent_message_info):
+            message_id = sent_message_info.get('message_id') if isinstance(sent_message_info, dict) else None
+            with self._parked_lock:
+                if message_id:
+                    predictor.register_sent_prediction(target_game, target_channel, message_id)
+                parked = self._parked_edits.pop((predictor, target_game), None)
+            if message_id:
+                logger.info("📝 PRÉDICTION STOCKÉE pour jeu %s vers canal %s", target_game, target_channel)
 
-            response = requests.post(url, json=data, timeout=10)
-            result = response.json()
+            if parked is None:
+                return
+            if message_id:
+                # Le statut est arrivé avant l'envoi: l'édition part maintenant
+                self.edit_queue.submit(target_channel, message_id, parked[0])
+            else:
+                logger.error(f"🔍 ❌ ÉCHEC ÉDITION - Prédiction {target_game} jamais envoyée, statut perdu")
 
-            if result.get('ok'):
-                logger.info(f"Message sent successfully to chat {chat_id}")
-                return result.get('result', {}) # Return result for message_id extraction
+        # The dispatcher runs the callback with None when the send fails; a dropped send never runs it
+        if not self.queue_message(target_channel, prediction, on_sent=store):
+            store(None)
+            return False
+        return True
+
+    def queue_prediction_edit(self, predicted_game: int, new_text: str, predictor=None,
+                              source_chat_id: int = TARGET_CHANNEL_ID) -> bool:
+        """Queue the status edit of a prediction message.
+
+        The message_id is looked up when the job runs, so an edit queued right
+        after its prediction still finds it: until the prediction is sent, the
+        edit goes to the shard of the source channel's redirect target, the
+        chat queue_prediction sent it to. If the message_id is still missing
+        when the job runs, the edit is parked and the prediction's send
+        callback delivers it (or drops it if the send failed); a parked edit
+        whose send never completes is dropped after PARKED_EDIT_TTL seconds.
+        The job then hands the edit to the edit queue, which paces and
+        retries it.
+        """
+        predictor = predictor or self.card_predictor
+        message_info = predictor.sent_predictions.get(predicted_game)
+        shard_chat = message_info['chat_id'] if message_info else self.get_redirect_channel(source_chat_id)
+
+        def resolve():
+            with self._parked_lock:
+                info = predictor.sent_predictions.get(predicted_game)
+                if not info:
+                    # Prediction not sent yet: its send callback delivers the latest status
+                    self._park_edit(predictor, predicted_game, new_text)
+                    return None
+            return {'chat_id': info['chat_id'], 'message_id': info['message_id'], 'text': new_text}
+
+        def report(queued):
+            if queued:
+                logger.debug("🔍 ✏️ ÉDITION EN FILE - Prédiction %s", predicted_game)
             else:
-                # Ajout de logs pour l'erreur de canal cible
-                if result.get('error_code') == 400 and 'chat not found' in result.get('description', '').lower():
-                    logger.error(f"❌ Échec d'envoi: Le canal/chat ID {chat_id} est introuvable ou le bot n'y est pas/n'a pas les droits.")
-                
-                logger.error(f"Failed to send message: {result}")
+                logger.error(f"🔍 ❌ ÉCHEC ÉDITION - Prédiction {predicted_game}")
+
+        return self.dispatcher.submit('editMessageText', shard_chat, resolve=resolve, callback=report)
+
+    def _park_edit(self, predictor, predicted_game: int, new_text: str) -> None:
+        """Hold a status edit until its prediction is sent (called under _parked_lock)"""
+        key = (predictor, predicted_game)
+        now = time.monotonic()
+        self._parked_edits[key] = (new_text, now)
+        self._parked_edits.move_to_end(key)
+        logger.info("🔍 ⏳ ÉDITION EN ATTENTE - Prédiction %s pas encore envoyée", predicted_game)
+        while len(self._parked_edits) > PARKED_EDITS_MAX:
+            (_, game), _ = self._parked_edits.popitem(last=False)
+            logger.warning(f"🔍 ⚠️ AUCUN MESSAGE STOCKÉ pour {game}, édition abandonnée")
+        self._expire_parked_edits(now)
+
+    def _expire_parked_edits(self, now: Optional[float] = None) -> int:
+        """Drop the held edits whose prediction was not sent within PARKED_EDIT_TTL; returns how many"""
+        now = time.monotonic() if now is None else now
+        expired = 0
+        with self._parked_lock:
+            # Oldest first: parking again moves an entry to the end
+            while self._parked_edits:
+                key, (_, parked_at) = next(iter(self._parked_edits.items()))
+                if now - parked_at < PARKED_EDIT_TTL:
+                    break
+                del self._parked_edits[key]
+                expired += 1
+                logger.error(f"🔍 ❌ ÉCHEC ÉDITION - Prédiction {key[1]} toujours pas envoyée "
+                             f"après {PARKED_EDIT_TTL:g}s, statut perdu")
+        return expired
+
+    def _deliver(self, method: str, payload: Dict[str, Any]) -> Any:
+        """Run one queued call on a dispatcher worker"""
+        if method == 'sendMessage':
+            return self.send_message(payload['chat_id'], payload['text'])
+        if method == 'editMessageText':
+            return self.edit_queue.submit(payload['chat_id'], payload['message_id'], payload['text'])
+        if method == 'sendDocument':
+            return self.send_document(payload['chat_id'], payload['file_path'])
+        logger.error(f"❌ Méthode sortante inconnue: {method}")
+        return False
+
+    async def _deliver_async(self, method: str, payload: Dict[str, Any]) -> Any:
+        """_deliver for the asyncio transport; document uploads keep the sync path in a thread"""
+        if method == 'sendMessage':
+            try:
+                data = self._message_data(payload['chat_id'], payload['text'])
+                result = await self.async_client.call('sendMessage', json=data, timeout=10)
+                return self._sent_message(payload['chat_id'], result)
+            except Exception as e:
+                logger.error(f"Error sending message: {e}")
                 return False
+        if method == 'editMessageText':
+            return self.edit_queue.submit(payload['chat_id'], payload['message_id'], payload['text'])
+        return await asyncio.to_thread(self._deliver, method, payload)
+
+    @staticmethod
+    def _message_data(chat_id: int, text: str) -> Dict[str, Any]:
+        return {
+            'chat_id': chat_id,
+            'text': text,
+            'parse_mode': 'Markdown' # Utilisation de Markdown pour les messages, car WELCOME_MESSAGE utilise **
+        }
+
+    def _sent_message(self, chat_id: int, result: Dict[str, Any]) -> Dict[str, Any] | bool:
+        if result.get('ok'):
+            logger.debug("Message sent successfully to chat %s", chat_id)
+            return result.get('result', {}) # Return result for message_id extraction
+        else:
+            # Ajout de logs pour l'erreur de canal cible
+            if result.get('error_code') == 400 and 'chat not found' in result.get('description', '').lower():
+                logger.error(f"❌ Échec d'envoi: Le canal/chat ID {chat_id} est introuvable ou le bot n'y est pas/n'a pas les droits.")
+
+            logger.error(f"Failed to send message: {result}")
+            return False
+
+    def send_message(self, chat_id: int, text: str) -> Dict[str, Any] | bool: 
+        """Send text message to user using direct API call"""
+        try:
+            result = self.client.call('sendMessage', json=self._message_data(chat_id, text), timeout=10)
+            return self._sent_message(chat_id, result)
 
         except Exception as e:
             logger.error(f"Error sending message: {e}")
             return False
 
     def send_document(self, chat_id: int, file_path: str) -> bool:
-        """Send document file to user"""
+        """Send document file to user (by cached file_id when this content was already uploaded)"""
+        caption = '📦 Package de déploiement pour render.com'
         try:
-            url = f"{self.base_url}/sendDocument"
+            file_id, digest = self.document_cache.lookup(file_path)
+        except FileNotFoundError:
+            logger.error(f"File not found: {file_path}")
+            return False
+        except Exception as e:
+            logger.error(f"Error reading document: {e}")
+            file_id, digest = None, None
 
+        if file_id:
+            try:
+                result = self.client.call('sendDocument', json={'chat_id': chat_id, 'document': file_id,
+                                                                'caption': caption}, timeout=10)
+                if result.get('ok'):
+                    logger.debug("Document sent by file_id to chat %s", chat_id)
+                    return True
+                # file_id refusé (expiré, autre bot...): on l'oublie et on renvoie le fichier
+                logger.warning(f"📎 file_id refusé pour {file_path}: {result.get('description')}")
+                self.document_cache.forget(file_path, digest)
+            except Exception as e:
+                logger.error(f"Error sending cached document: {e}")
+
+        try:
             with open(file_path, 'rb') as file:
                 files = {
                     'document': (os.path.basename(file_path), file, 'application/zip')
                 }
                 data = {
                     'chat_id': chat_id,
-                    'caption': '📦 Package de déploiement pour render.com'
+                    'caption': caption
                 }
 
-                response = requests.post(url, data=data, files=files, timeout=60)
-                result = response.json()
+                result = self.client.call('sendDocument', data=data, files=files, timeout=60)
 
                 if result.get('ok'):
-                    logger.info(f"Document sent successfully to chat {chat_id}")
+                    logger.debug("Document sent successfully to chat %s", chat_id)
+                    uploaded_id = result.get('result', {}).get('document', {}).get('file_id')
+                    if uploaded_id and digest:
+                        self.document_cache.store(file_path, digest, uploaded_id)
                     return True
                 else:
                     logger.error(f"Failed to send document: {result}")
@@ -880,22 +1128,28 @@ class TelegramHandlers:
             logger.error(f"Error sending document: {e}")
             return False
 
+    def _call_edit_message(self, chat_id: int, message_id: int, new_text: str,
+                           max_retries: Optional[int] = 0) -> Dict[str, Any]:
+        """editMessageText call; by default 429 and 5xx answers come back as-is for the edit queue"""
+        return self.client.call('editMessageText', json=self._edit_message_data(chat_id, message_id, new_text),
+                                timeout=10, max_retries=max_retries)
+
+    @staticmethod
+    def _edit_message_data(chat_id: int, message_id: int, new_text: str) -> Dict[str, Any]:
+        return {
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'text': new_text,
+            'parse_mode': 'Markdown' # Changé en Markdown pour la cohérence
+        }
+
     def edit_message(self, chat_id: int, message_id: int, new_text: str) -> bool:
         """Edit an existing message using direct API call"""
         try:
-            url = f"{self.base_url}/editMessageText"
-            data = {
-                'chat_id': chat_id,
-                'message_id': message_id,
-                'text': new_text,
-                'parse_mode': 'Markdown' # Changé en Markdown pour la cohérence
-            }
-
-            response = requests.post(url, json=data, timeout=10)
-            result = response.json()
+            result = self._call_edit_message(chat_id, message_id, new_text, max_retries=None)
 
             if result.get('ok'):
-                logger.info(f"Message edited successfully in chat {chat_id}")
+                logger.debug("Message edited successfully in chat %s", chat_id)
                 return True
             else:
                 logger.error(f"Failed to edit message: {result}")
@@ -0,0 +1,272 @@
+"""
+Load test comparing the Flask (main:app) and ASGI (asgi:app) webhook servers
+
+Usage:
+    python loadtest.py
+    python loadtest.py --updates 2000 --concurrency 50 --latency 0.1 --output loadtest.json
+    python loadtest.py --modes asgi
+
+Both servers run as subprocesses against a local fake Bot API that answers
+every call after --latency seconds. They receive the same update stream:
+finalized channel posts (predictions and status edits) interleaved with
+/start commands from distinct users (one reply each). Each run uses its own
+state database, and the fake API tallies the calls by method, so the
+tallies of the two runs should match. Reported: webhook response
+latency, and how long until every outbound call reached Telegram.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from benchmark import _percentile, generate_messages
+
+TOKEN = '123456:loadtest'
+# Source channel the servers follow (same default as handlers.py)
+TARGET_CHANNEL_ID = int(os.getenv('TARGET_CHANNEL_ID', '-1002682552255'))
+
+
+class FakeTelegram(ThreadingHTTPServer):
+    """Bot API stand-in: answers ok after a fixed delay and counts calls per method"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency: float):
+        super().__init__(('127.0.0.1', 0), _FakeTelegramHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.last_call = 0.0
+        self.message_id = 0
+
+    def reset(self) -> None:
+        with self.lock:
+            self.calls = {}
+            self.max_in_flight = 0
+            self.last_call = 0.0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _FakeTelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server: FakeTelegram = self.server
+        method = self.path.rsplit('/', 1)[-1]
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.message_id += 1
+            message_id = server.message_id
+        time.sleep(server.latency)
+        result: Any = {'message_id': message_id}
+        if method == 'sendDocument':
+            result['document'] = {'file_id': f'file-{message_id}'}
+        elif method in ('setWebhook', 'deleteWebhook'):
+            result = True
+        body = json.dumps({'ok': True, 'result': result}).encode()
+        with server.lock:
+            server.in_flight -= 1
+            server.calls[method] = server.calls.get(method, 0) + 1
+            server.last_call = time.perf_counter()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+
+def build_updates(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Same stream for every run: channel edits, and a /start from a new user every third update"""
+    messages = generate_messages(count, seed=seed)
+    updates = []
+    for index, text in enumerate(messages):
+        update_id = index + 1
+        if index % 3 == 2:
+            user_id = 10_000 + index
+            updates.append({'update_id': update_id, 'message': {
+                'message_id': update_id, 'date': 0, 'text': '/start',
+                'chat': {'id': user_id, 'type': 'private'}, 'from': {'id': user_id}}})
+        else:
+            updates.append({'update_id': update_id, 'edited_message': {
+                'message_id': update_id, 'date': 0, 'edit_date': 0, 'text': text,
+                'chat': {'id': TARGET_CHANNEL_ID, 'type': 'channel'},
+                'sender_chat': {'id': TARGET_CHANNEL_ID, 'type': 'channel'}}})
+    return updates
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _server_command(mode: str, port: int, threads: int) -> List[str]:
+    if mode == 'asgi':
+        if importlib.util.find_spec('uvicorn') is None:
+            raise RuntimeError("le mode asgi demande uvicorn (pip install uvicorn), ou lancez --modes flask")
+        return [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+                '--log-level', 'warning']
+    if importlib.util.find_spec('gunicorn') is None:
+        print("⚠️ gunicorn non installé: serveur de développement Flask (threads), --threads ignoré",
+              file=sys.stderr)
+        return [sys.executable, 'main.py']
+    # Same shape as the Procfile: one worker, GUNICORN_THREADS threads
+    return [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', '1',
+            '--threads', str(threads), '--timeout', '120', 'main:app']
+
+
+def _wait_ready(base: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"le serveur s'est arrêté (code {process.returncode})")
+        try:
+            if requests.get(f"{base}/", timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("le serveur n'a pas démarré à temps")
+
+
+def _settle(base: str, fake: FakeTelegram, quiet: float, timeout: float) -> Dict[str, Any]:
+    """Wait until nothing is queued and the fake API has seen no call for `quiet` seconds"""
+    deadline = time.monotonic() + timeout
+    health: Dict[str, Any] = {}
+    while time.monotonic() < deadline:
+        health = requests.get(f"{base}/health", timeout=5).json()
+        idle = time.perf_counter() - fake.last_call if fake.last_call else 0
+        if (health['outbound']['queue_depth'] == 0 and health['edits']['pending'] == 0
+                and fake.in_flight == 0 and idle >= quiet):
+            break
+        time.sleep(0.1)
+    return health
+
+
+def run_mode(mode: str, updates: List[Dict[str, Any]], fake: FakeTelegram, concurrency: int,
+             threads: int, workdir: str) -> Dict[str, Any]:
+    """Start one server, post every update, wait for its outbound calls to drain"""
+    port = _free_port()
+    env = dict(os.environ,
+               BOT_TOKEN=TOKEN,
+               PORT=str(port),
+               TELEGRAM_API_BASE=fake.url,
+               STATE_DB_PATH=os.path.join(workdir, f'{mode}.db'),
+               WEBHOOK_URL='',
+               LOG_LEVEL='ERROR',
+               # The fake API has no flood control: do not let edit pacing dominate the timings
+               EDIT_RATE_PER_CHAT=os.getenv('EDIT_RATE_PER_CHAT', '1000/1'),
+               EDIT_RATE_GLOBAL=os.getenv('EDIT_RATE_GLOBAL', '1000/1'))
+    fake.reset()
+    base = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(_server_command(mode, port, threads), env=env,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        _wait_ready(base, process)
+        local = threading.local()
+
+        def post(update: Dict[str, Any]) -> float:
+            session = getattr(local, 'session', None)
+            if session is None:
+                session = local.session = requests.Session()
+            began = time.perf_counter()
+            session.post(f"{base}/webhook", json=update, timeout=30).raise_for_status()
+            return time.perf_counter() - began
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = sorted(pool.map(post, updates))
+        posted = time.perf_counter() - started
+        health = _settle(base, fake, quiet=max(1.0, fake.latency * 5), timeout=300)
+        drained = (fake.last_call or time.perf_counter()) - started
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    return {
+        'updates': len(updates),
+        'post_seconds': round(posted, 3),
+        'updates_per_sec': round(len(updates) / posted, 1),
+        'webhook_p50_ms': round(_percentile(latencies, 0.50) * 1000, 2),
+        'webhook_p99_ms': round(_percentile(latencies, 0.99) * 1000, 2),
+        'outbound_drained_seconds': round(drained, 3),
+        'telegram_calls': dict(sorted(fake.calls.items())),
+        'telegram_max_in_flight': fake.max_in_flight,
+        'outbound': health.get('outbound', {}),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--updates', type=int, default=1000, help='updates posted to each server')
+    parser.add_argument('--concurrency', type=int, default=20, help='webhook requests in flight')
+    parser.add_argument('--latency', type=float, default=0.05, help='fake Telegram response time (seconds)')
+    parser.add_argument('--threads', type=int, default=int(os.getenv('GUNICORN_THREADS', '1')),
+                        help='gunicorn threads for the Flask server')
+    parser.add_argument('--modes', default='flask,asgi', help='servers to run, comma-separated')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    updates = build_updates(args.updates, args.seed)
+    fake = FakeTelegram(args.latency)
+    threading.Thread(target=fake.serve_forever, daemon=True).start()
+
+    results: Dict[str, Any] = {'updates': args.updates, 'concurrency': args.concurrency,
+                               'latency': args.latency, 'modes': {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in [m.strip() for m in args.modes.split(',') if m.strip()]:
+            try:
+                stats = run_mode(mode, updates, fake, args.concurrency, args.threads, workdir)
+            except RuntimeError as e:
+                print(f"❌ {mode}: {e}", file=sys.stderr)
+                fake.shutdown()
+                return 1
+            results['modes'][mode] = stats
+            print(f"  {mode:<6} {stats['updates_per_sec']:>8,.0f} updates/s  "
+                  f"webhook p50 {stats['webhook_p50_ms']:>6.1f}ms p99 {stats['webhook_p99_ms']:>6.1f}ms  "
+                  f"sortant vidé en {stats['outbound_drained_seconds']:>6.2f}s  "
+                  f"({sum(stats['telegram_calls'].values())} appels, {stats['telegram_max_in_flight']} simultanés max)")
+    fake.shutdown()
+
+    calls = [stats['telegram_calls'] for stats in results['modes'].values()]
+    if len(calls) > 1 and any(c != calls[0] for c in calls[1:]):
+        print("⚠️ Les appels Telegram diffèrent entre les modes: " + json.dumps(calls))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\nRésultats enregistrés dans {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
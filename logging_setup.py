@@ -0,0 +1,151 @@
+"""
+Logging configuration: queue-based async handler, per-module levels, sampled tracing
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from typing import Any, Dict, Optional
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# Per-module overrides, e.g. "card_predictor=DEBUG,telegram_client=WARNING"
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+# 'text' (one compact line per record) or 'json' (one JSON object per line)
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+# Fraction of updates whose DEBUG trace is kept when a module logs at DEBUG
+LOG_TRACE_SAMPLE_RATE = float(os.getenv('LOG_TRACE_SAMPLE_RATE', '0.01'))
+# Records waiting for the writer thread; beyond this they are dropped, not blocked on
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_trace = threading.local()
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def begin_trace(rate: Optional[float] = None) -> bool:
+    """Decide whether the update being handled on this thread keeps its DEBUG trace.
+
+    Sampling whole updates rather than single lines keeps sampled traces readable.
+    """
+    rate = LOG_TRACE_SAMPLE_RATE if rate is None else rate
+    _trace.sampled = random.random() < rate
+    return _trace.sampled
+
+
+class TraceSampler(logging.Filter):
+    """Lets DEBUG records through only for updates picked by begin_trace()"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or getattr(_trace, 'sampled', True)
+
+
+def _extra_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+
+def _field(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False) if isinstance(value, str) else str(value)
+
+
+class CompactFormatter(logging.Formatter):
+    """'12:03:04.512 I card_predictor: message key=value ...'"""
+
+    def __init__(self):
+        super().__init__(datefmt='%H:%M:%S')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = (f"{self.formatTime(record, self.datefmt)}.{int(record.msecs):03d} "
+                f"{record.levelname[0]} {record.name}: {record.getMessage()}")
+        fields = _extra_fields(record)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={_field(value)}" for key, value in fields.items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, extra= fields included"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the writer falls behind"""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def _parse_levels(spec: str) -> Dict[str, int]:
+    levels = {}
+    for item in spec.split(','):
+        name, _, level = item.strip().partition('=')
+        if name and level:
+            levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+def configure_logging(level: str = LOG_LEVEL, module_levels: str = LOG_LEVELS,
+                      fmt: str = LOG_FORMAT) -> None:
+    """Route all logging through a queue to a single writer thread"""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter() if fmt == 'json' else CompactFormatter())
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(TraceSampler())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+    for name, module_level in _parse_levels(module_levels).items():
+        logging.getLogger(name).setLevel(module_level)
+    # Per-request access lines from the HTTP libraries are noise at INFO
+    logging.getLogger('urllib3').setLevel(max(logging.WARNING, root.level))
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)  # Flush what is still queued on shutdown
+
+
+def log_update(logger: logging.Logger, update: Dict[str, Any]) -> None:
+    """One compact INFO record per incoming update"""
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    kind = 'edited_message' if 'edited_message' in update else 'message' if 'message' in update else 'other'
+    message = update.get(kind) or {}
+    text = message.get('text') or ''
+    logger.info("update %s", update.get('update_id'), extra={
+        'kind': kind,
+        'chat': message.get('chat', {}).get('id'),
+        'message_id': message.get('message_id'),
+        'text': text[:40],
+    })
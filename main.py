@@ -2,18 +2,28 @@
 Main entry point for the Telegram bot deployment on render.com
 """
 import os
+import sys
 import logging
-from flask import Flask, request
+from logging_setup import configure_logging
+
+# Configure logging before the imports below log anything (state restore)
+# Queue-based writer, per-module levels via LOG_LEVELS
+configure_logging()
+
+from flask import Flask, Response, request
 from bot import TelegramBot
+from card_predictor import card_predictor
+from predictor_registry import predictor_registry
+from handlers import rate_limiter
 from config import Config
+from metrics import REGISTRY
+from polling import run_polling
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+# 'webhook' (Flask/gunicorn) or 'polling' (getUpdates, no public URL needed)
+BOT_MODE = os.getenv('BOT_MODE', 'webhook').lower()
+
 # Initialize Flask app
 app = Flask(__name__)
 
@@ -30,41 +40,62 @@ def webhook():
     try:
         update = request.get_json()
 
-        # Log type de message reçu avec détails
-        if 'message' in update:
-            msg = update['message']
-            chat_id = msg.get('chat', {}).get('id', 'unknown')
-            user_id = msg.get('from', {}).get('id', 'unknown')
-            text = msg.get('text', '')[:50]
-            logger.info(f"📨 WEBHOOK - Message normal | Chat:{chat_id} | User:{user_id} | Text:{text}...")
-        elif 'edited_message' in update:
-            msg = update['edited_message']
-            chat_id = msg.get('chat', {}).get('id', 'unknown')
-            user_id = msg.get('from', {}).get('id', 'unknown')
-            text = msg.get('text', '')[:50]
-            logger.info(f"✏️ WEBHOOK - Message édité | Chat:{chat_id} | User:{user_id} | Text:{text}...")
-
-        logger.info(f"Webhook received update: {update}")
-
         if update:
-            # Traitement direct pour meilleure réactivité
+            # Analyse immédiate; les appels Telegram sortants partent en arrière-plan
             bot.handle_update(update)
-            logger.info("Update processed successfully")
 
         return 'OK', 200
     except Exception as e:
         logger.error(f"Error handling webhook: {e}")
         return 'Error', 500
 
+def health_status():
+    """Body of /health, shared with the ASGI entry point"""
+    return {
+        'status': 'healthy',
+        'service': 'telegram-bot',
+        'outbound': bot.handlers.dispatcher.get_stats(),
+        'edits': bot.handlers.edit_queue.get_stats(),
+        'updates': bot.deduplicator.get_stats(),
+        'state': card_predictor.get_state_stats(),
+        'predictors': predictor_registry.get_stats(),
+        'rate_limiter': rate_limiter.get_stats(),
+        'documents': bot.handlers.document_cache.get_stats()
+    }
+
+HOME_STATUS = {'message': 'Telegram Bot is running', 'status': 'active'}
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for render.com"""
-    return {'status': 'healthy', 'service': 'telegram-bot'}, 200
+    return health_status(), 200
+
+def _state_sizes():
+    """Entries held by every loaded predictor, read at scrape time"""
+    sizes = {}
+    for chat_id, predictor in predictor_registry:
+        source = str(chat_id)
+        sizes[('predictions', source)] = len(predictor.predictions)
+        sizes[('pending_posts', source)] = len(predictor.pending_tracker)
+        sizes[('processed_messages', source)] = len(predictor.processed_messages)
+        sizes[('pending_games', source)] = len(predictor.pending_games)
+    return sizes
+
+
+REGISTRY.gauge('predictor_state_entries', 'Entries in predictor state stores', ('store', 'source'),
+               callback=_state_sizes)
+REGISTRY.gauge('outbound_queue_depth', 'Telegram calls waiting in the dispatcher',
+               callback=lambda: {(): bot.handlers.dispatcher.queue_depth()})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of the hot-path metrics"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/', methods=['GET'])
 def home():
     """Root endpoint"""
-    return {'message': 'Telegram Bot is running', 'status': 'active'}, 200
+    return HOME_STATUS, 200
 
 def setup_webhook():
     """Set up webhook on startup"""
@@ -84,11 +115,17 @@ def setup_webhook():
                 logger.error("❌ Échec configuration webhook")
         else:
             logger.warning("⚠️ WEBHOOK_URL non configurée, mode polling recommandé pour le développement")
-            logger.info("💡 Pour activer le webhook, configurez la variable WEBHOOK_URL")
+            logger.info("💡 Pour activer le webhook, configurez la variable WEBHOOK_URL, "
+                        "ou lancez 'python main.py --polling' (BOT_MODE=polling)")
     except Exception as e:
         logger.error(f"❌ Erreur configuration webhook: {e}")
 
 if __name__ == '__main__':
+    if BOT_MODE == 'polling' or '--polling' in sys.argv:
+        logger.info("🔁 Mode polling: les updates sont récupérés via getUpdates")
+        run_polling(bot)
+        sys.exit(0)
+
     # Set up webhook on startup
     setup_webhook()
 
@@ -0,0 +1,91 @@
+"""
+Single-pass parser for Baccarat channel messages
+"""
+
+import re
+from typing import Optional, Tuple
+
+# Suits in the order the prediction rules evaluate them (❤️ is folded into ♥️)
+SUITS = ("♥️", "♠️", "♦️", "♣️")
+SUIT_INDEX = {suit: index for index, suit in enumerate(SUITS)}
+
+PENDING_INDICATORS = ('⏰', '▶', '🕐', '➡️')
+COMPLETION_INDICATORS = ('✅', '🔰')
+
+GAME_NUMBER_PATTERN = re.compile(r'#[nN](\d+)')
+PARENTHESES_PATTERN = re.compile(r'\(([^)]+)\)')
+
+
+def _count_suits(text: str) -> Tuple[int, int, int, int]:
+    """Count each suit in an already normalized text"""
+    return (
+        text.count("♥️"),
+        text.count("♠️"),
+        text.count("♦️"),
+        text.count("♣️")
+    )
+
+
+class ParsedGameMessage:
+    """Everything the prediction rules need from one channel post, computed once"""
+
+    __slots__ = (
+        'text', 'game_number',
+        'has_pending', 'has_completion', 'has_final', 'has_checkmark',
+        'has_r', 'has_x',
+        'sections', 'section_counts', 'suit_counts'
+    )
+
+    def __init__(self, text: str):
+        self.text = text
+
+        match = GAME_NUMBER_PATTERN.search(text)
+        self.game_number: Optional[int] = int(match.group(1)) if match else None
+
+        self.has_final = '🔰' in text
+        self.has_checkmark = '✅' in text
+        self.has_completion = self.has_final or self.has_checkmark
+        self.has_pending = any(indicator in text for indicator in PENDING_INDICATORS)
+        self.has_r = '#R' in text
+        self.has_x = '#X' in text
+
+        # Normalize ❤️ to ♥️ once; the parentheses spans are unaffected by it
+        normalized = text.replace("❤️", "♥️")
+        self.sections: Tuple[str, ...] = tuple(PARENTHESES_PATTERN.findall(normalized))
+        self.section_counts: Tuple[Tuple[int, int, int, int], ...] = tuple(
+            _count_suits(section) for section in self.sections
+        )
+        self.suit_counts = _count_suits(normalized)
+
+    def completion_indicator(self) -> Optional[str]:
+        """Return the first completion indicator present (✅ before 🔰)"""
+        if self.has_checkmark:
+            return '✅'
+        if self.has_final:
+            return '🔰'
+        return None
+
+    def combined_counts(self, first: int = 0, second: int = 1) -> Tuple[int, int, int, int]:
+        """Suit counts of two parentheses sections added together"""
+        a = self.section_counts[first]
+        b = self.section_counts[second]
+        return (a[0] + b[0], a[1] + b[1], a[2] + b[2], a[3] + b[3])
+
+    def first_section_has(self, costume: str) -> bool:
+        """Check whether a costume appears in the first parentheses"""
+        if not self.sections:
+            return False
+        index = SUIT_INDEX.get(costume.replace("❤️", "♥️"))
+        if index is None:
+            return costume.replace("❤️", "♥️") in self.sections[0]
+        return self.section_counts[0][index] > 0
+
+    def __repr__(self) -> str:
+        return f"ParsedGameMessage(game={self.game_number}, sections={self.sections!r})"
+
+
+def parse_message(message) -> ParsedGameMessage:
+    """Return a parsed view of a message, reusing it if it is already parsed"""
+    if isinstance(message, ParsedGameMessage):
+        return message
+    return ParsedGameMessage(message)
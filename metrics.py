@@ -0,0 +1,212 @@
+"""
+Minimal Prometheus-style metrics (counters, gauges, histograms) and text exposition
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+# Seconds; covers sub-millisecond parsing up to slow Telegram round-trips
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def collect(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic count, optionally split by labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        if not items and not self.labelnames:
+            items = [((), 0)]
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in items]
+
+
+class Gauge(_Metric):
+    """Point-in-time value read by a callback at scrape time (nothing to update on the hot path)"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Dict[LabelValues, float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, *labelvalues: str) -> None:
+        self._values[labelvalues] = value
+
+    def collect(self) -> List[str]:
+        values = dict(self._values)
+        if self.callback:
+            try:
+                values.update(self.callback())
+            except Exception:
+                pass  # A failing callback must not break the whole scrape
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in sorted(values.items())]
+
+
+class _HistogramSeries:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * (buckets + 1)  # Last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    """Bucketed distribution; observe() is a bisect and three additions under a lock"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = _HistogramSeries(len(self.buckets))
+            series.counts[index] += 1
+            series.total += value
+            series.count += 1
+
+    @contextmanager
+    def time(self, *labelvalues: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+    def collect(self) -> List[str]:
+        lines = []
+        with self._lock:
+            snapshot = [(labels, list(series.counts), series.total, series.count)
+                        for labels, series in sorted(self._series.items())]
+        for labels, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              callback: Optional[Callable[[], Dict[LabelValues, float]]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.header())
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# Hot-path metrics shared by the modules that record them
+UPDATE_SECONDS = REGISTRY.histogram('bot_update_handling_seconds', 'Time to handle one incoming update')
+PARSE_SECONDS = REGISTRY.histogram('predictor_parse_seconds', 'Time to parse a game message')
+RULES_SECONDS = REGISTRY.histogram('predictor_rules_seconds', 'Time to evaluate the prediction rules')
+VERIFY_SECONDS = REGISTRY.histogram('predictor_verify_seconds', 'Time to verify pending predictions')
+TELEGRAM_SECONDS = REGISTRY.histogram('telegram_api_seconds', 'Telegram Bot API round-trip time', ('method',),
+                                      buckets=DEFAULT_BUCKETS + (30.0, 60.0))
+PENDING_FINALIZATION_SECONDS = REGISTRY.histogram(
+    'pending_finalization_seconds', 'Time from an in-progress post to its finalized (✅/🔰) version',
+    buckets=(1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 45.0, 60.0, 90.0, 120.0, 180.0, 300.0, 600.0))
+PENDING_EXPIRED = REGISTRY.counter('pending_posts_expired_total', 'In-progress posts never finalized before the timeout')
+PREDICTIONS_MADE = REGISTRY.counter('predictions_made_total', 'Predictions made')
+TELEGRAM_EDITS = REGISTRY.counter('telegram_edits_total', 'Queued message edits, by outcome', ('outcome',))
+PREDICTIONS_SETTLED = REGISTRY.counter('predictions_settled_total', 'Predictions settled, by final status',
+                                       ('status',))
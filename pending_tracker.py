@@ -0,0 +1,218 @@
+"""
+Tracker of in-progress channel posts (⏰▶🕐➡️) until their finalized (✅/🔰) version
+"""
+
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from clock import system_clock
+from metrics import PENDING_EXPIRED, PENDING_FINALIZATION_SECONDS
+
+# Recent time-to-finalization samples kept for the percentiles in /health
+FINALIZATION_SAMPLES = 1000
+
+PostKey = Tuple[Optional[int], Optional[int]]  # (chat_id, message_id)
+
+
+class TimerWheel:
+    """Hashed timing wheel: deadlines rounded to `tick` seconds.
+
+    schedule() and cancel() are O(1). advance() only visits the slots of
+    the ticks that went by since the last call, and an entry is looked at
+    once per revolution, so expiring n entries costs O(n) amortized.
+    An entry expires at most one tick after its deadline.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 1024, now: float = 0.0):
+        self.tick = tick
+        self.slots = slots
+        self._wheel: List[Dict[Hashable, float]] = [{} for _ in range(slots)]
+        self._slot_of: Dict[Hashable, int] = {}
+        self._current = int(now // tick) - 1  # Last tick whose slot was processed
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        self.cancel(key)
+        index = max(int(deadline // self.tick), self._current + 1) % self.slots
+        self._wheel[index][key] = deadline
+        self._slot_of[key] = index
+
+    def cancel(self, key: Hashable) -> None:
+        index = self._slot_of.pop(key, None)
+        if index is not None:
+            del self._wheel[index][key]
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Keys whose deadline has passed, removed from the wheel"""
+        target = int(now // self.tick) - 1  # Only ticks that have fully elapsed
+        expired: List[Hashable] = []
+        steps = min(target - self._current, self.slots)
+        for step in range(1, steps + 1):
+            slot = self._wheel[(self._current + step) % self.slots]
+            if not slot:
+                continue
+            due = [key for key, deadline in slot.items() if deadline <= now]
+            for key in due:
+                del slot[key]
+                del self._slot_of[key]
+            expired.extend(due)
+        self._current = max(self._current, target)
+        return expired
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def clear(self) -> None:
+        for slot in self._wheel:
+            slot.clear()
+        self._slot_of.clear()
+
+
+class PendingPost:
+    """An in-progress post and when it was seen"""
+
+    __slots__ = ('chat_id', 'message_id', 'game_number', 'text', 'first_seen', 'last_seen', 'updates')
+
+    def __init__(self, chat_id: Optional[int], message_id: Optional[int], game_number: Optional[int],
+                 text: str, now: float):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.game_number = game_number
+        self.text = text
+        self.first_seen = now
+        self.last_seen = now
+        self.updates = 1
+
+
+class PendingEditTracker:
+    """In-progress posts keyed by (chat_id, message_id), linked to their final version.
+
+    A post is tracked while it carries a waiting indicator. It is resolved
+    by the finalized edit of the same message, or by a finalized post for
+    the same game in that chat (channels that publish the result as a new
+    message). The time from first sighting to finalization goes to the
+    pending_finalization_seconds histogram. A post left without activity
+    for ttl seconds is abandoned: the timer wheel expires it, and the
+    sweep runs on every track() and from the handlers' sweeper thread.
+    Past max_entries, the least recently active post is dropped.
+    """
+
+    def __init__(self, ttl: float = 600.0, max_entries: int = 2000, tick: float = 1.0,
+                 clock: Callable[[], float] = system_clock):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._posts: "OrderedDict[PostKey, PendingPost]" = OrderedDict()  # Least recently active first
+        self._games: Dict[Tuple[Optional[int], int], PostKey] = {}
+        self._wheel = TimerWheel(tick, max(64, int(ttl / tick) + 2), clock())
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=FINALIZATION_SAMPLES)
+        self.tracked = 0
+        self.resolved = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def track(self, chat_id: Optional[int], message_id: Optional[int], game_number: Optional[int],
+              text: str) -> PendingPost:
+        """Record (or refresh) an in-progress post"""
+        now = self.clock()
+        key = (chat_id, message_id)
+        with self._lock:
+            self._sweep(now)
+            post = self._posts.get(key)
+            if post is None:
+                post = self._posts[key] = PendingPost(chat_id, message_id, game_number, text, now)
+                self.tracked += 1
+            else:
+                post.text = text
+                post.last_seen = now
+                post.updates += 1
+                self._posts.move_to_end(key)
+                if game_number and post.game_number != game_number:
+                    self._unlink_game(post)
+                    post.game_number = game_number
+            if game_number:
+                self._games[(chat_id, game_number)] = key
+            self._wheel.schedule(key, now + self.ttl)
+            while len(self._posts) > self.max_entries:
+                _, oldest = self._posts.popitem(last=False)
+                self._forget(oldest)
+                self.evicted += 1
+            return post
+
+    def resolve(self, chat_id: Optional[int], message_id: Optional[int] = None,
+                game_number: Optional[int] = None) -> Optional[PendingPost]:
+        """The finalized version arrived: stop tracking the post and record how long it took"""
+        now = self.clock()
+        with self._lock:
+            key = (chat_id, message_id)
+            if key not in self._posts and game_number:
+                key = self._games.get((chat_id, game_number))
+            post = self._posts.pop(key, None) if key else None
+            if post is None:
+                return None
+            self._forget(post)
+            self.resolved += 1
+            elapsed = now - post.first_seen
+            self._samples.append(elapsed)
+        PENDING_FINALIZATION_SECONDS.observe(elapsed)
+        return post
+
+    def get(self, chat_id: Optional[int], message_id: Optional[int]) -> Optional[PendingPost]:
+        return self._posts.get((chat_id, message_id))
+
+    def has_game(self, chat_id: Optional[int], game_number: int) -> bool:
+        return (chat_id, game_number) in self._games
+
+    def sweep(self) -> int:
+        """Expire abandoned posts; returns how many were dropped"""
+        with self._lock:
+            return self._sweep(self.clock())
+
+    def _sweep(self, now: float) -> int:
+        expired = self._wheel.advance(now)
+        for key in expired:
+            post = self._posts.pop(key, None)
+            if post is not None:
+                self._unlink_game(post)
+        if expired:
+            self.expired += len(expired)
+            PENDING_EXPIRED.inc(amount=len(expired))
+        return len(expired)
+
+    def _forget(self, post: PendingPost) -> None:
+        self._wheel.cancel((post.chat_id, post.message_id))
+        self._unlink_game(post)
+
+    def _unlink_game(self, post: PendingPost) -> None:
+        game_key = (post.chat_id, post.game_number)
+        if self._games.get(game_key) == (post.chat_id, post.message_id):
+            del self._games[game_key]
+
+    def __len__(self) -> int:
+        return len(self._posts)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._posts.clear()
+            self._games.clear()
+            self._wheel.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and time-to-finalization percentiles (seconds) of the recent posts"""
+        with self._lock:
+            samples = sorted(self._samples)
+            stats: Dict[str, Any] = {
+                'size': len(self._posts),
+                'max_size': self.max_entries,
+                'ttl': self.ttl,
+                'tracked': self.tracked,
+                'resolved': self.resolved,
+                'expired': self.expired,
+                'evictions': self.evicted,
+            }
+        if samples:
+            stats['finalization_p50_s'] = round(samples[len(samples) // 2], 1)
+            stats['finalization_p90_s'] = round(samples[min(len(samples) - 1, int(len(samples) * 0.9))], 1)
+            stats['finalization_max_s'] = round(samples[-1], 1)
+        return stats
@@ -0,0 +1,228 @@
+"""
+Durable predictor state on an embedded SQLite database (WAL mode)
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATE_DB_PATH = os.getenv('STATE_DB_PATH', 'bot_state.db')
+STATE_PERSISTENCE = os.getenv('STATE_PERSISTENCE', 'true').lower() == 'true'
+
+# Settled predictions older than this are neither loaded nor kept on disk
+PERSISTED_RETENTION = float(os.getenv('PERSISTED_RETENTION', str(24 * 3600)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS predictions (
+    game INTEGER PRIMARY KEY,
+    status TEXT NOT NULL,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_status ON predictions(status, updated_at);
+CREATE INDEX IF NOT EXISTS idx_predictions_pending ON predictions(status, game);
+CREATE TABLE IF NOT EXISTS sent_predictions (
+    game INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS processed_games (
+    game INTEGER PRIMARY KEY,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS redirects (
+    source_chat_id INTEGER PRIMARY KEY,
+    target_chat_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS prediction_stats (
+    scope TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    cell INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (scope, position, cell)
+);
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    user_id INTEGER NOT NULL,
+    class TEXT NOT NULL,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (user_id, class)
+);
+CREATE TABLE IF NOT EXISTS document_cache (
+    path TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (path, sha256)
+);
+"""
+
+
+def state_db_path(source_chat_id: Optional[int] = None) -> str:
+    """Database file of one source channel's predictor (None = the default channel)"""
+    if source_chat_id is None:
+        return STATE_DB_PATH
+    root, ext = os.path.splitext(STATE_DB_PATH)
+    return f"{root}.{abs(source_chat_id)}{ext or '.db'}"
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open a connection with the pragmas every state connection uses"""
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class StateDatabase:
+    """Write-behind persistence for CardPredictor.
+
+    Writes are queued and applied by one background thread, which batches
+    everything waiting into a single transaction, so the webhook thread
+    never waits for the disk. load() reads back only what is still useful
+    (pending predictions and recently settled ones).
+    """
+
+    def __init__(self, path: str = STATE_DB_PATH, batch_size: int = 200,
+                 retention: float = PERSISTED_RETENTION):
+        self.path = path
+        self.batch_size = batch_size
+        self.retention = retention
+        self._conn = connect(path)
+        self._writes: "queue.Queue[Optional[Tuple[str, tuple]]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name='state-writer', daemon=True)
+        self._writer.start()
+
+    # ------------------------------------------------------------------ load
+
+    def load(self) -> Dict[str, Any]:
+        """Read persisted state for a warm start"""
+        started = time.perf_counter()
+        cutoff = time.time() - self.retention
+        conn = self._conn
+
+        settings = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM settings")}
+        predictions = {
+            game: json.loads(data)
+            for game, data in conn.execute(
+                "SELECT game, data FROM predictions WHERE status = 'pending' OR updated_at >= ? ORDER BY game",
+                (cutoff,)
+            )
+        }
+        sent_predictions = {
+            game: {'chat_id': chat_id, 'message_id': message_id}
+            for game, chat_id, message_id in conn.execute(
+                "SELECT game, chat_id, message_id FROM sent_predictions WHERE updated_at >= ?", (cutoff,)
+            )
+        }
+        redirects = dict(conn.execute("SELECT source_chat_id, target_chat_id FROM redirects"))
+
+        logger.info(f"💾 PERSISTANCE - État restauré en {(time.perf_counter() - started) * 1000:.1f}ms: "
+                    f"{len(predictions)} prédictions, {len(sent_predictions)} messages, {len(redirects)} redirections")
+
+        # Old rows are pruned in the background
+        self._enqueue("DELETE FROM predictions WHERE status != 'pending' AND updated_at < ?", (cutoff,))
+        self._enqueue("DELETE FROM sent_predictions WHERE updated_at < ?", (cutoff,))
+
+        return {
+            'settings': settings,
+            'predictions': predictions,
+            'sent_predictions': sent_predictions,
+            'redirects': redirects,
+        }
+
+    # ---------------------------------------------------------------- writes
+
+    def _enqueue(self, sql: str, params: tuple = ()) -> None:
+        self._writes.put((sql, params))
+
+    def save_setting(self, key: str, value: Any) -> None:
+        self._enqueue("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def save_prediction(self, game: int, prediction: Dict[str, Any]) -> None:
+        self._enqueue(
+            "INSERT OR REPLACE INTO predictions (game, status, data, updated_at) VALUES (?, ?, ?, ?)",
+            (game, prediction.get('status', 'pending'), json.dumps(prediction, ensure_ascii=False), time.time())
+        )
+
+    def save_sent_prediction(self, game: int, chat_id: int, message_id: int) -> None:
+        self._enqueue(
+            "INSERT OR REPLACE INTO sent_predictions (game, chat_id, message_id, updated_at) VALUES (?, ?, ?, ?)",
+            (game, chat_id, message_id, time.time())
+        )
+
+    def save_redirect(self, source_chat_id: int, target_chat_id: int) -> None:
+        self._enqueue("INSERT OR REPLACE INTO redirects (source_chat_id, target_chat_id) VALUES (?, ?)",
+                      (source_chat_id, target_chat_id))
+
+    def clear_redirects(self) -> None:
+        self._enqueue("DELETE FROM redirects")
+
+    def clear_predictions(self) -> None:
+        self._enqueue("DELETE FROM predictions")
+        self._enqueue("DELETE FROM sent_predictions")
+
+    def _write_loop(self) -> None:
+        conn = connect(self.path)
+        while True:
+            item = self._writes.get()
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            statements = [entry for entry in batch if entry is not None]
+            try:
+                with conn:
+                    for sql, params in statements:
+                        conn.execute(sql, params)
+            except sqlite3.Error as e:
+                logger.error(f"❌ PERSISTANCE - Échec écriture de {len(statements)} opérations: {e}")
+            finally:
+                for _ in batch:
+                    self._writes.task_done()
+            if stop:
+                conn.close()
+                return
+
+    def flush(self) -> None:
+        """Block until every queued write is on disk"""
+        self._writes.join()
+
+    def close(self) -> None:
+        """Flush pending writes and stop the writer thread"""
+        if not self._writer.is_alive():
+            return
+        self._writes.put(None)
+        self._writer.join(timeout=5)
+        self._conn.close()
+
+
+def open_state_database(path: str = STATE_DB_PATH) -> Optional[StateDatabase]:
+    """Open the state database, or return None when persistence is disabled or unavailable"""
+    if not STATE_PERSISTENCE:
+        return None
+    try:
+        db = StateDatabase(path)
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ PERSISTANCE - Base {path} indisponible, état en mémoire uniquement: {e}")
+        return None
+    atexit.register(db.close)  # Don't lose queued writes on shutdown
+    return db
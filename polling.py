@@ -0,0 +1,156 @@
+"""
+Long-polling ingestion: pulls updates with getUpdates instead of a webhook
+"""
+
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import requests
+
+from telegram_client import TelegramClient
+
+logger = logging.getLogger(__name__)
+
+# Seconds Telegram holds a getUpdates request open when there is nothing to return
+POLL_TIMEOUT = int(os.getenv('POLL_TIMEOUT', '50'))
+# Updates fetched per request (Telegram caps this at 100)
+POLL_LIMIT = min(100, int(os.getenv('POLL_LIMIT', '100')))
+
+ALLOWED_UPDATES = ('message', 'edited_message')
+
+
+class UpdatePoller:
+    """Fetches batches of updates with getUpdates and processes them in order.
+
+    Telegram only forgets an update once a later getUpdates is sent with an
+    offset above its update_id, so the offset is advanced after each update
+    has been handled: if the process dies mid-batch, the unprocessed rest is
+    delivered again on restart (the update de-duplicator drops any repeat).
+    """
+
+    def __init__(self, client: TelegramClient, handle_update: Callable[[Dict[str, Any]], None],
+                 timeout: int = POLL_TIMEOUT, limit: int = POLL_LIMIT,
+                 allowed_updates: Sequence[str] = ALLOWED_UPDATES,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0):
+        self.client = client
+        self.handle_update = handle_update
+        self.timeout = timeout
+        self.limit = limit
+        self.allowed_updates = list(allowed_updates)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.offset: Optional[int] = None
+        self.batches = 0
+        self.processed = 0
+        self.errors = 0
+        self._stop = threading.Event()
+
+    def delete_webhook(self) -> bool:
+        """getUpdates is refused while a webhook is set; keep pending updates"""
+        result = self.client.call('deleteWebhook', json={'drop_pending_updates': False}, timeout=10)
+        if result.get('ok'):
+            logger.info("🔌 POLLING - Webhook supprimé, passage en getUpdates")
+            return True
+        logger.error(f"❌ POLLING - Échec suppression webhook: {result}")
+        return False
+
+    def fetch(self, timeout: Optional[int] = None) -> List[Dict[str, Any]]:
+        """One getUpdates call; confirms every update below the current offset"""
+        timeout = self.timeout if timeout is None else timeout
+        payload: Dict[str, Any] = {
+            'timeout': timeout,
+            'limit': self.limit,
+            'allowed_updates': self.allowed_updates,
+        }
+        if self.offset is not None:
+            payload['offset'] = self.offset
+
+        # The HTTP timeout must outlast the long-poll window
+        result = self.client.call('getUpdates', json=payload, timeout=timeout + 10)
+        if not result.get('ok'):
+            raise RuntimeError(f"getUpdates: {result.get('description', result)}")
+        return result.get('result', [])
+
+    def process(self, updates: List[Dict[str, Any]]) -> int:
+        """Handle a batch in update_id order; returns how many were handled"""
+        handled = 0
+        for update in sorted(updates, key=lambda item: item.get('update_id', 0)):
+            update_id = update.get('update_id')
+            try:
+                self.handle_update(update)
+            except Exception as e:
+                # A broken update must not block the queue forever
+                self.errors += 1
+                logger.error(f"❌ POLLING - Erreur update {update_id}: {e}")
+            if update_id is not None:
+                self.offset = update_id + 1
+            handled += 1
+        self.processed += handled
+        return handled
+
+    def poll_once(self, timeout: Optional[int] = None) -> int:
+        """Fetch and process one batch"""
+        updates = self.fetch(timeout)
+        if not updates:
+            return 0
+        self.batches += 1
+        handled = self.process(updates)
+        logger.debug(f"📥 POLLING - Lot de {handled} updates, offset {self.offset}")
+        return handled
+
+    def run(self) -> None:
+        """Poll until stop() is called"""
+        logger.info(f"🔁 POLLING - Démarrage (timeout {self.timeout}s, limit {self.limit})")
+        failures = 0
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.poll_once()
+                    failures = 0
+                    continue
+                except (requests.exceptions.RequestException, RuntimeError) as e:
+                    delay = min(self.backoff_max, self.backoff_base * (2 ** failures))
+                    logger.warning(f"⚠️ POLLING - {e}, nouvel essai dans {delay:.1f}s")
+                except Exception:
+                    # Unexpected answer shape or a bug: keep ingesting, with the same backoff
+                    delay = min(self.backoff_max, self.backoff_base * (2 ** failures))
+                    logger.exception(f"❌ POLLING - Erreur inattendue, nouvel essai dans {delay:.1f}s")
+                failures += 1
+                self._stop.wait(delay)
+        finally:
+            self._commit()
+        logger.info(f"🛑 POLLING - Arrêt après {self.processed} updates en {self.batches} lots")
+
+    def _commit(self) -> None:
+        """Confirm the last processed offset so a restart doesn't see it again"""
+        if self.offset is None:
+            return
+        try:
+            self.client.call('getUpdates', json={'offset': self.offset, 'limit': 1, 'timeout': 0}, timeout=10)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"⚠️ POLLING - Offset {self.offset} non confirmé: {e}")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'offset': self.offset,
+            'batches': self.batches,
+            'processed': self.processed,
+            'errors': self.errors,
+        }
+
+
+def run_polling(bot) -> None:
+    """Run a TelegramBot in polling mode until interrupted"""
+    poller = UpdatePoller(bot.client, bot.handle_update)
+    if not poller.delete_webhook():
+        raise RuntimeError("Cannot switch to polling while the webhook is set")
+    try:
+        poller.run()
+    except KeyboardInterrupt:
+        poller.stop()
+        poller._commit()
@@ -0,0 +1,172 @@
+"""
+Registry of per-source-channel CardPredictor shards
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from card_predictor import TARGET_CHANNEL_ID, CardPredictor, card_predictor, create_predictor
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_chat_ids(spec: str) -> Tuple[int, ...]:
+    return tuple(int(item) for item in spec.replace(';', ',').split(',') if item.strip() not in ('', '*'))
+
+
+# Source channels followed by this deployment; '*' accepts any channel or group
+SOURCE_CHANNEL_IDS_SPEC = os.getenv('SOURCE_CHANNEL_IDS', str(TARGET_CHANNEL_ID))
+SOURCE_CHANNEL_IDS = _parse_chat_ids(SOURCE_CHANNEL_IDS_SPEC)
+ACCEPT_ANY_SOURCE = '*' in SOURCE_CHANNEL_IDS_SPEC
+# Loaded shards kept in memory; idle ones are unloaded after PREDICTOR_IDLE_TTL seconds
+MAX_PREDICTORS = int(os.getenv('MAX_PREDICTORS', '64'))
+PREDICTOR_IDLE_TTL = float(os.getenv('PREDICTOR_IDLE_TTL', str(6 * 3600)))
+
+
+class PredictorShard:
+    """One source channel's predictor and its throughput counters"""
+
+    __slots__ = ('chat_id', 'predictor', 'created_at', 'last_used',
+                 'messages', 'predictions', 'verifications')
+
+    def __init__(self, chat_id: int, predictor: CardPredictor, now: float):
+        self.chat_id = chat_id
+        self.predictor = predictor
+        self.created_at = now
+        self.last_used = now
+        self.messages = 0
+        self.predictions = 0
+        self.verifications = 0
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        uptime = max(now - self.created_at, 60.0)
+        return {
+            'messages': self.messages,
+            'predictions': self.predictions,
+            'verifications': self.verifications,
+            'messages_per_min': round(self.messages / uptime * 60, 2),
+            'idle_seconds': round(now - self.last_used, 1),
+            'pending': len(self.predictor.pending_games),
+            'reorder': self.predictor.reorder.get_stats(),
+            'win_rates': self.predictor.stats.get_stats(),
+        }
+
+
+class PredictorRegistry:
+    """Routes each source chat to its own CardPredictor.
+
+    Shards are created on first use by factory(chat_id), so every source
+    channel has its own cooldown, de-duplication, pending predictions and
+    redirect target. Lookups are a dict access; shards idle for longer than
+    idle_ttl, or the least recently used beyond max_shards, are unloaded
+    (their persisted state is reloaded if the channel posts again). Pinned
+    shards are never unloaded.
+    """
+
+    def __init__(self, factory: Callable[[int], CardPredictor], source_chat_ids: Iterable[int] = (),
+                 accept_any: bool = False, max_shards: int = MAX_PREDICTORS,
+                 idle_ttl: float = PREDICTOR_IDLE_TTL, pinned: Optional[Dict[int, CardPredictor]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.factory = factory
+        self.source_chat_ids = frozenset(source_chat_ids)
+        self.accept_any = accept_any
+        self.max_shards = max_shards
+        self.idle_ttl = idle_ttl
+        self.clock = clock
+        self._shards: "OrderedDict[int, PredictorShard]" = OrderedDict()
+        self._pinned = set()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.unloaded = 0
+        now = clock()
+        for chat_id, predictor in (pinned or {}).items():
+            self._shards[chat_id] = PredictorShard(chat_id, predictor, now)
+            self._pinned.add(chat_id)
+
+    def is_source(self, chat_id: int) -> bool:
+        return self.accept_any or chat_id in self.source_chat_ids or chat_id in self._pinned
+
+    def shard(self, chat_id: int) -> Optional[PredictorShard]:
+        """Shard of a source chat, created if needed; None for chats that aren't followed"""
+        if not self.is_source(chat_id):
+            return None
+        now = self.clock()
+        with self._lock:
+            shard = self._shards.get(chat_id)
+            if shard is None:
+                shard = PredictorShard(chat_id, self.factory(chat_id), now)
+                self._shards[chat_id] = shard
+                self.created += 1
+                logger.info(f"🧩 REGISTRE - Prédicteur créé pour le canal {chat_id}")
+            else:
+                self._shards.move_to_end(chat_id)
+            shard.last_used = now
+            self._evict(now)
+        return shard
+
+    def get(self, chat_id: int) -> Optional[CardPredictor]:
+        """Predictor of a source chat, created if needed (None if the chat isn't followed)"""
+        shard = self.shard(chat_id)
+        return shard.predictor if shard else None
+
+    def route(self, chat_id: int) -> Optional[CardPredictor]:
+        """Predictor for an incoming source message; counts it in the shard's throughput"""
+        shard = self.shard(chat_id)
+        if shard is None:
+            return None
+        shard.messages += 1
+        return shard.predictor
+
+    def peek(self, chat_id: int) -> Optional[CardPredictor]:
+        """Loaded predictor of a chat, without creating it or touching counters"""
+        shard = self._shards.get(chat_id)
+        return shard.predictor if shard else None
+
+    def record(self, chat_id: int, predictions: int = 0, verifications: int = 0) -> None:
+        shard = self._shards.get(chat_id)
+        if shard:
+            shard.predictions += predictions
+            shard.verifications += verifications
+
+    def _evict(self, now: float) -> None:
+        # Oldest-used first; pinned shards are skipped
+        for chat_id in list(self._shards):
+            loaded = len(self._shards) - len(self._pinned)
+            shard = self._shards[chat_id]
+            if chat_id in self._pinned:
+                continue
+            if loaded <= self.max_shards and now - shard.last_used < self.idle_ttl:
+                break
+            del self._shards[chat_id]
+            self.unloaded += 1
+            shard.predictor.close()
+            logger.info(f"🧩 REGISTRE - Prédicteur du canal {chat_id} déchargé (inactif)")
+
+    def evict_idle(self) -> None:
+        with self._lock:
+            self._evict(self.clock())
+
+    def __iter__(self) -> Iterator[Tuple[int, CardPredictor]]:
+        return iter([(chat_id, shard.predictor) for chat_id, shard in list(self._shards.items())])
+
+    def __len__(self) -> int:
+        return len(self._shards)
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = self.clock()
+        return {
+            'loaded': len(self._shards),
+            'max_shards': self.max_shards,
+            'created': self.created,
+            'unloaded': self.unloaded,
+            'shards': {str(chat_id): shard.stats(now) for chat_id, shard in list(self._shards.items())},
+        }
+
+
+# Global registry; the default source channel keeps the module-level predictor
+predictor_registry = PredictorRegistry(create_predictor, SOURCE_CHANNEL_IDS, accept_any=ACCEPT_ANY_SOURCE,
+                                       pinned={TARGET_CHANNEL_ID: card_predictor})
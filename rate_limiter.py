@@ -0,0 +1,210 @@
+"""
+Per-user token-bucket rate limiting with command classes and an optional shared SQLite backend
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from clock import system_clock
+from persistence import STATE_DB_PATH, connect
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """'heavy=3/300,cheap=60/60' → {'heavy': (3, 300), 'cheap': (60, 60)} (requests / seconds)"""
+    limits = {}
+    for item in spec.split(','):
+        name, _, limit = item.strip().partition('=')
+        count, _, window = limit.partition('/')
+        if name and count and window:
+            limits[name.strip()] = (float(count), float(window))
+    return limits
+
+
+# Requests allowed per window for each command class (burst = count, steady rate = count / window)
+DEFAULT_RATE_LIMITS = {
+    'default': (30, 60),   # Historical limit: 30 messages per minute
+    'cheap': (60, 60),     # /start, /help, /about...
+    'heavy': (3, 300),     # Document uploads (/deploy, /ni, /pred, /fin)
+}
+RATE_LIMITS = {**DEFAULT_RATE_LIMITS, **_parse_limits(os.getenv('RATE_LIMITS', ''))}
+
+# Command → class; anything else (other commands, plain messages) is 'default'
+COMMAND_CLASSES = {
+    '/start': 'cheap',
+    '/help': 'cheap',
+    '/about': 'cheap',
+    '/dev': 'cheap',
+    '/stats': 'cheap',
+    '/deploy': 'heavy',
+    '/ni': 'heavy',
+    '/pred': 'heavy',
+    '/fin': 'heavy',
+}
+
+# Buckets kept in memory; beyond this the least recently used are dropped
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv('RATE_LIMIT_MAX_BUCKETS', '10000'))
+# 'memory' (per worker) or 'sqlite' (shared by every worker); follows STATE_BACKEND by default
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', os.getenv('STATE_BACKEND', 'memory')).lower()
+
+
+def command_class(text: Optional[str]) -> str:
+    """Rate-limit class of a message ('/deploy@MyBot arg' → 'heavy')"""
+    if not text or not text.startswith('/'):
+        return 'default'
+    command = text.split(maxsplit=1)[0].split('@', 1)[0]
+    return COMMAND_CLASSES.get(command, 'default')
+
+
+class TokenBucketLimiter:
+    """In-process token buckets, one per (user, class).
+
+    A check is O(1): the bucket is refilled for the time elapsed since its
+    last use, then one token is taken. A bucket left alone long enough to
+    refill completely holds no information, so idle buckets are dropped
+    (oldest first, a few per check) and memory stays bounded by max_buckets.
+    """
+
+    # Idle buckets looked at per check
+    SWEEP_BATCH = 8
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]] = RATE_LIMITS,
+                 max_buckets: int = RATE_LIMIT_MAX_BUCKETS, clock: Callable[[], float] = system_clock):
+        self.limits = {name: (count, count / window) for name, (count, window) in limits.items()}
+        self.max_buckets = max_buckets
+        self.clock = clock
+        # (user_id, class) → [tokens, last update]; least recently used first
+        self._buckets: "OrderedDict[Tuple[int, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+        self.evicted = 0
+
+    def _limit(self, klass: str) -> Tuple[float, float]:
+        return self.limits.get(klass) or self.limits['default']
+
+    def allow(self, user_id: int, klass: str = 'default') -> bool:
+        """Take one token from the user's bucket; False when it is empty"""
+        capacity, rate = self._limit(klass)
+        key = (user_id, klass)
+        now = self.clock()
+        with self._lock:
+            self._sweep(now, inserting=key not in self._buckets)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [capacity, now]
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+
+            if bucket[0] < 1:
+                self.limited += 1
+                return False
+            bucket[0] -= 1
+            self.allowed += 1
+            return True
+
+    def _sweep(self, now: float, inserting: bool = False) -> None:
+        """Drop idle buckets, and make room first when a new bucket is about to be added"""
+        limit = self.max_buckets - 1 if inserting else self.max_buckets
+        for _ in range(self.SWEEP_BATCH):
+            if not self._buckets:
+                return
+            key, (tokens, last) = next(iter(self._buckets.items()))
+            capacity, rate = self._limit(key[1])
+            if len(self._buckets) <= limit and tokens + (now - last) * rate < capacity:
+                return
+            del self._buckets[key]
+            self.evicted += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'backend': 'memory',
+            'buckets': len(self._buckets),
+            'max_buckets': self.max_buckets,
+            'allowed': self.allowed,
+            'limited': self.limited,
+            'evicted': self.evicted,
+        }
+
+
+class SQLiteRateLimiter:
+    """Token buckets in the shared state database, so every worker sees the same limits.
+
+    The refill-and-take is a single UPSERT, atomic across processes; the
+    row is only updated when a token is available. Full buckets are
+    deleted from time to time.
+    """
+
+    # Checks between two deletions of idle buckets
+    PRUNE_EVERY = 500
+
+    def __init__(self, path: str = STATE_DB_PATH, limits: Dict[str, Tuple[float, float]] = RATE_LIMITS,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.limits = {name: (count, count / window) for name, (count, window) in limits.items()}
+        self.clock = clock  # Wall time: shared with other processes
+        self._local = threading.local()
+        self._checks = 0
+        self.allowed = 0
+        self.limited = 0
+
+    def conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = connect(self.path)
+            conn.isolation_level = None
+            self._local.conn = conn
+        return conn
+
+    def allow(self, user_id: int, klass: str = 'default') -> bool:
+        capacity, rate = self.limits.get(klass) or self.limits['default']
+        now = self.clock()
+        try:
+            cursor = self.conn().execute(
+                "INSERT INTO rate_buckets (user_id, class, tokens, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (user_id, class) DO UPDATE SET "
+                "tokens = MIN(?, tokens + (excluded.updated_at - updated_at) * ?) - 1, "
+                "updated_at = excluded.updated_at "
+                "WHERE MIN(?, tokens + (excluded.updated_at - updated_at) * ?) >= 1",
+                (user_id, klass, capacity - 1, now, capacity, rate, capacity, rate)
+            )
+            allowed = cursor.rowcount == 1
+        except Exception as e:
+            logger.error(f"❌ Erreur limiteur partagé: {e}")
+            return True  # Fail open: a broken limiter must not lock users out
+
+        self._checks += 1
+        if self._checks % self.PRUNE_EVERY == 0:
+            self._prune(now)
+        if allowed:
+            self.allowed += 1
+        else:
+            self.limited += 1
+        return allowed
+
+    def _prune(self, now: float) -> None:
+        # A bucket idle for a whole window is full again; the longest window bounds them all
+        longest = max(capacity / rate for capacity, rate in self.limits.values())
+        self.conn().execute("DELETE FROM rate_buckets WHERE updated_at < ?", (now - longest,))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'backend': 'sqlite',
+            'buckets': self.conn().execute("SELECT COUNT(*) FROM rate_buckets").fetchone()[0],
+            'allowed': self.allowed,
+            'limited': self.limited,
+        }
+
+
+def create_rate_limiter(backend: str = RATE_LIMIT_BACKEND):
+    """Build the limiter selected by RATE_LIMIT_BACKEND"""
+    if backend == 'sqlite':
+        return SQLiteRateLimiter()
+    return TokenBucketLimiter()
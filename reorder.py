@@ -0,0 +1,106 @@
+"""
+Reorder buffer releasing finalized game results in game-number order
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from clock import system_clock
+
+# Seconds a result waits for the games before it; 0 releases everything at once
+REORDER_GAP_TIMEOUT = float(os.getenv('REORDER_GAP_TIMEOUT', '5'))
+# A jump of more games than this (counter reset, long outage) starts a new sequence
+REORDER_MAX_GAP = int(os.getenv('REORDER_MAX_GAP', '50'))
+
+
+class GameReorderBuffer:
+    """Holds results that arrive ahead of their turn and releases them in sequence.
+
+    push() releases a result at once when it is the next game expected, or
+    a game already released (a late re-edit). A result further ahead is held
+    until the missing games arrive. When the oldest held result has waited
+    gap_timeout seconds, the gap is skipped. For a game number already held,
+    the latest result replaces the earlier one. In the usual case, games
+    arriving in order, nothing is ever held.
+    """
+
+    def __init__(self, gap_timeout: float = REORDER_GAP_TIMEOUT, max_gap: int = REORDER_MAX_GAP,
+                 clock: Callable[[], float] = system_clock):
+        self.gap_timeout = gap_timeout
+        self.max_gap = max_gap
+        self.clock = clock
+        self.next_game: Optional[int] = None
+        self._held: Dict[int, Tuple[float, Any]] = {}  # game → (arrived at, item)
+        self._lock = threading.Lock()
+        self.held_total = 0
+        self.gaps_skipped = 0
+        self.late = 0
+
+    def push(self, game: int, item: Any) -> List[Any]:
+        """Add a game's result; returns the results now released, in game order"""
+        now = self.clock()
+        with self._lock:
+            if self.gap_timeout <= 0:
+                return [item]
+            released = self._expire(now)
+            expected = self.next_game
+            if expected is None or abs(game - expected) > self.max_gap:
+                # First result, or a new sequence: nothing before it is worth waiting for
+                released += self._drain_all()
+                self.next_game = game
+            elif game < expected:
+                self.late += 1
+                released.append(item)
+                return released
+            elif game > expected:
+                if game not in self._held:
+                    self.held_total += 1
+                self._held[game] = (self._held.get(game, (now,))[0], item)
+                return released
+
+            released.append(item)
+            self.next_game = game + 1
+            released += self._release_run()
+            return released
+
+    def expire(self) -> List[Any]:
+        """Results whose wait exceeded gap_timeout, with any that follow them in sequence"""
+        with self._lock:
+            return self._expire(self.clock())
+
+    def _expire(self, now: float) -> List[Any]:
+        released: List[Any] = []
+        while self._held:
+            oldest = min(arrived for arrived, _ in self._held.values())
+            if now - oldest < self.gap_timeout:
+                break
+            self.gaps_skipped += 1
+            self.next_game = min(self._held)
+            released += self._release_run()
+        return released
+
+    def _release_run(self) -> List[Any]:
+        released = []
+        while self.next_game in self._held:
+            released.append(self._held.pop(self.next_game)[1])
+            self.next_game += 1
+        return released
+
+    def _drain_all(self) -> List[Any]:
+        released = [self._held[game][1] for game in sorted(self._held)]
+        self._held.clear()
+        return released
+
+    def __len__(self) -> int:
+        return len(self._held)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'held': len(self._held),
+                'next_game': self.next_game,
+                'held_total': self.held_total,
+                'gaps_skipped': self.gaps_skipped,
+                'late': self.late,
+            }
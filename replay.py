@@ -0,0 +1,228 @@
+"""
+Offline replay of recorded channel updates through CardPredictor (backtesting)
+
+Usage:
+    python replay.py history.jsonl
+    python replay.py history.jsonl.gz --chat -1002682552255 --cooldown 30 --output report.json
+    python replay.py history.jsonl --batch 10000
+    cat history.jsonl | python replay.py -
+
+Each line is a Telegram update ({"update_id", "message" | "edited_message": {...}})
+or a bare message ({"date", "text", ...}). The cooldown runs on the recorded
+message time (edit_date, else date), so a replay takes no wall-clock time.
+With --batch, messages are evaluated in chunks by CardPredictor.evaluate_batch
+(same results, several times faster).
+"""
+
+import argparse
+import gzip
+import io
+import json
+import logging
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from card_predictor import CardPredictor
+from clock import ManualClock
+
+# Outcome of a settled prediction, keyed by its status
+OUTCOMES = {'✅0️⃣': 'hit_offset_0', '✅1️⃣': 'hit_offset_1', '⭕': 'miss'}
+
+
+def read_updates(path: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """Yield (line_number, update) one line at a time; update is None for unreadable lines"""
+    if path == '-':
+        stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    elif path.endswith('.gz'):
+        stream = gzip.open(path, 'rt', encoding='utf-8')
+    else:
+        stream = open(path, 'r', encoding='utf-8')
+    with stream:
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                yield line_number, None
+
+
+class ReplayEngine:
+    """Feeds recorded updates to a predictor the way the live handlers do.
+
+    Edited messages that are finalized (✅/🔰) can predict and verify;
+    new messages only verify, unless predict_on_messages is set (for
+    recordings that only kept final messages). Memory stays flat: the
+    predictor's stores are bounded and only counters are accumulated.
+    """
+
+    def __init__(self, chat_id: Optional[int] = None, cooldown: Optional[int] = None,
+                 predict_on_messages: bool = False, batch_size: int = 0):
+        self.chat_id = chat_id
+        self.predict_on_messages = predict_on_messages
+        self.batch_size = batch_size
+        self._batch: List[Tuple[str, bool, float]] = []
+        self.clock = ManualClock()
+        self.predictor = CardPredictor(clock=self.clock)
+        if cooldown is not None:
+            self.predictor.prediction_cooldown = cooldown
+
+        self.lines = 0
+        self.invalid = 0
+        self.skipped = 0
+        self.messages = 0
+        self.predictions = 0
+        self.outcomes = {name: 0 for name in OUTCOMES.values()}
+        self.miss_offsets: Dict[int, int] = {}
+        self.first_time: Optional[float] = None
+        self.last_time: Optional[float] = None
+
+    def _unwrap(self, update: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], bool]:
+        if 'edited_message' in update:
+            return update['edited_message'], True
+        if 'message' in update:
+            return update['message'], False
+        if 'channel_post' in update:
+            return update['channel_post'], False
+        if 'edited_channel_post' in update:
+            return update['edited_channel_post'], True
+        if 'text' in update:
+            return update, bool(update.get('edit_date'))
+        return None, False
+
+    def feed(self, update: Optional[Dict[str, Any]]) -> None:
+        """Replay one update"""
+        self.lines += 1
+        if update is None:
+            self.invalid += 1
+            return
+
+        message, is_edited = self._unwrap(update)
+        text = message.get('text') if message else None
+        if not text:
+            self.skipped += 1
+            return
+        if self.chat_id is not None:
+            source = (message.get('sender_chat') or message.get('chat') or {}).get('id')
+            if source is not None and source != self.chat_id:
+                self.skipped += 1
+                return
+
+        timestamp = message.get('edit_date') or message.get('date')
+        now = self.last_time if self.last_time is not None else self.clock()
+        if timestamp:
+            # The virtual clock never moves backwards (out-of-order edits)
+            now = max(now, float(timestamp)) if self.batch_size else self.clock.set(float(timestamp))
+            if self.first_time is None:
+                self.first_time = now
+            self.last_time = now
+        self.messages += 1
+
+        if self.batch_size:
+            self._batch.append((text, is_edited or self.predict_on_messages, now))
+            if len(self._batch) >= self.batch_size:
+                self.flush()
+            return
+
+        predictor = self.predictor
+        parsed = predictor.parse(text)
+        if not predictor.has_completion_indicators(parsed):
+            return
+
+        if is_edited or self.predict_on_messages:
+            should_predict, game_number, costume = predictor.should_predict(parsed)
+            if should_predict and game_number is not None and costume is not None:
+                predictor.make_prediction(game_number, costume)
+                self.predictions += 1
+
+        for result in predictor.verify_all(parsed, is_edited=is_edited):
+            self._settled(result)
+
+    def _settled(self, result: Dict[str, Any]) -> None:
+        self.outcomes[OUTCOMES[result['status']]] += 1
+        if result['status'] == '⭕':
+            self.miss_offsets[result['offset']] = self.miss_offsets.get(result['offset'], 0) + 1
+
+    def flush(self) -> None:
+        """Evaluate the buffered messages in one batch"""
+        if not self._batch:
+            return
+        texts, edited, timestamps = zip(*self._batch)
+        self._batch.clear()
+        results = self.predictor.evaluate_batch(texts, edited=edited, timestamps=timestamps)
+        self.predictions += len(results['predictions'])
+        for result in results['verifications']:
+            self._settled(result)
+
+    def report(self) -> Dict[str, Any]:
+        self.flush()
+        settled = sum(self.outcomes.values())
+        hits = self.outcomes['hit_offset_0'] + self.outcomes['hit_offset_1']
+
+        def rate(count: int) -> Optional[float]:
+            return round(count / settled, 4) if settled else None
+
+        return {
+            'lines': self.lines,
+            'invalid_lines': self.invalid,
+            'skipped': self.skipped,
+            'messages': self.messages,
+            'predictions': self.predictions,
+            'settled': settled,
+            'pending': len(self.predictor.pending_games),
+            'outcomes': dict(self.outcomes),
+            'hit_rate': rate(hits),
+            'hit_rate_offset_0': rate(self.outcomes['hit_offset_0']),
+            'hit_rate_offset_1': rate(self.outcomes['hit_offset_1']),
+            'miss_rate': rate(self.outcomes['miss']),
+            'misses_by_offset': {str(offset): count for offset, count in sorted(self.miss_offsets.items())},
+            'cooldown': self.predictor.prediction_cooldown,
+            'span_seconds': (self.last_time - self.first_time) if self.first_time is not None else 0,
+        }
+
+
+def replay(updates: Iterable[Tuple[int, Optional[Dict[str, Any]]]], engine: ReplayEngine,
+           progress_every: int = 0) -> Dict[str, Any]:
+    started = time.perf_counter()
+    for line_number, update in updates:
+        engine.feed(update)
+        if progress_every and line_number % progress_every == 0:
+            elapsed = time.perf_counter() - started
+            print(f"  {line_number:,} lignes ({line_number / elapsed:,.0f}/s)", file=sys.stderr)
+    summary = engine.report()
+    summary['replay_seconds'] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('path', help="JSONL file of updates (.gz accepted, '-' for stdin)")
+    parser.add_argument('--chat', type=int, help='only replay messages from this source chat')
+    parser.add_argument('--cooldown', type=int, help='cooldown in seconds (default: the predictor default)')
+    parser.add_argument('--predict-on-messages', action='store_true',
+                        help='also predict from new finalized messages, not only edits')
+    parser.add_argument('--batch', type=int, default=0, metavar='N',
+                        help='evaluate messages in batches of N (faster, same results)')
+    parser.add_argument('--progress', type=int, default=0, metavar='N', help='report progress every N lines')
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    args = parser.parse_args(argv)
+
+    # Per-message decisions are logged at DEBUG/INFO; keep them out of a long replay
+    logging.disable(logging.INFO)
+
+    engine = ReplayEngine(chat_id=args.chat, cooldown=args.cooldown,
+                          predict_on_messages=args.predict_on_messages, batch_size=args.batch)
+    summary = replay(read_updates(args.path), engine, args.progress)
+
+    text = json.dumps(summary, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
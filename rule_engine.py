@@ -0,0 +1,247 @@
+"""
+Declarative prediction rules compiled into a short-circuiting evaluation plan
+"""
+
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from message_parser import SUIT_INDEX, SUITS, ParsedGameMessage
+
+logger = logging.getLogger(__name__)
+
+# Editable rule set; the built-in DEFAULT_RULES apply when the file is missing
+PREDICTION_RULES_PATH = os.getenv('PREDICTION_RULES_PATH', 'prediction_rules.json')
+# Seconds between two checks of the file's mtime (other workers pick up a reload this way)
+RULES_CHECK_INTERVAL = float(os.getenv('RULES_CHECK_INTERVAL', '10'))
+
+# The historical rules: mirror of a suit seen 3+ times, predicted for game +2
+DEFAULT_RULES: Dict[str, Any] = {
+    'version': 1,
+    'target_offset': 2,
+    'mirror': {
+        'threshold': 3,
+        'map': {"♥️": "♣️", "♠️": "♦️", "♦️": "♠️", "♣️": "♥️"},
+    },
+    'exclusions': [
+        {'name': 'finalisation 🔰', 'type': 'contains', 'text': '🔰'},
+        {'name': '#R', 'type': 'contains', 'text': '#R'},
+        {'name': 'match nul #X', 'type': 'contains', 'text': '#X'},
+        {'name': 'égalité dans une parenthèse', 'type': 'section_suit_count', 'min': 3},
+        {'name': 'combinée parenthèses 1+2', 'type': 'combined_suit_count',
+         'sections': [0, 1], 'min': 3, 'allowed': [1]},
+    ],
+}
+
+# contains rules answered by a flag the parser already computed
+PARSED_FLAGS = {'🔰': 'has_final', '✅': 'has_checkmark', '#R': 'has_r', '#X': 'has_x'}
+
+# Relative cost of each exclusion type; the plan runs the cheapest first
+RULE_COSTS = {'contains': 0, 'combined_suit_count': 1, 'section_suit_count': 2}
+
+
+def _suit(value: Any, where: str) -> str:
+    suit = str(value).replace("❤️", "♥️")
+    if suit not in SUIT_INDEX:
+        raise ValueError(f"{where}: couleur inconnue {value!r} (attendu: {' '.join(SUITS)})")
+    return suit
+
+
+def _int(rule: Dict[str, Any], key: str, default: Optional[int] = None, minimum: int = 0) -> int:
+    value = rule.get(key, default)
+    if not isinstance(value, int) or isinstance(value, bool) or value < minimum:
+        raise ValueError(f"{rule.get('name', rule.get('type'))}: '{key}' doit être un entier >= {minimum}")
+    return value
+
+
+def validate_rules(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalized copy of a rule set; ValueError describes the first problem found"""
+    if not isinstance(spec, dict):
+        raise ValueError("le jeu de règles doit être un objet JSON")
+    rules = {'version': spec.get('version', 1), 'target_offset': _int(spec, 'target_offset', 2, minimum=1)}
+
+    mirror = spec.get('mirror')
+    if not isinstance(mirror, dict) or not isinstance(mirror.get('map'), dict) or not mirror['map']:
+        raise ValueError("'mirror.map' doit associer des couleurs à prédire")
+    rules['mirror'] = {
+        'threshold': _int(mirror, 'threshold', 3, minimum=1),
+        # Insertion order is the order in which suits are tried
+        'map': {_suit(source, 'mirror.map'): _suit(target, 'mirror.map') for source, target in mirror['map'].items()},
+    }
+
+    exclusions = []
+    for index, rule in enumerate(spec.get('exclusions', [])):
+        if not isinstance(rule, dict) or rule.get('type') not in RULE_COSTS:
+            raise ValueError(f"exclusion {index + 1}: type inconnu (attendu: {', '.join(RULE_COSTS)})")
+        rule = dict(rule)
+        default_name = f"contient {rule.get('text')}" if rule['type'] == 'contains' else f"{rule['type'].replace('_', ' ')} {index + 1}"
+        rule.setdefault('name', default_name)
+        if rule['type'] == 'contains':
+            if not isinstance(rule.get('text'), str) or not rule['text']:
+                raise ValueError(f"{rule['name']}: 'text' doit être un texte non vide")
+        elif rule['type'] == 'section_suit_count':
+            rule['min'] = _int(rule, 'min', minimum=1)
+        else:
+            sections = rule.get('sections', [0, 1])
+            if (not isinstance(sections, list) or len(sections) != 2
+                    or not all(isinstance(s, int) and s >= 0 for s in sections)):
+                raise ValueError(f"{rule['name']}: 'sections' doit lister deux indices de parenthèses")
+            allowed = rule.get('allowed', [1])
+            if not isinstance(allowed, list) or not all(isinstance(n, int) and 0 <= n <= 4 for n in allowed):
+                raise ValueError(f"{rule['name']}: 'allowed' doit lister des nombres de couleurs (0 à 4)")
+            rule.update(sections=sections, min=_int(rule, 'min', minimum=1), allowed=sorted(set(allowed)))
+        exclusions.append(rule)
+    rules['exclusions'] = exclusions
+    return rules
+
+
+class RulePlan:
+    """A validated rule set compiled into straight-line functions.
+
+    mirror(suit_counts) applies the mirror rule alone. excluded(parsed) runs the text exclusions (before any state is touched)
+    and returns the name of the first that matches, or None. decide(parsed)
+    runs the mirror rule and the structural exclusions, cheapest first, and
+    returns (costume, None) or (None, reason). The functions are generated
+    Python with every constant inlined, so evaluating them costs about as
+    much as the hand-written checks they replace.
+    """
+
+    def __init__(self, rules: Dict[str, Any], source_path: Optional[str] = None):
+        self.rules = rules
+        self.source_path = source_path
+        self.version = rules['version']
+        self.target_offset = rules['target_offset']
+        self.mirror_threshold = rules['mirror']['threshold']
+        self.mirror_map: Dict[str, str] = rules['mirror']['map']
+        # Stable sort: declaration order is kept within one cost class
+        ordered = sorted(rules['exclusions'], key=lambda rule: RULE_COSTS[rule['type']])
+        self.text_rules = [rule for rule in ordered if rule['type'] == 'contains']
+        self.structure_rules = [rule for rule in ordered if rule['type'] != 'contains']
+        self.source = self._generate()
+        namespace: Dict[str, Any] = {}
+        exec(compile(self.source, '<prediction rules>', 'exec'), namespace)
+        self.excluded: Callable[[ParsedGameMessage], Optional[str]] = namespace['excluded']
+        self.mirror: Callable[[Tuple[int, ...]], Optional[str]] = namespace['mirror']
+        self.decide: Callable[[ParsedGameMessage], Tuple[Optional[str], Optional[str]]] = namespace['decide']
+
+    def _generate(self) -> str:
+        lines = ["def excluded(p):"]
+        for rule in self.text_rules:
+            flag = PARSED_FLAGS.get(rule['text'])
+            test = f"p.{flag}" if flag else f"{rule['text']!r} in p.text"
+            lines += [f"    if {test}:", f"        return {rule['name']!r}"]
+        lines += ["    return None", ""]
+
+        threshold = self.mirror_threshold
+        mirror = [(SUIT_INDEX[suit], target) for suit, target in self.mirror_map.items()]
+        lines.append("def mirror(c):")
+        for index, target in mirror:
+            lines += [f"    if c[{index}] >= {threshold}:", f"        return {target!r}"]
+        lines += ["    return None", ""]
+
+        lines += ["def decide(p):", "    c = p.suit_counts"]
+        for position, (index, target) in enumerate(mirror):
+            keyword = 'if' if position == 0 else 'elif'
+            lines += [f"    {keyword} c[{index}] >= {threshold}:", f"        costume = {target!r}"]
+        lines += ["    else:", "        return None, 'miroir'"]
+
+        if self.structure_rules:
+            lines.append("    s = p.section_counts")
+        for rule in self.structure_rules:
+            minimum, name = rule['min'], rule['name']
+            if rule['type'] == 'combined_suit_count':
+                first, second = rule['sections']
+                total = ' + '.join(f"(s[{first}][{i}] + s[{second}][{i}] >= {minimum})" for i in range(4))
+                lines += [f"    if len(s) > {max(first, second)} and ({total}) not in {tuple(rule['allowed'])!r}:",
+                          f"        return None, {name!r}"]
+            else:
+                test = ' or '.join(f"x[{i}] >= {minimum}" for i in range(4))
+                lines += ["    for x in s:", f"        if {test}:", f"            return None, {name!r}"]
+        lines.append("    return costume, None")
+        return '\n'.join(lines) + '\n'
+
+    def describe(self) -> str:
+        """Human-readable summary for the /rules command"""
+        mirror = ', '.join(f"{source}→{target}" for source, target in self.mirror_map.items())
+        steps = [f"• {rule['name']}" for rule in self.text_rules]
+        steps.append(f"• miroir ({self.mirror_threshold}+ d'une couleur): {mirror}")
+        steps += [f"• {rule['name']}" for rule in self.structure_rules]
+        origin = self.source_path or 'règles intégrées'
+        return (f"📐 Règles v{self.version} ({origin})\n"
+                f"🎯 Prédiction pour le jeu +{self.target_offset}\n"
+                "Ordre d'évaluation:\n" + '\n'.join(steps))
+
+
+def compile_rules(spec: Dict[str, Any], source_path: Optional[str] = None) -> RulePlan:
+    return RulePlan(validate_rules(spec), source_path)
+
+
+class RuleEngine:
+    """Holds the active plan and swaps it on reload.
+
+    A reload that fails validation leaves the running plan in place. Workers
+    that did not receive the reload command notice the file's new mtime
+    within check_interval seconds.
+    """
+
+    def __init__(self, path: Optional[str] = PREDICTION_RULES_PATH, check_interval: float = RULES_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.RLock()  # current() holds it around reload()
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self.reloads = 0
+        self.plan = compile_rules(copy.deepcopy(DEFAULT_RULES))
+        if path and os.path.exists(path):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"❌ RÈGLES - {path} invalide, règles intégrées utilisées: {e}")
+
+    def _file_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime if self.path else None
+        except OSError:
+            return None
+
+    def reload(self) -> RulePlan:
+        """Load, validate and compile the rule file, then make it active (raises on error)"""
+        with self._lock:
+            mtime = self._file_mtime()
+            if mtime is None:
+                plan = compile_rules(copy.deepcopy(DEFAULT_RULES))
+            else:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    plan = compile_rules(json.load(f), self.path)
+            self.plan = plan
+            self._mtime = mtime
+            self.reloads += 1
+        logger.info(f"📐 RÈGLES - v{plan.version} chargées ({plan.source_path or 'intégrées'})")
+        return plan
+
+    def current(self) -> RulePlan:
+        """Active plan; the rule file is re-read when it changed on disk"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return self.plan
+        with self._lock:
+            # Another caller may have checked while this one waited for the lock
+            if now < self._next_check:
+                return self.plan
+            self._next_check = now + self.check_interval
+            mtime = self._file_mtime()
+            if mtime != self._mtime:
+                try:
+                    self.reload()
+                except Exception as e:
+                    logger.error(f"❌ RÈGLES - Rechargement refusé, règles actuelles conservées: {e}")
+                    self._mtime = mtime  # Don't retry until the file changes again
+        return self.plan
+
+
+# Process-wide engine shared by every predictor
+rule_engine = RuleEngine()
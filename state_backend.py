@@ -0,0 +1,433 @@
+"""
+Prediction state backends: in-process (single worker) and shared SQLite (multi-worker)
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional
+
+from persistence import STATE_DB_PATH, PERSISTED_RETENTION, connect
+from state_store import BoundedStore, BoundedSet, PendingIndex
+from stats import CELLS, STATS_DAYS, STATS_HOURS, STATS_LAST_GAMES, stat_cell, summarize
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-process locks unavailable, SQLite still serializes writes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 'memory' keeps state in the worker process, 'sqlite' shares it between gunicorn workers
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'memory').lower()
+
+# State retention: stores never exceed STATE_MAX_ENTRIES entries, settled
+# predictions age out after SETTLED_PREDICTION_TTL seconds
+STATE_MAX_ENTRIES = int(os.getenv('STATE_MAX_ENTRIES', '2000'))
+SETTLED_PREDICTION_TTL = float(os.getenv('SETTLED_PREDICTION_TTL', str(6 * 3600)))
+
+# Number of lock stripes per-game keys are hashed onto
+LOCK_STRIPES = 256
+
+
+def _is_settled(prediction: Dict) -> bool:
+    return prediction.get('status') != 'pending'
+
+
+def _stripe(key: Hashable) -> int:
+    """Stable stripe index for a lock key (identical in every worker process)"""
+    return zlib.crc32(repr(key).encode()) % LOCK_STRIPES
+
+
+class InProcessState:
+    """State held in this process only (the historical single-worker layout).
+
+    The stores are shared by every thread of the worker: request threads,
+    dispatcher callbacks (register_sent_prediction) and the predictor
+    sweeper. They must be thread-safe on their own, as BoundedStore,
+    BoundedSet and PendingIndex are; lock() only serializes the work on
+    one game.
+    """
+
+    shared = False
+
+    def __init__(self, max_entries: int = STATE_MAX_ENTRIES, settled_ttl: float = SETTLED_PREDICTION_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.predictions = BoundedStore(max_entries, settled_ttl, expire_if=_is_settled, clock=clock,
+                                        name='predictions')
+        self.processed_messages = BoundedSet(max_entries, settled_ttl, clock=clock, name='processed_messages')
+        self.sent_predictions = BoundedStore(max_entries, settled_ttl, clock=clock, name='sent_predictions')
+        self.pending_games = PendingIndex()
+        self.redirect_channels: Dict[int, int] = {}
+        self._settings: Dict[str, Any] = {}
+        self._settings_lock = threading.Lock()
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def get_setting(self, key: str, default: Any = None) -> Any:
+        return self._settings.get(key, default)
+
+    def set_setting(self, key: str, value: Any) -> None:
+        self._settings[key] = value
+
+    def claim_cooldown(self, now: float, cooldown: float) -> bool:
+        """Atomically check the cooldown and, if it elapsed, start a new one"""
+        with self._settings_lock:
+            last = self._settings.get('last_prediction_time', 0)
+            if last and now - last < cooldown:
+                return False
+            self._settings['last_prediction_time'] = now
+            return True
+
+    @contextmanager
+    def lock(self, key: Hashable):
+        """Serialize work on one key (e.g. ('game', 744)) across threads"""
+        with self._locks[_stripe(key)]:
+            yield
+
+    def close(self) -> None:
+        pass
+
+
+class SQLitePredictions(MutableMapping):
+    """predictions table viewed as {game: prediction dict}"""
+
+    name = 'predictions'
+
+    def __init__(self, state: 'SharedSQLiteState'):
+        self._state = state
+
+    def __getitem__(self, game: int) -> Dict:
+        row = self._state.conn().execute("SELECT data FROM predictions WHERE game = ?", (game,)).fetchone()
+        if row is None:
+            raise KeyError(game)
+        return json.loads(row[0])
+
+    def __setitem__(self, game: int, prediction: Dict) -> None:
+        self._state.conn().execute(
+            "INSERT OR REPLACE INTO predictions (game, status, data, updated_at) VALUES (?, ?, ?, ?)",
+            (game, prediction.get('status', 'pending'), json.dumps(prediction, ensure_ascii=False), time.time())
+        )
+        self._state.note_write()
+
+    def __delitem__(self, game: int) -> None:
+        self._state.conn().execute("DELETE FROM predictions WHERE game = ?", (game,))
+
+    def __iter__(self) -> Iterator[int]:
+        return iter([row[0] for row in self._state.conn().execute("SELECT game FROM predictions ORDER BY game")])
+
+    def __len__(self) -> int:
+        return self._state.conn().execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+    def clear(self) -> None:
+        self._state.conn().execute("DELETE FROM predictions")
+
+    def stats(self) -> Dict[str, Any]:
+        return {'size': len(self), 'backend': 'sqlite'}
+
+
+class SQLitePendingIndex:
+    """Pending lookup answered by the (status, game) index of the predictions table"""
+
+    def __init__(self, state: 'SharedSQLiteState'):
+        self._state = state
+
+    def add(self, game_number: int) -> None:
+        pass  # Derived from the status column
+
+    def discard(self, game_number: int) -> None:
+        pass
+
+    def first(self) -> Optional[int]:
+        return self._state.conn().execute(
+            "SELECT MIN(game) FROM predictions WHERE status = 'pending'"
+        ).fetchone()[0]
+
+    def __contains__(self, game_number: object) -> bool:
+        return self._state.conn().execute(
+            "SELECT 1 FROM predictions WHERE game = ? AND status = 'pending'", (game_number,)
+        ).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._state.conn().execute("SELECT COUNT(*) FROM predictions WHERE status = 'pending'").fetchone()[0]
+
+    def clear(self) -> None:
+        pass
+
+
+class SQLiteSentPredictions(MutableMapping):
+    """sent_predictions table viewed as {game: {'chat_id', 'message_id'}}"""
+
+    name = 'sent_predictions'
+
+    def __init__(self, state: 'SharedSQLiteState'):
+        self._state = state
+
+    def __getitem__(self, game: int) -> Dict[str, int]:
+        row = self._state.conn().execute(
+            "SELECT chat_id, message_id FROM sent_predictions WHERE game = ?", (game,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(game)
+        return {'chat_id': row[0], 'message_id': row[1]}
+
+    def __setitem__(self, game: int, message_info: Dict[str, int]) -> None:
+        self._state.conn().execute(
+            "INSERT OR REPLACE INTO sent_predictions (game, chat_id, message_id, updated_at) VALUES (?, ?, ?, ?)",
+            (game, message_info['chat_id'], message_info['message_id'], time.time())
+        )
+
+    def __delitem__(self, game: int) -> None:
+        self._state.conn().execute("DELETE FROM sent_predictions WHERE game = ?", (game,))
+
+    def __iter__(self) -> Iterator[int]:
+        return iter([row[0] for row in self._state.conn().execute("SELECT game FROM sent_predictions")])
+
+    def __len__(self) -> int:
+        return self._state.conn().execute("SELECT COUNT(*) FROM sent_predictions").fetchone()[0]
+
+    def clear(self) -> None:
+        self._state.conn().execute("DELETE FROM sent_predictions")
+
+    def stats(self) -> Dict[str, Any]:
+        return {'size': len(self), 'backend': 'sqlite'}
+
+
+class SQLiteRedirects(MutableMapping):
+    """redirects table viewed as {source_chat_id: target_chat_id}"""
+
+    def __init__(self, state: 'SharedSQLiteState'):
+        self._state = state
+
+    def __getitem__(self, source_chat_id: int) -> int:
+        row = self._state.conn().execute(
+            "SELECT target_chat_id FROM redirects WHERE source_chat_id = ?", (source_chat_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(source_chat_id)
+        return row[0]
+
+    def __setitem__(self, source_chat_id: int, target_chat_id: int) -> None:
+        self._state.conn().execute(
+            "INSERT OR REPLACE INTO redirects (source_chat_id, target_chat_id) VALUES (?, ?)",
+            (source_chat_id, target_chat_id)
+        )
+
+    def __delitem__(self, source_chat_id: int) -> None:
+        self._state.conn().execute("DELETE FROM redirects WHERE source_chat_id = ?", (source_chat_id,))
+
+    def __iter__(self) -> Iterator[int]:
+        return iter([row[0] for row in self._state.conn().execute("SELECT source_chat_id FROM redirects")])
+
+    def __len__(self) -> int:
+        return self._state.conn().execute("SELECT COUNT(*) FROM redirects").fetchone()[0]
+
+    def clear(self) -> None:
+        self._state.conn().execute("DELETE FROM redirects")
+
+
+class SQLiteProcessedGames:
+    """processed_games table viewed as a set of source game numbers"""
+
+    def __init__(self, state: 'SharedSQLiteState'):
+        self._state = state
+
+    def add(self, game: int) -> None:
+        self._state.conn().execute(
+            "INSERT OR REPLACE INTO processed_games (game, updated_at) VALUES (?, ?)", (game, time.time())
+        )
+
+    def discard(self, game: int) -> None:
+        self._state.conn().execute("DELETE FROM processed_games WHERE game = ?", (game,))
+
+    def __contains__(self, game: object) -> bool:
+        return self._state.conn().execute(
+            "SELECT 1 FROM processed_games WHERE game = ?", (game,)
+        ).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._state.conn().execute("SELECT COUNT(*) FROM processed_games").fetchone()[0]
+
+    def clear(self) -> None:
+        self._state.conn().execute("DELETE FROM processed_games")
+
+    def stats(self) -> Dict[str, Any]:
+        return {'size': len(self), 'backend': 'sqlite'}
+
+
+class SQLitePredictionStats:
+    """PredictionStats kept in the prediction_stats table, so every worker counts every settlement.
+
+    One row per (window, position, cell): recording is one upsert per
+    window, reading one grouped sum per window over at most size * 12 rows.
+    Rows that fall out of a window are deleted as it moves forward.
+    """
+
+    def __init__(self, state: 'SharedSQLiteState', last_games: int = STATS_LAST_GAMES, hours: int = STATS_HOURS,
+                 days: int = STATS_DAYS, clock: Callable[[], float] = time.time):
+        self._state = state
+        self.sizes = {'games': max(1, last_games), 'hours': max(1, hours), 'days': max(1, days)}
+        self.clock = clock  # Wall time: shared with other processes
+
+    def _head(self, scope: str) -> Optional[int]:
+        return self._state.conn().execute(
+            "SELECT MAX(position) FROM prediction_stats WHERE scope = ?", (scope,)
+        ).fetchone()[0]
+
+    def record(self, predicted_game: int, costume: Optional[str], status: str) -> bool:
+        """Count one settled prediction; False if the suit or outcome is unknown"""
+        cell = stat_cell(costume, status)
+        if cell is None:
+            return False
+        now = self.clock()
+        positions = {'games': predicted_game, 'hours': int(now // 3600), 'days': int(now // 86400), 'total': 0}
+        with self._state.lock(('stats',)):
+            conn = self._state.conn()
+            head = self._head('games')
+            if head is not None and predicted_game <= head - self.sizes['games']:
+                # Game numbers started over: the window restarts from this one (as RollingWindow)
+                conn.execute("DELETE FROM prediction_stats WHERE scope = 'games'")
+            for scope, position in positions.items():
+                conn.execute(
+                    "INSERT INTO prediction_stats (scope, position, cell, count) VALUES (?, ?, ?, 1) "
+                    "ON CONFLICT (scope, position, cell) DO UPDATE SET count = count + 1",
+                    (scope, position, cell)
+                )
+                if scope in self.sizes:
+                    conn.execute("DELETE FROM prediction_stats WHERE scope = ? AND position <= ?",
+                                 (scope, self._head(scope) - self.sizes[scope]))
+        return True
+
+    def _counts(self, scope: str, after: Optional[int] = None) -> List[int]:
+        counts = [0] * CELLS
+        query = "SELECT cell, SUM(count) FROM prediction_stats WHERE scope = ?"
+        params: tuple = (scope,)
+        if after is not None:
+            query += " AND position > ?"
+            params += (after,)
+        for cell, count in self._state.conn().execute(query + " GROUP BY cell", params):
+            counts[cell] = count
+        return counts
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Same shape as PredictionStats.snapshot, for the whole channel"""
+        now = self.clock()
+        heads = {'games': self._head('games'), 'hours': int(now // 3600), 'days': int(now // 86400)}
+        snapshot = {}
+        for scope, head in heads.items():
+            size = self.sizes[scope]
+            counts = self._counts(scope, head - size) if head is not None else [0] * CELLS
+            snapshot[f"last_{scope}"] = summarize(counts) | {'window': size}
+        snapshot['since_start'] = summarize(self._counts('total'))
+        return snapshot
+
+    def clear(self) -> None:
+        self._state.conn().execute("DELETE FROM prediction_stats")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Win rate and prediction count per window, for /health"""
+        return {
+            name: {'predictions': summary['predictions'], 'win_rate': summary['win_rate']}
+            for name, summary in self.snapshot().items()
+        }
+
+
+class SharedSQLiteState:
+    """State shared by every worker through one SQLite file (WAL, write-through).
+
+    Each thread uses its own autocommit connection. Per-key locks combine a
+    thread lock with an fcntl byte-range lock on a companion .lock file, so
+    the same stripe is exclusive across threads and processes.
+    """
+
+    shared = True
+
+    # Writes between two prunes of rows older than the retention window
+    PRUNE_EVERY = 500
+
+    def __init__(self, path: str = STATE_DB_PATH, retention: float = PERSISTED_RETENTION):
+        self.path = path
+        self.retention = retention
+        self._local = threading.local()
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._lock_file = open(f"{path}.lock", 'a+b') if fcntl else None
+        self._writes = 0
+
+        self.conn().execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('last_prediction_time', '0')")
+        self.predictions = SQLitePredictions(self)
+        self.pending_games = SQLitePendingIndex(self)
+        self.sent_predictions = SQLiteSentPredictions(self)
+        self.processed_messages = SQLiteProcessedGames(self)
+        self.redirect_channels = SQLiteRedirects(self)
+        self.prediction_stats = SQLitePredictionStats(self)
+        logger.info(f"💾 ÉTAT PARTAGÉ - Base SQLite {path} (pid {os.getpid()})")
+
+    def conn(self):
+        """This thread's autocommit connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = connect(self.path)
+            conn.isolation_level = None
+            self._local.conn = conn
+        return conn
+
+    def note_write(self) -> None:
+        """Count a prediction write and prune old rows from time to time"""
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            cutoff = time.time() - self.retention
+            conn = self.conn()
+            conn.execute("DELETE FROM predictions WHERE status != 'pending' AND updated_at < ?", (cutoff,))
+            conn.execute("DELETE FROM sent_predictions WHERE updated_at < ?", (cutoff,))
+            conn.execute("DELETE FROM processed_games WHERE updated_at < ?", (cutoff,))
+
+    def get_setting(self, key: str, default: Any = None) -> Any:
+        row = self.conn().execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_setting(self, key: str, value: Any) -> None:
+        self.conn().execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def claim_cooldown(self, now: float, cooldown: float) -> bool:
+        """Atomically check the cooldown and, if it elapsed, start a new one (single UPDATE)"""
+        cursor = self.conn().execute(
+            "UPDATE settings SET value = ? WHERE key = 'last_prediction_time' "
+            "AND (CAST(value AS REAL) = 0 OR ? - CAST(value AS REAL) >= ?)",
+            (json.dumps(now), now, cooldown)
+        )
+        return cursor.rowcount == 1
+
+    @contextmanager
+    def lock(self, key: Hashable):
+        """Serialize work on one key across threads and worker processes"""
+        stripe = _stripe(key)
+        with self._locks[stripe]:
+            if self._lock_file is None:
+                yield
+                return
+            fcntl.lockf(self._lock_file, fcntl.LOCK_EX, 1, stripe)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._lock_file, fcntl.LOCK_UN, 1, stripe)
+
+    def close(self) -> None:
+        """Release this thread's connection and the lock file (other threads' go with them)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+def create_state_backend(path: str = STATE_DB_PATH):
+    """Build the backend selected by STATE_BACKEND"""
+    if STATE_BACKEND == 'sqlite':
+        return SharedSQLiteState(path)
+    return InProcessState()
@@ -0,0 +1,236 @@
+"""
+Bounded in-memory stores with size and TTL eviction for predictor state
+"""
+
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Set
+
+# Entries examined from the oldest end on each write when sweeping expired items
+SWEEP_BATCH = 16
+
+_MISSING = object()
+
+
+class BoundedStore(MutableMapping):
+    """Dict-like store that never grows beyond max_size entries.
+
+    Entries are kept in write order: assigning a key (again) makes it the
+    newest (the sweep also moves expired entries it must keep there). When the store is full the oldest entry is evicted, and entries
+    older than ttl seconds are dropped lazily on access and by a small sweep
+    on every write. expire_if restricts TTL expiry to some values (e.g. only
+    settled predictions); size eviction always applies, oldest end first.
+
+    Thread-safe: dispatcher callbacks, the sweeper thread and request
+    threads write the same stores, so every access to the entries holds
+    one reentrant lock.
+    """
+
+    def __init__(self, max_size: int = 2000, ttl: Optional[float] = None,
+                 expire_if: Optional[Callable[[Any], bool]] = None,
+                 clock: Callable[[], float] = time.monotonic, name: str = 'store'):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.expire_if = expire_if
+        self.clock = clock
+        self.name = name
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._stamps: Dict[Hashable, float] = {}
+        self._lock = threading.RLock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def _is_expired(self, key: Hashable, now: float) -> bool:
+        if self.ttl is None or now - self._stamps[key] < self.ttl:
+            return False
+        return self.expire_if is None or self.expire_if(self._data[key])
+
+    def _drop(self, key: Hashable) -> None:
+        del self._data[key]
+        del self._stamps[key]
+
+    def sweep(self, limit: Optional[int] = SWEEP_BATCH) -> int:
+        """Drop expired entries from the oldest end; returns how many were dropped.
+
+        Expired entries that expire_if keeps (pending predictions) are moved
+        to the newest end with their timestamp unchanged, so they never block
+        the expired entries queued behind them.
+        """
+        if self.ttl is None:
+            return 0
+        with self._lock:
+            now = self.clock()
+            expired, pinned = [], []
+            for index, key in enumerate(self._data):
+                if limit is not None and index >= limit:
+                    break
+                if now - self._stamps[key] < self.ttl:
+                    break  # Everything after this one is newer, or pinned
+                if self.expire_if is None or self.expire_if(self._data[key]):
+                    expired.append(key)
+                else:
+                    pinned.append(key)
+            for key in expired:
+                self._drop(key)
+            for key in pinned:
+                self._data.move_to_end(key)
+            self.expirations += len(expired)
+            return len(expired)
+
+    def __getitem__(self, key: Hashable) -> Any:
+        with self._lock:
+            value = self._data[key]
+            if self._is_expired(key, self.clock()):
+                self._drop(key)
+                self.expirations += 1
+                raise KeyError(key)
+            return value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._stamps[key] = self.clock()
+            self.sweep()
+            while len(self._data) > self.max_size:
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def __delitem__(self, key: Hashable) -> None:
+        with self._lock:
+            self._drop(key)
+
+    def pop(self, key: Hashable, default: Any = _MISSING) -> Any:
+        """Remove and return an entry in one step (MutableMapping.pop reads, then deletes)"""
+        with self._lock:
+            try:
+                value = self[key]
+            except KeyError:
+                if default is _MISSING:
+                    raise
+                return default
+            self._drop(key)
+            return value
+
+    def __contains__(self, key: object) -> bool:
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self) -> Iterator[Hashable]:
+        with self._lock:
+            return iter(list(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._stamps.clear()
+
+    def touch(self, key: Hashable) -> None:
+        """Restart the TTL window of an entry without changing its value"""
+        with self._lock:
+            self[key] = self._data[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and eviction counters"""
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+    def __repr__(self) -> str:
+        return f"BoundedStore({self.name}, size={len(self._data)}/{self.max_size})"
+
+
+class BoundedSet:
+    """Set-like wrapper over BoundedStore (used for de-duplication keys)"""
+
+    def __init__(self, max_size: int = 2000, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic, name: str = 'set'):
+        self._store = BoundedStore(max_size=max_size, ttl=ttl, clock=clock, name=name)
+
+    def add(self, key: Hashable) -> None:
+        self._store[key] = True
+
+    def add_if_absent(self, *keys: Hashable) -> bool:
+        """Add every key unless one is already there, atomically; True if they were added"""
+        with self._store._lock:
+            if any(key in self._store for key in keys):
+                return False
+            for key in keys:
+                self._store[key] = True
+            return True
+
+    def discard(self, key: Hashable) -> None:
+        self._store.pop(key, None)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._store
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._store)
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def clear(self) -> None:
+        self._store.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._store.stats()
+
+
+class PendingIndex:
+    """Min-heap of game numbers whose prediction is still pending.
+
+    Removal is lazy: discarded games stay in the heap until they reach the
+    top, so add/discard/first are all O(log n) amortized. Thread-safe, like
+    BoundedStore.
+    """
+
+    def __init__(self):
+        self._heap: List[int] = []
+        self._members: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def add(self, game_number: int) -> None:
+        with self._lock:
+            if game_number not in self._members:
+                self._members.add(game_number)
+                heapq.heappush(self._heap, game_number)
+
+    def discard(self, game_number: int) -> None:
+        with self._lock:
+            self._members.discard(game_number)
+
+    def first(self) -> Optional[int]:
+        """Smallest pending game number, or None"""
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0] not in self._members:
+                heapq.heappop(heap)
+            return heap[0] if heap else None
+
+    def __contains__(self, game_number: object) -> bool:
+        return game_number in self._members
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._heap.clear()
+            self._members.clear()
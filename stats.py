@@ -0,0 +1,184 @@
+"""
+Rolling prediction statistics: win rates over the last games, hours and days
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from clock import system_clock
+from message_parser import SUIT_INDEX, SUITS
+
+# Window sizes: last N predicted games, last N hours, last N days
+STATS_LAST_GAMES = int(os.getenv('STATS_LAST_GAMES', '100'))
+STATS_HOURS = int(os.getenv('STATS_HOURS', '24'))
+STATS_DAYS = int(os.getenv('STATS_DAYS', '7'))
+
+# Verification outcomes, as shown on the prediction message
+OUTCOMES = ("✅0️⃣", "✅1️⃣", "⭕")
+OUTCOME_INDEX = {outcome: index for index, outcome in enumerate(OUTCOMES)}
+
+# One counter per (suit, outcome)
+CELLS = len(SUITS) * len(OUTCOMES)
+
+
+class RollingWindow:
+    """Counters over the last `size` positions (game numbers, hours, days).
+
+    Each position owns a slot of a fixed ring; a running total is kept next
+    to it, so reading the window is O(1) and memory never grows. Moving
+    forward clears the slots that fall out of the window (at most `size`
+    of them). A late record still inside the window goes to its own slot;
+    one far behind the window means the counter started over (game numbers
+    reset), so the window restarts from it.
+    """
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._slots: List[List[int]] = [[0] * CELLS for _ in range(self.size)]
+        self._totals = [0] * CELLS
+        self.head: Optional[int] = None  # Newest position seen
+
+    def add(self, position: int, cell: int) -> None:
+        if self.head is not None and position <= self.head - self.size:
+            self.clear()
+        self.advance(position)
+        self._slots[position % self.size][cell] += 1
+        self._totals[cell] += 1
+
+    def advance(self, position: int) -> None:
+        """Move the window forward to `position`, dropping what falls out of it"""
+        if self.head is None:
+            self.head = position
+            return
+        if position <= self.head:
+            return
+        for step in range(self.head + 1, min(position, self.head + self.size) + 1):
+            slot = self._slots[step % self.size]
+            for cell, count in enumerate(slot):
+                if count:
+                    self._totals[cell] -= count
+                    slot[cell] = 0
+        self.head = position
+
+    def totals(self) -> List[int]:
+        return self._totals
+
+    def clear(self) -> None:
+        for slot in self._slots:
+            slot[:] = [0] * CELLS
+        self._totals = [0] * CELLS
+        self.head = None
+
+
+def stat_cell(costume: Optional[str], status: str) -> Optional[int]:
+    """Counter index of a (predicted suit, outcome) pair; None if either is unknown"""
+    suit = SUIT_INDEX.get(costume)
+    outcome = OUTCOME_INDEX.get(status)
+    if suit is None or outcome is None:
+        return None
+    return suit * len(OUTCOMES) + outcome
+
+
+def summarize(counts: List[int]) -> Dict[str, Any]:
+    """Outcome counts and win rate, overall and per predicted suit"""
+    def block(cells: List[int]) -> Dict[str, Any]:
+        total = sum(cells)
+        wins = total - cells[OUTCOME_INDEX["⭕"]]
+        return {
+            'predictions': total,
+            'outcomes': dict(zip(OUTCOMES, cells)),
+            'win_rate': round(wins / total, 4) if total else None,
+        }
+
+    width = len(OUTCOMES)
+    by_suit = {suit: block(counts[i * width:(i + 1) * width]) for i, suit in enumerate(SUITS)}
+    overall = block([sum(counts[i * width + o] for i in range(len(SUITS))) for o in range(width)])
+    overall['by_suit'] = by_suit
+    return overall
+
+
+class PredictionStats:
+    """Incremental win-rate counters fed by every settled prediction.
+
+    Each outcome (✅0️⃣, ✅1️⃣, ⭕) is counted per predicted suit in three
+    rolling windows (last games, hours, days) and since start. Recording
+    and reading are O(1) and the memory is fixed by the window sizes, so
+    /stats never scans the prediction history. These counters live in the
+    worker's memory, which is the whole picture only for the single-worker
+    InProcessState; the shared SQLite backend uses SQLitePredictionStats
+    so that every worker reports the channel's figures.
+    """
+
+    def __init__(self, last_games: int = STATS_LAST_GAMES, hours: int = STATS_HOURS, days: int = STATS_DAYS,
+                 clock: Callable[[], float] = system_clock):
+        self.clock = clock
+        self.games = RollingWindow(last_games)
+        self.hours = RollingWindow(hours)
+        self.days = RollingWindow(days)
+        self._total = [0] * CELLS
+        self._lock = threading.Lock()
+
+    def record(self, predicted_game: int, costume: Optional[str], status: str) -> bool:
+        """Count one settled prediction; False if the suit or outcome is unknown"""
+        cell = stat_cell(costume, status)
+        if cell is None:
+            return False
+        now = self.clock()
+        with self._lock:
+            self.games.add(predicted_game, cell)
+            self.hours.add(int(now // 3600), cell)
+            self.days.add(int(now // 86400), cell)
+            self._total[cell] += 1
+        return True
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Per-window summaries: predictions, outcome counts and win rate, overall and per suit"""
+        now = self.clock()
+        with self._lock:
+            self.hours.advance(int(now // 3600))
+            self.days.advance(int(now // 86400))
+            return {
+                'last_games': summarize(self.games.totals()) | {'window': self.games.size},
+                'last_hours': summarize(self.hours.totals()) | {'window': self.hours.size},
+                'last_days': summarize(self.days.totals()) | {'window': self.days.size},
+                'since_start': summarize(self._total),
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            for window in (self.games, self.hours, self.days):
+                window.clear()
+            self._total = [0] * CELLS
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Win rate and prediction count per window, for /health"""
+        return {
+            name: {'predictions': summary['predictions'], 'win_rate': summary['win_rate']}
+            for name, summary in self.snapshot().items()
+        }
+
+
+def format_stats(snapshot: Dict[str, Dict[str, Any]]) -> str:
+    """/stats answer"""
+    titles = {
+        'last_games': "{window} derniers jeux",
+        'last_hours': "{window} dernières heures",
+        'last_days': "{window} derniers jours",
+        'since_start': "Depuis le démarrage",
+    }
+    lines = []
+    for name, title in titles.items():
+        summary = snapshot[name]
+        lines.append(f"\n📈 **{title.format(window=summary.get('window'))}**")
+        if not summary['predictions']:
+            lines.append("• Aucune prédiction vérifiée")
+            continue
+        outcomes = " · ".join(f"{outcome} {count}" for outcome, count in summary['outcomes'].items())
+        lines.append(f"• {summary['predictions']} prédictions — {outcomes} — réussite {summary['win_rate']:.1%}")
+        suits = [
+            f"{suit} {block['win_rate']:.0%} ({block['predictions']})"
+            for suit, block in summary['by_suit'].items() if block['predictions']
+        ]
+        lines.append("• " + "  ".join(suits))
+    return "\n".join(lines)
@@ -0,0 +1,230 @@
+"""
+Shared Telegram Bot API client with pooled keep-alive connections
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import TELEGRAM_SECONDS
+
+try:
+    import httpx
+except ImportError:  # Optional: AsyncTelegramClient then runs the pooled sync client in threads
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_BASE = os.getenv('TELEGRAM_API_BASE', 'https://api.telegram.org')
+TELEGRAM_POOL_SIZE = int(os.getenv('TELEGRAM_POOL_SIZE', '10'))
+TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', '3'))
+# Concurrent connections of the asyncio client (ASGI entry point)
+TELEGRAM_ASYNC_POOL_SIZE = int(os.getenv('TELEGRAM_ASYNC_POOL_SIZE', '200'))
+
+# Longest wait we accept before retrying a 429 in-line
+MAX_RETRY_AFTER = 30
+
+# Methods that can safely run twice. A 5xx or a read timeout does not tell
+# whether Telegram applied the call, so only these are retried after one;
+# retrying sendMessage or sendDocument could post the same prediction twice.
+IDEMPOTENT_METHODS = frozenset({
+    'editMessageText', 'editMessageReplyMarkup', 'getUpdates', 'getMe', 'getChat',
+    'getFile', 'getWebhookInfo', 'setWebhook', 'deleteWebhook',
+})
+
+
+def _rewind(files: Optional[Dict[str, Any]]) -> None:
+    """Uploaded files must be re-read from the start on every attempt"""
+    for value in (files or {}).values():
+        if isinstance(value, tuple) and hasattr(value[1], 'seek'):
+            value[1].seek(0)
+
+
+def _decode(status: int, response: Any) -> Dict[str, Any]:
+    try:
+        return response.json()
+    except ValueError:
+        return {'ok': False, 'error_code': status, 'description': response.text[:200]}
+
+
+class RetryPolicy:
+    """When a Bot API call is retried and after how long; both clients only do the I/O.
+
+    A 429 is always retried (the call was not applied), after the
+    retry_after announced by Telegram unless it is longer than
+    MAX_RETRY_AFTER. Connection errors are always retried. Read timeouts
+    and HTTP 5xx do not tell whether Telegram applied the call, so they are
+    only retried for IDEMPOTENT_METHODS. Other waits use jittered
+    exponential backoff.
+    """
+
+    def __init__(self, max_retries: int = TELEGRAM_MAX_RETRIES, backoff_base: float = 0.5,
+                 backoff_max: float = 8.0):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff delay for a retry attempt"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def retries(self, max_retries: Optional[int]) -> int:
+        return self.max_retries if max_retries is None else max_retries
+
+    def after_error(self, method: str, error: Exception, attempt: int, retries: int,
+                    read_timeout: bool = False) -> Optional[float]:
+        """Delay before retrying a call that raised, or None to re-raise"""
+        if attempt >= retries or (read_timeout and method not in IDEMPOTENT_METHODS):
+            return None
+        delay = self.backoff(attempt)
+        logger.warning(f"⚠️ Telegram {method} - Erreur réseau ({error}), nouvel essai dans {delay:.2f}s")
+        return delay
+
+    def after_response(self, method: str, status: int, result: Dict[str, Any], attempt: int,
+                       retries: int) -> Optional[float]:
+        """Delay before retrying a call that got an answer, or None to return it"""
+        if attempt >= retries or not (status == 429 or (status >= 500 and method in IDEMPOTENT_METHODS)):
+            return None
+        retry_after = (result.get('parameters') or {}).get('retry_after')
+        if retry_after is not None and retry_after > MAX_RETRY_AFTER:
+            logger.warning(f"⚠️ Telegram {method} - 429, retry_after {retry_after}s trop long")
+            return None
+        delay = retry_after if retry_after is not None else self.backoff(attempt)
+        logger.warning(f"⚠️ Telegram {method} - HTTP {status}, nouvel essai dans {delay:.2f}s")
+        return delay
+
+
+class TelegramClient:
+    """Thread-safe Bot API client reusing TCP/TLS connections across calls.
+
+    Transient failures are retried as RetryPolicy decides.
+    """
+
+    def __init__(self, token: str, api_base: str = TELEGRAM_API_BASE, pool_size: int = TELEGRAM_POOL_SIZE,
+                 max_retries: int = TELEGRAM_MAX_RETRIES, backoff_base: float = 0.5, backoff_max: float = 8.0):
+        self.base_url = f"{api_base.rstrip('/')}/bot{token}"
+        self.retry = RetryPolicy(max_retries, backoff_base, backoff_max)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def call(self, method: str, json: Optional[Dict[str, Any]] = None, data: Optional[Dict[str, Any]] = None,
+             files: Optional[Dict[str, Any]] = None, timeout: float = 10, http_method: str = 'POST',
+             max_retries: Optional[int] = None) -> Dict[str, Any]:
+        """Call a Bot API method and return the decoded JSON response.
+
+        Network errors still raise requests exceptions once retries are exhausted.
+        max_retries=0 returns 429/5xx answers at once, for callers that reschedule themselves.
+        """
+        url = f"{self.base_url}/{method}"
+        retries = self.retry.retries(max_retries)
+
+        for attempt in range(retries + 1):
+            _rewind(files)
+            started = time.perf_counter()
+            try:
+                response = self.session.request(http_method, url, json=json, data=data,
+                                                files=files, timeout=timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                delay = self.retry.after_error(method, e, attempt, retries,
+                                               read_timeout=isinstance(e, requests.exceptions.ReadTimeout))
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+
+            TELEGRAM_SECONDS.observe(time.perf_counter() - started, method)
+            result = _decode(response.status_code, response)
+            delay = self.retry.after_response(method, response.status_code, result, attempt, retries)
+            if delay is None:
+                return result
+            time.sleep(delay)
+
+        return {'ok': False, 'description': 'retries exhausted'}
+
+    def close(self) -> None:
+        """Close pooled connections"""
+        self.session.close()
+
+
+class AsyncTelegramClient:
+    """asyncio counterpart of TelegramClient, same RetryPolicy.
+
+    With httpx installed, hundreds of calls can be in flight on one event
+    loop over a shared connection pool. Without it, each call runs the
+    pooled sync client in a worker thread: the API stays the same, with
+    far less concurrency.
+    """
+
+    def __init__(self, token: str, api_base: str = TELEGRAM_API_BASE, pool_size: int = TELEGRAM_ASYNC_POOL_SIZE,
+                 max_retries: int = TELEGRAM_MAX_RETRIES, backoff_base: float = 0.5, backoff_max: float = 8.0):
+        self.base_url = f"{api_base.rstrip('/')}/bot{token}"
+        self.retry = RetryPolicy(max_retries, backoff_base, backoff_max)
+        if httpx is None:
+            self.session = None
+            self._sync = get_telegram_client(token)
+        else:
+            limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            self.session = httpx.AsyncClient(limits=limits)
+            self._sync = None
+
+    async def call(self, method: str, json: Optional[Dict[str, Any]] = None, data: Optional[Dict[str, Any]] = None,
+                   files: Optional[Dict[str, Any]] = None, timeout: float = 10, http_method: str = 'POST',
+                   max_retries: Optional[int] = None) -> Dict[str, Any]:
+        """Call a Bot API method and return the decoded JSON response (see TelegramClient.call)"""
+        if self.session is None:
+            return await asyncio.to_thread(self._sync.call, method, json=json, data=data, files=files,
+                                           timeout=timeout, http_method=http_method, max_retries=max_retries)
+
+        url = f"{self.base_url}/{method}"
+        retries = self.retry.retries(max_retries)
+
+        for attempt in range(retries + 1):
+            _rewind(files)
+            started = time.perf_counter()
+            try:
+                response = await self.session.request(http_method, url, json=json, data=data,
+                                                      files=files, timeout=timeout)
+            except httpx.TransportError as e:  # Connection errors and timeouts
+                delay = self.retry.after_error(method, e, attempt, retries,
+                                               read_timeout=isinstance(e, httpx.ReadTimeout))
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+
+            TELEGRAM_SECONDS.observe(time.perf_counter() - started, method)
+            result = _decode(response.status_code, response)
+            delay = self.retry.after_response(method, response.status_code, result, attempt, retries)
+            if delay is None:
+                return result
+            await asyncio.sleep(delay)
+
+        return {'ok': False, 'description': 'retries exhausted'}
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.aclose()
+
+
+_clients: Dict[str, TelegramClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_telegram_client(token: str) -> TelegramClient:
+    """Return the process-wide client for a bot token"""
+    with _clients_lock:
+        client = _clients.get(token)
+        if client is None:
+            client = TelegramClient(token)
+            _clients[token] = client
+        return client
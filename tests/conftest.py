@@ -0,0 +1,17 @@
+"""
+Shared test setup: import the flat modules from the repository root, keep state files out of it
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Module-level instances (card_predictor.card_predictor...) open their state at import time
+_STATE_DIR = tempfile.mkdtemp(prefix='bot-tests-')
+os.environ.setdefault('STATE_DB_PATH', os.path.join(_STATE_DIR, 'bot_state.db'))
+os.environ.setdefault('EVENT_LOG_DIR', '')
+# Outbound calls run inline unless a test starts workers itself
+os.environ.setdefault('OUTBOUND_WORKERS', '0')
@@ -0,0 +1,91 @@
+"""
+Update de-duplication window (update_id and message revision)
+"""
+
+import threading
+import time
+
+from clock import ManualClock
+from dedup import UpdateDeduplicator
+
+
+def post(update_id, message_id, chat_id=-100777, edit_date=None, key='channel_post', text='#N1'):
+    message = {'message_id': message_id, 'chat': {'id': chat_id}, 'text': text}
+    if edit_date is not None:
+        message['edit_date'] = edit_date
+    return {'update_id': update_id, key: message}
+
+
+def test_webhook_retry_is_dropped():
+    dedup = UpdateDeduplicator()
+    assert not dedup.is_duplicate(post(1, 10))
+    assert dedup.is_duplicate(post(1, 10))
+    assert dedup.get_stats()['accepted'] == 1 and dedup.get_stats()['duplicates'] == 1
+
+
+def test_same_revision_under_another_update_id_is_dropped():
+    dedup = UpdateDeduplicator()
+    assert not dedup.is_duplicate(post(1, 10))
+    assert dedup.is_duplicate(post(2, 10))
+
+
+def test_edits_and_other_chats_are_new_revisions():
+    dedup = UpdateDeduplicator()
+    assert not dedup.is_duplicate(post(1, 10))
+    assert not dedup.is_duplicate(post(2, 10, edit_date=100, key='edited_channel_post'))
+    assert not dedup.is_duplicate(post(3, 10, edit_date=101, key='edited_channel_post'))
+    assert dedup.is_duplicate(post(4, 10, edit_date=101, key='edited_channel_post'))
+    assert not dedup.is_duplicate(post(5, 10, chat_id=-100999))
+
+
+def test_keys_expire_after_the_ttl():
+    clock = ManualClock()
+    dedup = UpdateDeduplicator(ttl=60, clock=clock)
+    assert not dedup.is_duplicate(post(1, 10))
+    clock.advance(59)
+    assert dedup.is_duplicate(post(1, 10))
+    clock.advance(2)
+    assert not dedup.is_duplicate(post(1, 10))
+
+
+def test_window_is_bounded_by_size():
+    dedup = UpdateDeduplicator(window=4)
+    for update_id in range(1, 4):
+        assert not dedup.is_duplicate(post(update_id, update_id))
+    # Each update holds two keys (update_id and revision): the oldest fell out
+    assert not dedup.is_duplicate(post(1, 1))
+    assert dedup.is_duplicate(post(3, 3))
+
+
+def test_edits_in_the_same_second_with_new_text_are_kept():
+    dedup = UpdateDeduplicator()
+    pending = post(1, 10, edit_date=100, key='edited_channel_post', text='#N5. 1(A♥️) - 2(K♠️) ⏰')
+    final = post(2, 10, edit_date=100, key='edited_channel_post', text='#N5. 1(A♥️) - 2(K♠️) ✅')
+    assert not dedup.is_duplicate(pending)
+    assert not dedup.is_duplicate(final)
+    assert dedup.is_duplicate(post(3, 10, edit_date=100, key='edited_channel_post', text=final['edited_channel_post']['text']))
+
+
+def slow_clock():
+    """Yields the GIL on every store access, so racing threads interleave"""
+    time.sleep(0.0005)
+    return time.monotonic()
+
+
+def test_concurrent_deliveries_are_accepted_once():
+    for attempt in range(10):
+        dedup = UpdateDeduplicator(clock=slow_clock)
+        start = threading.Barrier(8)
+        accepted = []
+
+        def deliver(update_id):
+            start.wait()
+            if not dedup.is_duplicate(post(update_id, 10)):
+                accepted.append(update_id)
+
+        threads = [threading.Thread(target=deliver, args=(update_id,)) for update_id in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(accepted) == 1
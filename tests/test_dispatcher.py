@@ -0,0 +1,68 @@
+"""
+Delivery accounting shared by OutboundDispatcher and AsyncOutboundDispatcher
+"""
+
+import asyncio
+
+from dispatcher import AsyncOutboundDispatcher, OutboundDispatcher
+
+
+def test_inline_dispatcher_counts_results_and_skips_unresolved_jobs():
+    results = []
+    dispatcher = OutboundDispatcher(lambda method, payload: payload.get('ok'), workers=0)
+
+    dispatcher.submit('sendMessage', 1, {'ok': True}, callback=results.append)
+    dispatcher.submit('sendMessage', 1, {'ok': False}, callback=results.append)
+    dispatcher.submit('editMessageText', 1, resolve=lambda: None, callback=results.append)
+
+    stats = dispatcher.get_stats()
+    assert results == [True, False]
+    assert (stats['submitted'], stats['delivered'], stats['failed']) == (3, 1, 1)
+    assert stats['workers'] == 0 and 'latency_p50_ms' in stats
+
+
+def test_errors_are_counted_as_failures_and_reported_to_the_callback():
+    def deliver(method, payload):
+        raise RuntimeError('boom')
+
+    results = []
+    dispatcher = OutboundDispatcher(deliver, workers=0)
+    dispatcher.submit('sendMessage', 1, {}, callback=results.append)
+    assert dispatcher.get_stats()['failed'] == 1
+    assert results == [None]
+
+
+def test_a_failing_callback_runs_once_and_is_not_a_failed_delivery():
+    calls = []
+
+    def callback(result):
+        calls.append(result)
+        raise RuntimeError('boom')
+
+    dispatcher = OutboundDispatcher(lambda method, payload: {'message_id': 1}, workers=0)
+    dispatcher.submit('sendMessage', 1, {}, callback=callback)
+    assert calls == [{'message_id': 1}]
+    assert (dispatcher.get_stats()['delivered'], dispatcher.get_stats()['failed']) == (1, 0)
+
+
+def test_async_dispatcher_keeps_per_chat_order():
+    delivered = []
+
+    async def deliver(method, payload):
+        await asyncio.sleep(0)
+        delivered.append((payload['chat'], payload['n']))
+        return True
+
+    async def scenario():
+        dispatcher = AsyncOutboundDispatcher(deliver, asyncio.get_running_loop(), max_in_flight=4)
+        for n in range(5):
+            for chat in (1, 2):
+                dispatcher.submit('sendMessage', chat, {'chat': chat, 'n': n})
+        await asyncio.sleep(0)
+        await dispatcher.stop()
+        return dispatcher.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert [n for chat, n in delivered if chat == 1] == list(range(5))
+    assert [n for chat, n in delivered if chat == 2] == list(range(5))
+    assert stats['mode'] == 'asyncio' and stats['delivered'] == 10 and stats['queue_depth'] == 0
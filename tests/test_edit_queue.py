@@ -0,0 +1,50 @@
+"""
+EditQueue: per-chat state of idle chats is dropped
+"""
+
+import threading
+import time
+
+from clock import ManualClock
+from edit_queue import EditQueue
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_idle_chat_buckets_and_pauses_are_dropped():
+    clock = ManualClock(1_000)
+    throttled = set()
+    lock = threading.Lock()
+
+    def send(chat_id, message_id, text):
+        with lock:
+            if chat_id <= 100 and chat_id % 10 == 0 and chat_id not in throttled:
+                throttled.add(chat_id)
+                return {'ok': False, 'error_code': 429, 'parameters': {'retry_after': 0}}
+        return {'ok': True}
+
+    queue = EditQueue(send, per_chat=(1, 10), global_rate=(10_000, 1), clock=clock)
+    queue.start()
+    try:
+        for chat_id in range(1, 101):
+            queue.submit(chat_id, 1, 'a')
+        wait_for(lambda: queue.get_stats()['delivered'] == 90 and queue.get_stats()['paused_chats'] == 10)
+        assert queue.get_stats()['tracked_chats'] == 100
+
+        # Each round: every bucket refills and every pause ends, then traffic to new chats drives the sweep
+        delivered = 90
+        for first in (1001, 2001):
+            clock.advance(10)
+            for chat_id in range(first, first + 20):
+                queue.submit(chat_id, 1, 'b')
+            delivered += 20 if first == 2001 else 30
+            wait_for(lambda: queue.get_stats()['delivered'] == delivered)
+        assert queue.get_stats()['tracked_chats'] <= 20
+        assert len(queue._paused_until) == 0
+    finally:
+        queue.stop()
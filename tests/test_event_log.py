@@ -0,0 +1,144 @@
+"""
+Event log: torn-tail recovery, compaction and replay
+"""
+
+import os
+import random
+
+import pytest
+
+from card_predictor import CardPredictor
+from clock import ManualClock
+from event_log import EventLog, compaction_drops, replay_events
+
+
+@pytest.fixture
+def open_log(tmp_path):
+    logs = []
+
+    def open_log(**options):
+        options.setdefault('fsync_interval', 60)
+        options.setdefault('compact_segments', 1000)  # Compaction only when a test asks for it
+        options.setdefault('retention', 0)
+        log = EventLog(str(tmp_path / 'events'), **options)
+        logs.append(log)
+        return log
+
+    yield open_log
+    for log in logs:
+        log.close()
+
+
+def last_segment(log):
+    return log._segments[-1]
+
+
+def rotate(log):
+    with log._lock:
+        log._rotate()
+
+
+def test_torn_tail_is_cut_on_open(open_log):
+    log = open_log()
+    for game in range(1, 4):
+        log.append('predicted', game=game, data={'status': 'pending'})
+    log.close()
+    path = last_segment(log)
+    intact = os.path.getsize(path)
+    with open(path, 'ab') as f:
+        f.write(b'\x40\x00\x00\x00\x01\x02')  # Header of a record the crash cut short
+
+    log = open_log()
+    assert log.get_stats()['truncated'] == 1
+    assert os.path.getsize(path) == intact
+    assert [event['game'] for event in log.events()] == [1, 2, 3]
+    assert log.append('settled', game=1, data={'status': 'correct'}) == 4
+    assert [event['seq'] for event in log.events()] == [1, 2, 3, 4]
+
+
+def test_corrupt_record_ends_the_log(open_log):
+    log = open_log()
+    log.append('predicted', game=1, data={'status': 'pending'})
+    log.append('predicted', game=2, data={'status': 'pending'})
+    log.close()
+    path = last_segment(log)
+    with open(path, 'r+b') as f:
+        f.seek(-2, os.SEEK_END)
+        f.write(b'!!')  # Last payload no longer matches its CRC
+
+    log = open_log()
+    assert [event['game'] for event in log.events()] == [1]
+    assert log.append('predicted', game=2, data={'status': 'pending'}) == 2
+
+
+def test_numbering_continues_after_an_empty_last_segment(open_log):
+    log = open_log()
+    log.append('predicted', game=1, data={'status': 'pending'})
+    rotate(log)
+    log.close()
+
+    log = open_log()
+    assert log.append('sent', game=1, chat_id=-100, message_id=7) == 2
+
+
+def random_history(log, r, days=6, games=40):
+    for day in range(days):
+        for game in range(1, games + 1):
+            if r.random() < 0.6:
+                log.append('predicted', game=game, data={'status': 'pending', 'day': day})
+                if r.random() < 0.8:
+                    log.append('sent', game=game, chat_id=-100, message_id=day * 1000 + game)
+                for _ in range(r.randint(0, 2)):
+                    log.append('settled', game=game, data={'status': r.choice(['correct', 'failed']), 'day': day})
+        if r.random() < 0.2:
+            log.append('reset')
+        rotate(log)
+
+
+def test_compaction_keeps_the_replayed_state(open_log):
+    log = open_log()
+    random_history(log, random.Random(25))
+    log.append('predicted', game=3, data={'status': 'pending'})  # In the active segment
+    before = replay_events(log.events())
+    assert log.get_stats()['segments'] > 2
+
+    assert log.compact() > 0
+    assert log.get_stats()['segments'] == 2  # Merged closed segments + the active one
+    assert replay_events(log.events()) == before
+
+    random_history(log, random.Random(26), days=2)
+    before = replay_events(log.events())
+    log.compact()
+    assert replay_events(log.events()) == before
+
+    log.close()
+    assert open_log().replay() == before
+
+
+def test_retention_keeps_pending_predictions():
+    events = [
+        {'seq': 1, 'ts': 0, 'type': 'predicted', 'game': 5, 'data': {'status': 'pending'}},
+        {'seq': 2, 'ts': 0, 'type': 'predicted', 'game': 6, 'data': {'status': 'pending'}},
+        {'seq': 3, 'ts': 10, 'type': 'settled', 'game': 6, 'data': {'status': 'correct'}},
+        {'seq': 4, 'ts': 500, 'type': 'predicted', 'game': 7, 'data': {'status': 'pending'}},
+        {'seq': 5, 'ts': 500, 'type': 'settled', 'game': 7, 'data': {'status': 'failed'}},
+    ]
+    assert compaction_drops(iter(events), retention=100, now=550) == {2, 3}
+    state = replay_events(iter(events), retention=100, now=550)
+    assert sorted(state['predictions']) == [5, 7]
+
+
+def test_predictor_state_comes_back_from_the_log(open_log):
+    clock = ManualClock(1_000_000.0)
+    predictor = CardPredictor(clock=clock, event_log=open_log())
+    predictor.make_prediction(10, '♥️')
+    predictor.make_prediction(18, '♠️')
+    predictor.register_sent_prediction(20, -100888, 55)
+    predictor.verify_all("#N12. 5(♥️♣️) - 7(♦️♠️) ✅")
+    predictor.close()
+
+    restored = CardPredictor(clock=clock, event_log=open_log())
+    assert restored.predictions[12]['status'] == 'correct'
+    assert restored.predictions[20]['status'] == 'pending'
+    assert restored.sent_predictions[20] == {'chat_id': -100888, 'message_id': 55}
+    assert restored.pending_games.first() == 20
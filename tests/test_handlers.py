@@ -0,0 +1,115 @@
+"""
+Outbound prediction messages and their status edits
+"""
+
+import time
+
+import pytest
+
+import handlers as handlers_module
+from card_predictor import CardPredictor
+from handlers import TelegramHandlers
+from predictor_registry import PredictorRegistry
+
+SOURCE = -100777
+TARGET = -100888
+
+
+class RecordingDispatcher:
+    """Keeps the submitted jobs instead of running them"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, method, chat_id, payload=None, callback=None, resolve=None):
+        self.jobs.append({'method': method, 'chat_id': chat_id, 'payload': payload,
+                          'callback': callback, 'resolve': resolve})
+        return True
+
+
+@pytest.fixture
+def handlers():
+    handlers = TelegramHandlers('1:test')
+    handlers.predictors = PredictorRegistry(lambda chat_id: CardPredictor(), accept_any=True)
+    handlers.dispatcher = RecordingDispatcher()
+    return handlers
+
+
+@pytest.fixture
+def predictor(handlers):
+    predictor = handlers.predictors.get(SOURCE)
+    predictor.set_redirect_channel(SOURCE, TARGET)
+    return predictor
+
+
+def test_edit_before_send_uses_the_prediction_shard(handlers, predictor):
+    handlers.queue_prediction(handlers.get_redirect_channel(SOURCE), 12, "🔵12🔵:♥️statut :⏳", predictor)
+    handlers.queue_prediction_edit(12, "🔵12🔵:♥️statut :✅0️⃣", predictor, SOURCE)
+    assert [(job['method'], job['chat_id']) for job in handlers.dispatcher.jobs] == \
+        [('sendMessage', TARGET), ('editMessageText', TARGET)]
+
+
+def test_edit_after_send_uses_the_stored_message(handlers, predictor):
+    predictor.register_sent_prediction(12, TARGET, 55)
+    handlers.queue_prediction_edit(12, "🔵12🔵:♥️statut :⭕", predictor, SOURCE)
+    job = handlers.dispatcher.jobs[-1]
+    assert job['chat_id'] == TARGET
+    assert job['resolve']() == {'chat_id': TARGET, 'message_id': 55, 'text': "🔵12🔵:♥️statut :⭕"}
+
+
+class RecordingEditQueue:
+    def __init__(self):
+        self.edits = []
+
+    def submit(self, chat_id, message_id, text, callback=None):
+        self.edits.append((chat_id, message_id, text))
+        return True
+
+
+def test_edit_resolved_before_send_is_delivered_once_sent(handlers, predictor):
+    handlers.edit_queue = RecordingEditQueue()
+    handlers.queue_prediction(TARGET, 12, "🔵12🔵:♥️statut :⏳", predictor)
+    handlers.queue_prediction_edit(12, "🔵12🔵:♥️statut :✅0️⃣", predictor, SOURCE)
+    send, edit = handlers.dispatcher.jobs
+
+    # The edit job runs first: nothing to edit yet, so it is held
+    assert edit['resolve']() is None
+    assert handlers.edit_queue.edits == []
+
+    send['callback']({'message_id': 77})
+    assert predictor.sent_predictions.get(12) == {'chat_id': TARGET, 'message_id': 77}
+    assert handlers.edit_queue.edits == [(TARGET, 77, "🔵12🔵:♥️statut :✅0️⃣")]
+    assert not handlers._parked_edits
+
+
+def test_parked_edit_of_an_unsent_prediction_is_dropped(handlers, predictor):
+    handlers.edit_queue = RecordingEditQueue()
+    handlers.queue_prediction(TARGET, 12, "🔵12🔵:♥️statut :⏳", predictor)
+    handlers.queue_prediction_edit(12, "🔵12🔵:♥️statut :⭕", predictor, SOURCE)
+    send, edit = handlers.dispatcher.jobs
+    edit['resolve']()
+    send['callback'](False)
+    assert handlers.edit_queue.edits == []
+    assert not handlers._parked_edits
+
+
+def test_dropped_send_releases_its_parked_edit(handlers, predictor):
+    handlers.edit_queue = RecordingEditQueue()
+    handlers.queue_prediction_edit(12, "🔵12🔵:♥️statut :⭕", predictor, SOURCE)
+    handlers.dispatcher.jobs[-1]['resolve']()
+    assert handlers._parked_edits
+
+    handlers.dispatcher.submit = lambda *args, **kwargs: False  # Backpressure: the send is dropped
+    assert not handlers.queue_prediction(TARGET, 12, "🔵12🔵:♥️statut :⏳", predictor)
+    assert not handlers._parked_edits
+    assert handlers.edit_queue.edits == []
+
+
+def test_parked_edits_expire(handlers, predictor, monkeypatch):
+    monkeypatch.setattr(handlers_module, 'PARKED_EDIT_TTL', 60)
+    handlers.queue_prediction_edit(12, "🔵12🔵:♥️statut :⭕", predictor, SOURCE)
+    handlers.dispatcher.jobs[-1]['resolve']()
+    now = time.monotonic()
+    assert handlers._expire_parked_edits(now + 30) == 0
+    assert handlers._expire_parked_edits(now + 61) == 1
+    assert not handlers._parked_edits
@@ -0,0 +1,49 @@
+"""
+UpdatePoller keeps ingesting after errors and confirms its offset on exit
+"""
+
+from polling import UpdatePoller
+
+
+class ScriptedClient:
+    """Answers getUpdates from a script; stops the poller once it runs out"""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+        self.poller = None
+
+    def call(self, method, json=None, **kwargs):
+        self.calls.append((method, json))
+        if json.get('timeout') == 0:  # Final offset confirmation
+            return {'ok': True, 'result': []}
+        if not self.replies:
+            self.poller.stop()
+            return {'ok': True, 'result': []}
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+def make_poller(replies, handled):
+    client = ScriptedClient(replies)
+    poller = UpdatePoller(client, handled.append, backoff_base=0, backoff_max=0)
+    client.poller = poller
+    return client, poller
+
+
+def test_unexpected_errors_do_not_stop_ingestion():
+    handled = []
+    client, poller = make_poller([
+        {'ok': True, 'result': 'not a list of updates'},
+        KeyError('result'),
+        {'ok': False, 'description': 'Bad Gateway'},
+        {'ok': True, 'result': [{'update_id': 8}, {'update_id': 7}]},
+    ], handled)
+
+    poller.run()
+
+    assert [update['update_id'] for update in handled] == [7, 8]
+    assert poller.offset == 9
+    assert client.calls[-1] == ('getUpdates', {'offset': 9, 'limit': 1, 'timeout': 0})
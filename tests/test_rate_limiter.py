@@ -0,0 +1,95 @@
+"""
+Token buckets: refill-and-take in memory and in the shared SQLite backend
+"""
+
+import pytest
+
+from clock import ManualClock
+from rate_limiter import SQLiteRateLimiter, TokenBucketLimiter, command_class
+
+LIMITS = {'default': (3, 30), 'heavy': (1, 60)}  # 3 per 30 s (1 token / 10 s), 1 per minute
+
+
+@pytest.fixture
+def clock():
+    return ManualClock(1_000_000)
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_limiter(request, tmp_path, clock):
+    def make():
+        if request.param == 'memory':
+            return TokenBucketLimiter(LIMITS, clock=clock)
+        return SQLiteRateLimiter(str(tmp_path / 'state.db'), LIMITS, clock=clock)
+    return make
+
+
+def test_burst_then_limited(make_limiter):
+    limiter = make_limiter()
+    assert [limiter.allow(1) for _ in range(4)] == [True, True, True, False]
+    assert limiter.get_stats()['allowed'] == 3 and limiter.get_stats()['limited'] == 1
+
+
+def test_tokens_refill_at_the_steady_rate(make_limiter, clock):
+    limiter = make_limiter()
+    for _ in range(3):
+        limiter.allow(1)
+    clock.advance(9)
+    assert not limiter.allow(1)
+    clock.advance(1)
+    assert limiter.allow(1)
+    assert not limiter.allow(1)
+
+
+def test_refill_is_capped_at_the_burst(make_limiter, clock):
+    limiter = make_limiter()
+    limiter.allow(1)
+    clock.advance(3600)
+    assert [limiter.allow(1) for _ in range(4)] == [True, True, True, False]
+
+
+def test_a_refused_check_takes_nothing(make_limiter, clock):
+    limiter = make_limiter()
+    for _ in range(3):
+        limiter.allow(1)
+    clock.advance(5)
+    assert not limiter.allow(1)  # Half a token: refused, and the half is kept
+    clock.advance(5)
+    assert limiter.allow(1)
+
+
+def test_buckets_are_per_user_and_class(make_limiter):
+    limiter = make_limiter()
+    assert limiter.allow(1, 'heavy')
+    assert not limiter.allow(1, 'heavy')
+    assert limiter.allow(2, 'heavy')
+    assert limiter.allow(1, 'default')
+    assert limiter.allow(1, 'unknown')  # Falls back to the default limit
+
+
+def test_sqlite_buckets_are_shared_between_workers(tmp_path, clock):
+    path = str(tmp_path / 'state.db')
+    first = SQLiteRateLimiter(path, LIMITS, clock=clock)
+    second = SQLiteRateLimiter(path, LIMITS, clock=clock)
+    assert first.allow(1, 'heavy')
+    assert not second.allow(1, 'heavy')
+    clock.advance(60)
+    assert second.allow(1, 'heavy')
+    assert not first.allow(1, 'heavy')
+
+
+def test_idle_memory_buckets_are_evicted(clock):
+    limiter = TokenBucketLimiter(LIMITS, max_buckets=2, clock=clock)
+    for user_id in range(1, 50):
+        limiter.allow(user_id)
+        assert limiter.get_stats()['buckets'] <= 2  # Room is made before each insert
+    clock.advance(30)
+    limiter.allow(99)
+    assert limiter.get_stats()['buckets'] == 1
+
+
+@pytest.mark.parametrize('text, klass', [
+    ('/deploy@MyBot now', 'heavy'), ('/help', 'cheap'), ('/other', 'default'), ('hello', 'default'), (None, 'default'),
+])
+def test_command_class(text, klass):
+    assert command_class(text) == klass
@@ -0,0 +1,138 @@
+"""
+Compiled rule plan against the hand-written rules it replaced
+"""
+
+import json
+import os
+import random
+import threading
+import time
+
+import pytest
+
+import rule_engine
+from message_parser import SUITS, parse_message
+from rule_engine import DEFAULT_RULES, RuleEngine, compile_rules
+
+MIRROR_MAP = {"♥️": "♣️", "♠️": "♦️", "♦️": "♠️", "♣️": "♥️"}
+
+CARD_SUITS = ["♠️", "♥️", "❤️", "♦️", "♣️"]
+VALUES = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
+TAGS = ["✅", "🔰", "⏰", "▶️", "", "✅ #R", "#X 🔰", "🕐", "➡️ ✅", "#T"]
+
+
+def baseline_costume(parsed):
+    """The rule checks of the original _should_predict (state and cooldown left out)"""
+    if parsed.has_final or parsed.has_r or parsed.has_x:
+        return None
+    costume = None
+    for color, count in zip(SUITS, parsed.suit_counts):
+        if count >= 3:
+            costume = MIRROR_MAP[color]
+            break
+    if costume is None:
+        return None
+    for counts in parsed.section_counts:
+        if any(count >= 3 for count in counts):
+            return None
+    if len(parsed.sections) >= 2:
+        combined = sum(1 for count in parsed.combined_counts(0, 1) if count >= 3)
+        if combined != 1:
+            return None
+    return costume
+
+
+def planned_costume(plan, parsed):
+    if plan.excluded(parsed):
+        return None
+    return plan.decide(parsed)[0]
+
+
+def random_message(r, game):
+    def hand(n):
+        return "".join(r.choice(VALUES) + r.choice(CARD_SUITS) for _ in range(n))
+
+    player, banker, tags = hand(r.choice([2, 2, 3])), hand(r.choice([2, 2, 3])), r.choice(TAGS)
+    if r.random() < 0.1:
+        return f"#N{game} {tags}"
+    if r.random() < 0.05:
+        return f"#n{game} ({player}) - ({banker}) ({hand(2)}) {tags}"
+    return f"#N{game}. {r.randint(1, 9)}({player}) - {r.randint(1, 9)}({banker}) {tags}"
+
+
+def test_default_plan_matches_the_original_rules():
+    plan = compile_rules(DEFAULT_RULES)
+    r = random.Random(19)
+    predicted = 0
+    for game in range(1, 20001):
+        parsed = parse_message(random_message(r, game))
+        expected = baseline_costume(parsed)
+        assert planned_costume(plan, parsed) == expected, parsed.text
+        predicted += expected is not None
+    assert predicted > 100  # The generator does reach the mirror rule
+
+
+def test_mirror_map_order_is_the_order_suits_are_tried():
+    spec = json.loads(json.dumps(DEFAULT_RULES))
+    spec['mirror']['map'] = {"♣️": "♥️", "♥️": "♣️", "♠️": "♦️", "♦️": "♠️"}
+    spec['exclusions'] = []
+    plan = compile_rules(spec)
+    parsed = parse_message("#N5. 1(A♥️2♥️3♣️) - 2(4♥️5♣️6♣️) ✅")
+    assert planned_costume(compile_rules({**spec, 'mirror': DEFAULT_RULES['mirror']}), parsed) == "♣️"
+    assert planned_costume(plan, parsed) == "♥️"
+
+
+@pytest.mark.parametrize('spec, message', [
+    ({'mirror': {'map': {}}}, 'mirror.map'),
+    ({'mirror': {'map': {"♥️": "X"}}}, 'couleur inconnue'),
+    ({'mirror': DEFAULT_RULES['mirror'], 'exclusions': [{'type': 'regex'}]}, 'type inconnu'),
+    ({'mirror': DEFAULT_RULES['mirror'], 'target_offset': 0}, 'target_offset'),
+])
+def test_invalid_rule_sets_are_rejected(spec, message):
+    with pytest.raises(ValueError, match=message):
+        compile_rules(spec)
+
+
+def test_invalid_reload_keeps_the_running_plan(tmp_path):
+    path = tmp_path / 'rules.json'
+    spec = json.loads(json.dumps(DEFAULT_RULES))
+    spec['target_offset'] = 3
+    path.write_text(json.dumps(spec))
+    engine = RuleEngine(str(path), check_interval=0)
+    assert engine.current().target_offset == 3
+
+    path.write_text('{"mirror": {"map": {}}}')
+    with pytest.raises(ValueError):
+        engine.reload()
+    assert engine.current().target_offset == 3
+
+
+def test_concurrent_callers_reload_a_changed_file_once(tmp_path, monkeypatch):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps(DEFAULT_RULES))
+    engine = RuleEngine(str(path), check_interval=0)
+    reloads = engine.reloads
+
+    spec = json.loads(json.dumps(DEFAULT_RULES))
+    spec['target_offset'] = 3
+    path.write_text(json.dumps(spec))
+    os.utime(path, (time.time() + 5, time.time() + 5))
+
+    def slow_compile(*args):
+        time.sleep(0.01)  # Widen the window between the mtime check and the swap
+        return compile_rules(*args)
+
+    monkeypatch.setattr(rule_engine, 'compile_rules', slow_compile)
+    start = threading.Barrier(8)
+
+    def call():
+        start.wait()
+        engine.current()
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert engine.reloads == reloads + 1
+    assert engine.current().target_offset == 3
@@ -0,0 +1,87 @@
+"""
+Bounded predictor stores: size and TTL eviction, and concurrent access
+"""
+
+import threading
+
+import pytest
+
+from clock import ManualClock
+from state_store import BoundedStore, PendingIndex
+
+
+def test_size_eviction_drops_the_oldest():
+    store = BoundedStore(max_size=3)
+    for key in range(5):
+        store[key] = key
+    assert list(store) == [2, 3, 4]
+    assert store.stats()['evictions'] == 2
+
+
+def test_ttl_expiry_only_for_matching_values():
+    clock = ManualClock(0.0)
+    store = BoundedStore(max_size=10, ttl=60, expire_if=lambda value: value != 'pending', clock=clock)
+    store[1] = 'pending'
+    store[2] = 'settled'
+    clock.advance(61)
+    assert 2 not in store
+    assert store[1] == 'pending'
+
+
+def test_sweep_is_not_blocked_by_pinned_entries():
+    clock = ManualClock(0.0)
+    store = BoundedStore(max_size=1000, ttl=60, expire_if=lambda value: value != 'pending', clock=clock)
+    for key in range(40):  # More pending entries at the old end than one sweep looks at
+        store[('pending', key)] = 'pending'
+    for key in range(20):
+        store[('settled', key)] = 'settled'
+    clock.advance(61)
+    for key in range(10):
+        store[('new', key)] = 'settled'  # Each write sweeps a batch
+    assert not any(key[0] == 'settled' for key in list(store))
+    assert sum(1 for key in list(store) if key[0] == 'pending') == 40
+    assert store.stats()['expirations'] == 20
+
+
+def test_pop_of_a_missing_key():
+    store = BoundedStore()
+    assert store.pop('missing', None) is None
+    with pytest.raises(KeyError):
+        store.pop('missing')
+
+
+def test_concurrent_writes_reads_and_sweeps():
+    clock = ManualClock(0.0)
+    store = BoundedStore(max_size=200, ttl=0.5, clock=clock)
+    errors = []
+
+    def work(offset):
+        try:
+            for index in range(5000):
+                key = (offset + index) % 300
+                store[key] = index
+                store.get((key + 7) % 300)
+                store.pop((key + 13) % 300, None)
+                if index % 50 == 0:
+                    clock.advance(0.1)
+                    store.sweep(limit=None)
+        except Exception as e:  # pragma: no cover - what the lock prevents
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(offset * 37,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(store) <= 200
+
+
+def test_pending_index_returns_the_smallest_pending_game():
+    index = PendingIndex()
+    for game in (14, 12, 13):
+        index.add(game)
+    index.discard(12)
+    assert index.first() == 13
+    index.clear()
+    assert index.first() is None
@@ -0,0 +1,113 @@
+"""
+Rolling win-rate windows (games, hours, days)
+"""
+
+import random
+
+from clock import ManualClock
+from state_backend import SharedSQLiteState, SQLitePredictionStats
+from stats import CELLS, OUTCOMES, PredictionStats, RollingWindow, format_stats
+
+
+def test_window_keeps_the_last_positions():
+    window = RollingWindow(3)
+    for position in range(1, 6):
+        window.add(position, 0)
+    assert window.totals()[0] == 3  # Positions 3, 4 and 5
+
+
+def test_late_record_inside_the_window_counts():
+    window = RollingWindow(5)
+    window.add(10, 0)
+    window.add(8, 1)
+    assert window.head == 10 and window.totals()[:2] == [1, 1]
+    window.advance(13)
+    assert window.totals()[:2] == [1, 0]  # 8 fell out, 10 is still in
+
+
+def test_jump_past_the_window_clears_it():
+    window = RollingWindow(4)
+    for position in range(1, 5):
+        window.add(position, 2)
+    window.advance(100)
+    assert window.totals() == [0] * CELLS
+
+
+def test_counter_reset_restarts_the_window():
+    window = RollingWindow(10)
+    for position in range(500, 505):
+        window.add(position, 0)
+    window.add(3, 1)  # Game numbers started over
+    assert window.head == 3 and window.totals()[:2] == [0, 1]
+
+
+def test_totals_match_a_recount_after_random_moves():
+    r = random.Random(24)
+    window, records, head = RollingWindow(7), [], 0
+    for _ in range(2000):
+        position = head + r.randint(-5, 3)
+        if head and position <= head - 7:
+            records = []
+        cell = r.randrange(CELLS)
+        window.add(position, cell)
+        head = max(head, position) if records else position
+        records.append((position, cell))
+        expected = [0] * CELLS
+        for recorded, recorded_cell in records:
+            if recorded > head - 7:
+                expected[recorded_cell] += 1
+        assert window.totals() == expected
+
+
+def test_prediction_stats_windows_roll_with_the_clock():
+    clock = ManualClock(0)
+    stats = PredictionStats(last_games=2, hours=2, days=7, clock=clock)
+    assert stats.record(10, "♥️", OUTCOMES[0])
+    clock.advance(3600)
+    assert stats.record(12, "♠️", "⭕")
+    assert stats.record(13, "♠️", OUTCOMES[1])
+    assert not stats.record(14, "?", "⭕")
+
+    snapshot = stats.snapshot()
+    assert snapshot['last_games']['predictions'] == 2       # Games 12 and 13
+    assert snapshot['last_games']['win_rate'] == 0.5
+    assert snapshot['last_games']['by_suit']["♥️"]['predictions'] == 0
+    assert snapshot['last_hours']['predictions'] == 3
+    assert snapshot['since_start']['outcomes'] == dict(zip(OUTCOMES, [1, 1, 1]))
+
+    clock.advance(7200)  # Reading moves the time windows forward
+    snapshot = stats.snapshot()
+    assert snapshot['last_hours']['predictions'] == 0
+    assert snapshot['last_days']['predictions'] == 3
+    assert "réussite" in format_stats(snapshot)
+
+    stats.clear()
+    assert stats.get_stats()['since_start']['predictions'] == 0
+
+
+def test_shared_stats_match_the_in_memory_counters(tmp_path):
+    clock = ManualClock(1_000_000)
+    memory = PredictionStats(last_games=20, hours=3, days=2, clock=clock)
+    shared = SQLitePredictionStats(SharedSQLiteState(str(tmp_path / 'state.db')), last_games=20, hours=3, days=2,
+                                   clock=clock)
+    r = random.Random(8)
+    game = 1
+    for step in range(600):
+        game = 1 if r.random() < 0.01 else max(1, game + r.randint(-3, 4))
+        costume, status = r.choice(["♥️", "♠️", "♦️", "♣️"]), r.choice(OUTCOMES)
+        assert shared.record(game, costume, status) == memory.record(game, costume, status)
+        clock.advance(r.choice([0, 60, 900, 4000]))
+        if step % 25 == 0:
+            assert shared.snapshot() == memory.snapshot()
+    assert shared.snapshot() == memory.snapshot()
+
+
+def test_shared_stats_cover_every_worker(tmp_path):
+    path = str(tmp_path / 'state.db')
+    first, second = SharedSQLiteState(path), SharedSQLiteState(path)
+    first.prediction_stats.record(10, "♥️", OUTCOMES[0])
+    second.prediction_stats.record(11, "♠️", "⭕")
+    for state in (first, second):
+        assert state.prediction_stats.get_stats()['last_games'] == {'predictions': 2, 'win_rate': 0.5}
+    first.prediction_stats.clear()
+    assert second.prediction_stats.get_stats()['since_start']['predictions'] == 0
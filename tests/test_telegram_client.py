@@ -0,0 +1,131 @@
+"""
+TelegramClient retries against a local stub Bot API (http.server)
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import telegram_client
+from telegram_client import RetryPolicy, TelegramClient
+
+
+class StubBotAPI(ThreadingHTTPServer):
+    """Answers each call with the next scripted (status, body) of its method"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _StubHandler)
+        self.script = {}
+        self.calls = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        method = self.path.rsplit('/', 1)[-1]
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        server.calls.append(method)
+        replies = server.script.get(method) or [(200, {'ok': True, 'result': True})]
+        status, body = replies.pop(0) if len(replies) > 1 else replies[0]
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+OK = (200, {'ok': True, 'result': {'message_id': 1}})
+SERVER_ERROR = (500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'})
+
+
+def too_many(retry_after):
+    return (429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+                  'parameters': {'retry_after': retry_after}})
+
+
+@pytest.fixture
+def api():
+    server = StubBotAPI()
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(api):
+    client = TelegramClient('1:test', api_base=api.url, max_retries=3, backoff_base=0.001, backoff_max=0.01)
+    yield client
+    client.close()
+
+
+def test_429_is_retried_after_retry_after(api, client):
+    api.script['sendMessage'] = [too_many(0), OK]
+    result = client.call('sendMessage', json={'chat_id': 1, 'text': 'x'})
+    assert result['ok']
+    assert api.calls == ['sendMessage', 'sendMessage']
+
+
+def test_long_retry_after_is_returned_at_once(api, client):
+    api.script['sendMessage'] = [too_many(telegram_client.MAX_RETRY_AFTER + 1), OK]
+    result = client.call('sendMessage', json={'chat_id': 1, 'text': 'x'})
+    assert result['error_code'] == 429
+    assert api.calls == ['sendMessage']
+
+
+def test_5xx_on_send_is_not_retried(api, client):
+    api.script['sendMessage'] = [SERVER_ERROR, OK]
+    result = client.call('sendMessage', json={'chat_id': 1, 'text': 'x'})
+    assert result['error_code'] == 500
+    assert api.calls == ['sendMessage']
+
+
+def test_5xx_on_edit_is_retried(api, client):
+    api.script['editMessageText'] = [SERVER_ERROR, SERVER_ERROR, OK]
+    result = client.call('editMessageText', json={'chat_id': 1, 'message_id': 1, 'text': 'x'})
+    assert result['ok']
+    assert api.calls == ['editMessageText'] * 3
+
+
+def test_retries_are_bounded(api, client):
+    api.script['getMe'] = [SERVER_ERROR]
+    result = client.call('getMe')
+    assert result['error_code'] == 500
+    assert len(api.calls) == 4  # First try + max_retries
+
+
+def test_max_retries_0_returns_the_first_answer(api, client):
+    api.script['editMessageText'] = [too_many(0), OK]
+    result = client.call('editMessageText', json={'chat_id': 1, 'message_id': 1, 'text': 'x'}, max_retries=0)
+    assert result['error_code'] == 429
+    assert api.calls == ['editMessageText']
+
+
+def test_connection_errors_raise_once_retries_are_exhausted():
+    client = TelegramClient('1:test', api_base='http://127.0.0.1:9', max_retries=1,
+                            backoff_base=0.001, backoff_max=0.01)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.call('getMe', timeout=1)
+
+
+def test_read_timeout_is_only_retried_for_idempotent_methods():
+    policy = RetryPolicy(max_retries=3, backoff_base=0, backoff_max=0)
+    error = requests.exceptions.ReadTimeout()
+    assert policy.after_error('sendMessage', error, 0, 3, read_timeout=True) is None
+    assert policy.after_error('editMessageText', error, 0, 3, read_timeout=True) == 0
+    assert policy.after_error('sendMessage', requests.exceptions.ConnectionError(), 0, 3) == 0
+    assert policy.after_error('editMessageText', error, 3, 3, read_timeout=True) is None
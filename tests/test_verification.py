@@ -0,0 +1,85 @@
+"""
+Settlement of pending predictions: offsets 0 / +1 / ⭕, and several predictions settled by one result
+"""
+
+import pytest
+
+from card_predictor import CardPredictor
+from clock import ManualClock
+
+
+@pytest.fixture
+def predictor():
+    return CardPredictor(clock=ManualClock(1_000_000.0))
+
+
+def predict(predictor, game, costume):
+    """Pending prediction for `game` (make_prediction targets source game + target_offset)"""
+    predictor.make_prediction(game - predictor.target_offset, costume)
+    assert predictor.predictions[game]['status'] == 'pending'
+
+
+def settled(results):
+    return [(result['predicted_game'], result['status']) for result in results]
+
+
+def test_offset_0_hit(predictor):
+    predict(predictor, 12, '♥️')
+    assert settled(predictor.verify_all("#N12. 5(♥️♣️) - 7(♦️♠️) ✅")) == [(12, '✅0️⃣')]
+    assert predictor.predictions[12]['status'] == 'correct'
+    assert predictor.pending_games.first() is None
+
+
+def test_offset_0_miss_waits_for_offset_1(predictor):
+    predict(predictor, 12, '♥️')
+    assert predictor.verify_all("#N12. 5(♣️♣️) - 7(♥️♠️) ✅") == []
+    assert predictor.predictions[12]['status'] == 'pending'
+    assert settled(predictor.verify_all("#N13. 5(♥️♦️) - 7(♦️♠️) ✅")) == [(12, '✅1️⃣')]
+    assert predictor.predictions[12]['verification_count'] == 1
+
+
+def test_offset_1_miss_is_failed(predictor):
+    predict(predictor, 12, '♥️')
+    predictor.verify_all("#N12. 5(♣️♣️) - 7(♥️♠️) ✅")
+    assert settled(predictor.verify_all("#N13. 5(♣️♦️) - 7(♥️♠️) ✅")) == [(12, '⭕')]
+    assert predictor.predictions[12]['status'] == 'failed'
+
+
+def test_offset_2_or_more_is_failed(predictor):
+    predict(predictor, 12, '♥️')
+    results = predictor.verify_all("#N15. 5(♥️♦️) - 7(♥️♠️) ✅")
+    assert settled(results) == [(12, '⭕')]
+    assert results[0]['offset'] == 3
+
+
+def test_unfinished_result_settles_nothing(predictor):
+    predict(predictor, 12, '♥️')
+    assert predictor.verify_all("#N12. 5(♥️♣️) - 7(♦️♠️) ⏰") == []
+    assert predictor.predictions[12]['status'] == 'pending'
+
+
+def test_one_result_settles_consecutive_predictions(predictor):
+    predict(predictor, 12, '♥️')
+    predict(predictor, 13, '♥️')
+    predictor.verify_all("#N12. 5(♣️♣️) - 7(♦️♠️) ✅")
+    results = predictor.verify_all("#N13. 5(♥️♦️) - 7(♣️♠️) ✅")
+    assert settled(results) == [(12, '✅1️⃣'), (13, '✅0️⃣')]
+    assert predictor.predictions[13]['status'] == 'correct'
+    assert predictor.verify_all("#N14. 5(♣️♦️) - 7(♣️♠️) ✅") == []
+
+
+def test_in_order_path_settles_consecutive_predictions(predictor):
+    predict(predictor, 12, '♥️')
+    predict(predictor, 13, '♥️')
+    assert predictor.verify_in_order("#N12. 5(♣️♣️) - 7(♦️♠️) ✅") == []
+    results = predictor.verify_in_order("#N13. 5(♥️♦️) - 7(♣️♠️) ✅", is_edited=True)
+    assert settled(results) == [(12, '✅1️⃣'), (13, '✅0️⃣')]
+
+
+def test_batch_matches_per_message_path(predictor):
+    predict(predictor, 12, '♥️')
+    predict(predictor, 13, '♥️')
+    messages = ["#N12. 5(♣️♣️) - 7(♦️♠️) ✅", "#N13. 5(♥️♦️) - 7(♣️♠️) ✅"]
+    results = predictor.evaluate_batch(messages, edited=False)
+    assert [(r['index'], r['predicted_game'], r['status']) for r in results['verifications']] == \
+        [(1, 12, '✅1️⃣'), (1, 13, '✅0️⃣')]